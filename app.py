@@ -1,49 +1,159 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, abort, send_from_directory, send_file
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, abort, send_from_directory, send_file, Response
 from flask_login import LoginManager, login_user, logout_user, login_required
-from datetime import datetime
+from datetime import datetime, timedelta
+import hmac
 import platform
+import click
+from flask.cli import with_appcontext
 from formbuilder.form_utils import generate_form_html_from_config_file
-from formbuilder.schema_utils import generate_schema_from_config_file, extract_form_response_data_using_schema
-from utils import User, role_required
+from formbuilder.schema_utils import generate_schema_from_config_file, extract_form_fields_using_schema, extract_form_delta_using_schema
+from utils import User, OrjsonProvider, role_required, orjson
 from utils import read_instance_config, parse_user_auth_info_from_config, generate_websafe_session_id, l2_validations, l3_validations, get_ip_address, ip_info_check, send_session_id_reminder_email, is_valid_filename, read_uploaded_dataset, download_datastore_in_specific_format, generate_excel_template_from_schema
 from datamodels.managers import  DatastoreManager
 from loggers.managers import LoggerManager
+from loggers.metrics import init_metrics, gauges_from_stats
+from loggers.profiling import init_request_profiling
+from loggers.tracing import init_request_tracing, trace_span
 from werkzeug.utils import secure_filename
 import os
 import glob
+import gc
 
 ## Initialization ##
-# Read instance config YAML and form schema
-config = read_instance_config(config_folder='config', config_file_name='config.yaml')
-form_schema = generate_schema_from_config_file(config_folder=os.path.join('config',config['form']['form_config_folder']),config_filename=config['form']['form_config_file_name'])
-        
-# Initialize logging
-app_logger = LoggerManager.get_logger(config)
+# The app's state, set up by create_app(). The routes below read it, so a process serves one app at a time.
+config = None
+form_schema = None
+form_content_html = None
+app_logger = None
+datastore = None
+metrics_options = None
+metrics_registry = None
+login_manager = None
+user_auth_info = None
+
+# The app's routes, as (rule, view function, options) tuples; registered on the app by create_app()
+routes = []
+
+def route(rule, **options):
+    """Decorator that adds a view function to the routes registered by create_app(); takes the same arguments as Flask.route()."""
+    def decorator(view_function):
+        routes.append((rule, view_function, options))
+        return view_function
+    return decorator
+
+def create_app(instance_config=None):
+    """
+    Create and set up the Flask app. This does all of the one-time work: reading the config, compiling the form schema and
+    the form's HTML from the form configuration sheet, and setting up the datastore (which runs any migrations).
 
-# Define Flask app and set app-level configs
-app = Flask(__name__) 
-app.secret_key = config['general']['flask_app_secret_key']
+    Servers that fork worker processes from a preloaded app (e.g. `gunicorn --preload 'app:create_app()'`) therefore do this
+    work only once, in the parent, and the workers share its memory copy-on-write. What cannot be shared is reset in each
+    worker right after the fork (see reinitialize_after_fork()): database connection pools, and background threads (which
+    do not survive a fork) such as the logging queue listener, the metrics snapshot writer and the spool replayer.
 
-# Initialize datastore manager
-datastore = DatastoreManager(app, config)
+    Args:
+        instance_config(dict): (Optional) The main instance configuration; read from config/config.yaml if not given.
 
-# Initialize login manager and authentication functions
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = "login"
-login_manager.login_message_category = "warning"
-user_auth_info = parse_user_auth_info_from_config(config)
+    Returns:
+        The Flask app.
+    """
+    global config, form_schema, form_content_html, app_logger, datastore, metrics_options, metrics_registry, login_manager, user_auth_info
+    # Read instance config YAML and initialize logging
+    config = instance_config or read_instance_config(config_folder='config', config_file_name='config.yaml')
+    app_logger = LoggerManager.get_logger(config)
+
+    # Compile the form schema and HTML
+    config_folder = os.path.join('config', config['form']['form_config_folder'])
+    config_filename = config['form']['form_config_file_name']
+    form_schema = generate_schema_from_config_file(config_folder=config_folder, config_filename=config_filename)
+    form_content_html = generate_form_html_from_config_file(config_folder=config_folder, config_filename=config_filename)
+
+    # Define Flask app and set app-level configs
+    app = Flask(__name__)
+    app.secret_key = config['general']['flask_app_secret_key']
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
+    # Optionally log per-request stage timings, and profile requests on demand
+    init_request_tracing(app, config['system'].get('tracing'))
+    init_request_profiling(app, config['system'].get('profiling'))
+
+    # Initialize datastore manager
+    datastore = DatastoreManager(app, config)
+
+    # Optionally record request, datastore and runtime metrics for the /metrics route
+    metrics_options = config['system'].get('metrics') or {}
+    metrics_registry = init_metrics(app, metrics_options)
+    if metrics_registry:
+        metrics_registry.add_gauge_collector(collect_runtime_gauges)
+
+    # Initialize login manager and authentication functions
+    login_manager = LoginManager()
+    login_manager.init_app(app)
+    login_manager.login_view = "login"
+    login_manager.login_message_category = "warning"
+    login_manager.user_loader(load_user)
+    user_auth_info = parse_user_auth_info_from_config(config)
+
+    for rule, view_function, options in routes:
+        app.add_url_rule(rule, view_func=view_function, **options)
+    app.cli.add_command(archive_submissions)
+    # Exempt everything created so far from garbage collection, so that the collector does not write to (and un-share) the
+    # pages that forked workers share copy-on-write with the parent
+    gc.freeze()
+    return app
+
+# The exit status of a worker that failed to boot, with which gunicorn stops the server instead of restarting the worker
+WORKER_BOOT_ERROR_EXIT_CODE = 3
+
+def reinitialize_after_fork():
+    """
+    Reset the per-process state that a forked child process (e.g. a worker of a preloaded app) inherits from its parent:
+    give it its own database connection pools, and restart the background threads that do not survive the fork. A child
+    exits if its datastore cannot be served by forked processes (the 'local' datastore). Registered with
+    os.register_at_fork(), so it runs in every forked child, whichever server does the forking.
+    """
+    LoggerManager.after_fork()
+    if datastore is not None:
+        try:
+            datastore.after_fork()
+        except RuntimeError as e:
+            # Exceptions raised in fork handlers are ignored, so exit rather than serve a datastore that refuses to be shared
+            # (e.g. the 'local' datastore); gunicorn stops instead of restarting workers that exit with this status
+            app_logger.critical(f"Cannot serve the datastore from forked process {os.getpid()}: {e}")
+            os._exit(WORKER_BOOT_ERROR_EXIT_CODE)
+    if metrics_registry is not None:
+        metrics_registry.after_fork()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reinitialize_after_fork)
+
+def __getattr__(name):
+    """Create the default app (from config/config.yaml) on first use of `app`, e.g. by `flask --app app` or `gunicorn app:app`."""
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def collect_runtime_gauges():
+    """Metrics gauge collector for the datastore connection pools, caches, write path and logging queue."""
+    gauges = []
+    for engine_label, pool_stats in datastore.get_pool_stats().items():
+        gauges.extend(gauges_from_stats('db_pool', pool_stats, labels={'engine': engine_label}))
+    for cache_name, cache_stats in datastore.get_cache_stats().items():
+        gauges.extend(gauges_from_stats('cache', cache_stats, labels={'cache': cache_name}))
+    gauges.extend(gauges_from_stats('writes', datastore.get_write_stats()))
+    gauges.extend(gauges_from_stats('logging', LoggerManager.get_logging_stats()))
+    return gauges
 
-@login_manager.user_loader
 def load_user(user_id):
     """
-    This function is here because its decorator uses an instantiated LoginManager instance.
+    This function is registered as the login manager's user_loader by create_app().
     """
     if user_id in user_auth_info:
         return User(**user_auth_info[user_id])
     
 ## App Routes ##
-@app.route('/')
+@route('/')
 def form():
     """
     Main form-serving page that dynamically generates and renders a form.
@@ -60,12 +170,11 @@ def form():
     # Pass the current timestamp to the form as page load time
     page_load_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     session_id = generate_websafe_session_id(config['general']['websafe_session_id_size'])
-    config_folder = os.path.join('config', config['form']['form_config_folder'])
-    config_filename = config['form']['form_config_file_name']
-    form_content_html = generate_form_html_from_config_file(config_folder=config_folder, config_filename=config_filename)
-    return render_template('dynamic_form.html', page_load_time=page_load_time, session_id=session_id,form_content_html=form_content_html)
+    # The form's HTML is compiled once by create_app()
+    with trace_span('render_form'):
+        return render_template('dynamic_form.html', page_load_time=page_load_time, session_id=session_id,form_content_html=form_content_html)
 
-@app.route('/submit', methods=['POST'])
+@route('/submit', methods=['POST'])
 def submit():
     """
     Form submission route that accepts data into the datastore (UPSERT by default).
@@ -80,58 +189,138 @@ def submit():
         None
     """
     if request.method == 'POST':
-        # Extract data from the form submission using the defined form schema
-        form_data = extract_form_response_data_using_schema(request,form_schema)
-        
-        # Raise an error if the Session ID is not in the response for some reason
-        if not request.form.get('session_id_form_field'):
-            raise RuntimeError('No session_id populated.')        
-
-        # Add form data to baseline data row containing ID and timestamp
-        submission_data = {
-            "id": request.form.get('session_id_form_field'),
-            "timestamp": datetime.now(),
-        }
-        submission_data.update(form_data)
-
-        # Optionally add advanced analytics form validation features based on config
-        advanced_analytics_form_validation_options = config['advanced_analytics']
-        if advanced_analytics_form_validation_options:
-            if 'sessiondata' in advanced_analytics_form_validation_options.keys():
-                app_logger.info("Found 'sessiondata' key in config; enabling session metadata recording.")
-                # Session data 
-                _name = request.form.get('_name','Not Enabled') # Honeypot field
-                user_agent = request.headers.get('User-Agent')
-                os_system = platform.system() + " " + platform.release()  # Operating system
-                ip_address = get_ip_address()
-                # Calculate time taken to fill the form
-                form_load_time = request.form.get('form_load_time')
-                form_load_dt = datetime.strptime(form_load_time, '%Y-%m-%d %H:%M:%S')
-                form_submission_time = datetime.now()
-                time_taken = (form_submission_time - form_load_dt).total_seconds()
-                submission_data.update({
-                    "user_agent": user_agent,
-                    "operating_system": os_system,
-                    "ip_address": ip_address,
-                    "hpfm": _name, # Honeypot Field Modified?
-                    "elapsed_time": time_taken
-                })
-                submission_data.update(ip_info_check(ip_address, form_validation_options=advanced_analytics_form_validation_options))
-            if 'L2' in advanced_analytics_form_validation_options.keys():
-                app_logger.info("Found 'L2' key in config; enabling L2 form validation metadata recording.")
-                submission_data.update(l2_validations(submission_data))
-            if 'L3' in advanced_analytics_form_validation_options.keys():
-                app_logger.info("Found 'L3' key in config; enabling L3 form validation metadata recording.")
-                submission_data.update(l3_validations(submission_data))
+        submission_data = build_submission_data(request.form, user_agent=request.headers.get('User-Agent'), ip_address=get_ip_address())
+        if config['advanced_analytics'] and 'sessiondata' in config['advanced_analytics'].keys():
+            with trace_span('ip_info_check'):
+                submission_data.update(ip_info_check(submission_data['ip_address'], form_validation_options=config['advanced_analytics']) or {})
+        add_form_validations(submission_data)
         
         # Save data to datastore
         datastore.add_data(submission_data)
-        # Save fields in session dict to re-display once on the thank you message
-        session['session_id_for_reminder_email'] = submission_data.get('id')
-        session['applicant_email_for_reminder_email'] = submission_data.get('email')
-        return redirect(url_for('thank_you'))
+        remember_submission_in_session(session, submission_data)
+        with trace_span('redirect'):
+            return redirect(url_for('thank_you'))
+
+def build_submission_data(form, user_agent, ip_address):
+    """
+    Build the datastore row of a form submission: the form's fields (as in the form schema), its session_id and timestamp and,
+    if configured under 'advanced_analytics', session metadata. The submit routes then add the IPInfo details of the client
+    (which the sync and async routes look up differently) and the validation fields (see add_form_validations()).
 
-@app.route('/thank-you')
+    Args:
+        form: The submitted form fields; any mapping with a get() method (e.g. request.form).
+        user_agent(str): The User-Agent header of the request.
+        ip_address(str): The IP address of the client (see get_ip_address()).
+
+    Returns:
+        A dict of the submission's fields.
+    """
+    # Extract data from the form submission using the defined form schema
+    with trace_span('extract_form_response_data'):
+        form_data = extract_form_fields_using_schema(form, form_schema)
+    
+    # Raise an error if the Session ID is not in the response for some reason
+    if not form.get('session_id_form_field'):
+        raise RuntimeError('No session_id populated.')        
+
+    # Add form data to baseline data row containing ID and timestamp
+    submission_data = {
+        "id": form.get('session_id_form_field'),
+        "timestamp": datetime.now(),
+    }
+    submission_data.update(form_data)
+
+    # Optionally add advanced analytics form validation features based on config
+    advanced_analytics_form_validation_options = config['advanced_analytics']
+    if advanced_analytics_form_validation_options:
+        if 'sessiondata' in advanced_analytics_form_validation_options.keys():
+            app_logger.info("Found 'sessiondata' key in config; enabling session metadata recording.")
+            # Session data 
+            _name = form.get('_name','Not Enabled') # Honeypot field
+            os_system = platform.system() + " " + platform.release()  # Operating system
+            # Calculate time taken to fill the form
+            form_load_time = form.get('form_load_time')
+            form_load_dt = datetime.strptime(form_load_time, '%Y-%m-%d %H:%M:%S')
+            form_submission_time = datetime.now()
+            time_taken = (form_submission_time - form_load_dt).total_seconds()
+            submission_data.update({
+                "user_agent": user_agent,
+                "operating_system": os_system,
+                "ip_address": ip_address,
+                "hpfm": _name, # Honeypot Field Modified?
+                "elapsed_time": time_taken
+            })
+    return submission_data
+
+def add_form_validations(submission_data):
+    """
+    Add the L2/L3 form validation fields configured under 'advanced_analytics' to a submission's datastore row.
+
+    Args:
+        submission_data(dict): The submission's fields (see build_submission_data()); updated in place.
+
+    Returns:
+        None
+    """
+    advanced_analytics_form_validation_options = config['advanced_analytics']
+    if advanced_analytics_form_validation_options:
+        if 'L2' in advanced_analytics_form_validation_options.keys():
+            app_logger.info("Found 'L2' key in config; enabling L2 form validation metadata recording.")
+            with trace_span('l2_validations'):
+                submission_data.update(l2_validations(submission_data))
+        if 'L3' in advanced_analytics_form_validation_options.keys():
+            app_logger.info("Found 'L3' key in config; enabling L3 form validation metadata recording.")
+            with trace_span('l3_validations'):
+                submission_data.update(l3_validations(submission_data))
+
+def remember_submission_in_session(session_data, submission_data):
+    """
+    Save the fields that the 'Thank You' page re-displays once (see pop_thank_you_details()) in the browser's session.
+
+    Args:
+        session_data: The session; Flask's session, or a session opened by the async serving mode.
+        submission_data(dict): The submission that was just saved.
+
+    Returns:
+        None
+    """
+    session_data['session_id_for_reminder_email'] = submission_data.get('id')
+    session_data['applicant_email_for_reminder_email'] = submission_data.get('email')
+    # Remember when this browser last submitted, so that restoring its session soon after is read from the primary
+    session_data['last_submission_time'] = submission_data['timestamp'].timestamp()
+
+@route('/autosave', methods=['POST'])
+def autosave():
+    """
+    App route to autosave a partially filled form. The client sends only the fields that changed since its last autosave,
+    and only those fields are written to the datastore; fields that are not in the form schema are ignored. Like the
+    /load_form_data route, this route is not meant to be accessed directly by the user.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    autosave_request = request.get_json(silent=True) or {}
+    if not isinstance(autosave_request, dict) or not isinstance(autosave_request.get('fields') or {}, dict):
+        return jsonify({"error": "The autosave request must be a JSON object with a 'fields' object."}), 400
+    session_id = autosave_request.get('session_id')
+    if not session_id or not isinstance(session_id, str):
+        return jsonify({"error": "No session code provided."}), 400
+    changed_fields = extract_form_delta_using_schema(autosave_request.get('fields') or {}, form_schema)
+    if changed_fields:
+        try:
+            datastore.save_draft(session_id, changed_fields)
+        except Exception as e:
+            # The client keeps the unsaved fields and sends them again with its next autosave
+            app_logger.error(f"Autosave of session '{session_id}' failed: {e}")
+            return jsonify({"error": "The draft could not be saved."}), 503
+        # Restoring this session soon after should read the draft from the primary, as after a submission
+        session['last_submission_time'] = datetime.now().timestamp()
+    return jsonify({"saved_fields": list(changed_fields)})
+
+@route('/thank-you')
 def thank_you():
     """
     Mainly static page that renders after a form is submitted; also sends a reminder email to the applicant's
@@ -144,26 +333,41 @@ def thank_you():
     Returns:
         None
     """        
+    session_id, destination_address, message = pop_thank_you_details(session)
+    if destination_address:
+        with trace_span('send_session_id_reminder_email'):
+            send_session_id_reminder_email(destination_address=destination_address, session_id=session_id, config=config)
+    return render_template('thank_you.html', session_id=session_id, message=message)
+
+def pop_thank_you_details(session_data):
+    """
+    Take the details of the last submission out of the browser's session (see remember_submission_in_session()), so that the
+    'Thank You' page shows them only once, and compose the page's message.
+
+    Args:
+        session_data: The session; Flask's session, or a session opened by the async serving mode.
+
+    Returns:
+        A (session_id, destination_address, message) tuple. session_id is '' and destination_address is None if the page is
+        not shown after a submission; destination_address is also None if the applicant's email field was not filled out.
+    """
     # By default, assume the page is directly being accessed i.e. not from a redirect after a form submission and define the appropriate message
     session_id = ''
+    destination_address = None
     message = 'This page should only be directly viewed after submitting a form, and it appears that this has not occurred. Reach out to the team for support if you believe this happened in error.'
     # If the page is being displayed after a successful submission, the session will have a session_id_for_reminder_email key
-    if session.get('session_id_for_reminder_email'):
+    if session_data.get('session_id_for_reminder_email'):
+        session_id = session_data.pop('session_id_for_reminder_email')
         # If the email field was filled out, the session will have a applicant_email_for_reminder_email key
-        if session.get('applicant_email_for_reminder_email'):
-            session_id = session.pop('session_id_for_reminder_email')
-            destination_address = session.pop('applicant_email_for_reminder_email')
-            send_session_id_reminder_email(destination_address=destination_address, session_id=session_id, config=config)
+        destination_address = session_data.pop('applicant_email_for_reminder_email', None)
+        if destination_address:
             message = f"Thank you for your response. We have sent the session ID of this submission to '{destination_address}'. Please use it to restore the session if needed, and contact support if you did not receive the email. For reference, the session ID is also displayed below."
-            session.pop('applicant_email_for_reminder_email')
         # If the email field was not filled out, remind the user of the session ID but don't send an email.
         else:
-            session_id = session.pop('session_id_for_reminder_email')
             message = 'Since the applicant_email field was not filled out, we are unable to email you the session ID for your submission. Please copy the session ID below, as it will not be shown again.'
-    
-    return render_template('thank_you.html', session_id=session_id, message=message)
+    return session_id, destination_address, message
 
-@app.route('/load_form_data', methods=['POST'])
+@route('/load_form_data', methods=['POST'])
 def load_form():
     """
     App route to populate the fields a rendered form from a record in the database using the session_id as a key. This
@@ -179,13 +383,15 @@ def load_form():
     session_id = request.json.get("session_id")
     if not session_id:
         return jsonify({"error": "No session code provided."}), 400
-    # Retrieve data for the specified session_id, or return 404
-    df = datastore.read_data(id=session_id)
-    if df.empty:
+    # Read replicas may not have a very recent submission from this browser yet; read those from the primary
+    recently_submitted = 'last_submission_time' in session and datastore.is_recent_write(session['last_submission_time'])
+    # Retrieve data for the specified session_id (as a dict, without building a DataFrame), or return 404
+    record = datastore.get_record(session_id, include_archive=True, use_primary=recently_submitted)
+    if record is None:
         return jsonify({"error": "Session code not found."}), 404
-    return df.to_dict(orient="records")[0]
+    return jsonify(record)
 
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
     """
     User authentication app route. Uses flask-login management to authenticate users
@@ -209,7 +415,7 @@ def login():
             flash('Incorrect password. Please try again.','danger')
     return render_template('login.html')
 
-@app.route('/logout')
+@route('/logout')
 def logout():
     """
     Logout app route to remove session authentication variables.
@@ -224,7 +430,7 @@ def logout():
     flash("You have been logged out.",'info')
     return redirect(url_for('login'))
 
-@app.route('/dashboard', methods=['GET', 'POST'])
+@route('/dashboard', methods=['GET', 'POST'])
 @login_required
 def dashboard():
     """
@@ -243,11 +449,15 @@ def dashboard():
         target_format = data.get('format') 
         if target_format:
             # Key "format" exists, download datastore as file
-            return download_datastore_in_specific_format(datastore=datastore, target_format=target_format)
+            return download_datastore_in_specific_format(datastore=datastore, target_format=target_format, include_archive=bool(data.get('include_archive')))
     elif request.method == 'GET':
         # Prevent log suppression in request.method-serving Werkzeug thread 
         app_logger.disabled = False 
 
+        # Optionally bound the aggregations to a recent time window, so that they only scan recent data/partitions
+        trend_window_days = config['dashboard'].get('trend_window_days')
+        start_time = datetime.now() - timedelta(days=trend_window_days) if trend_window_days else None
+
         # Query aggregated data for submission time trend
         submissionTimeTrend_result = datastore.read_aggregated_data(
             group_by_field='timestamp',
@@ -258,7 +468,8 @@ def dashboard():
                     'target_field': 'timestamp',
                     'target_type': 'date'
                 }
-            }
+            },
+            start_time=start_time
         )
         submissionTimeTrend_labels = [x.strftime("%m-%d-%y") for x in submissionTimeTrend_result['grouping'].to_list()]
         submissionTimeTrend_data = submissionTimeTrend_result['aggregation'].to_list()
@@ -268,7 +479,8 @@ def dashboard():
         categoryDonut_1_result = datastore.read_aggregated_data(
             group_by_field=breakdown_field,
             aggregation_function='count',
-            aggregation_field='id'
+            aggregation_field='id',
+            start_time=start_time
         )
         if categoryDonut_1_result.empty:
             categoryDonut_1_labels = []
@@ -284,7 +496,7 @@ def dashboard():
             'classes': ['table','table-striped', 'table-bordered'],
             'index': False
         }
-        df = datastore.read_data()
+        df = datastore.read_data(analytical=True)
 
         return render_template(
             'dashboard.html',
@@ -293,10 +505,11 @@ def dashboard():
             submissionTimeTrend_data=submissionTimeTrend_data,
             categoryDonut_1_labels=categoryDonut_1_labels,
             categoryDonut_1_data=categoryDonut_1_data,
-            categoryDonut_1_title=categoryDonut_1_title
+            categoryDonut_1_title=categoryDonut_1_title,
+            archive_enabled=datastore.archive is not None
         )
 
-@app.route("/upload", methods=["GET", "POST"])
+@route("/upload", methods=["GET", "POST"])
 @login_required
 @role_required(authorized_roles=["admin"])
 def upload_file():
@@ -331,7 +544,7 @@ def upload_file():
 
     return render_template("upload.html")  # Render the HTML upload form
 
-@app.route('/generate_data_upload_template')
+@route('/generate_data_upload_template')
 def generate_data_upload_template():
     """
     Separate app route that simply returns an Excel-format template that contains all fields in the current
@@ -348,7 +561,7 @@ def generate_data_upload_template():
 
 @login_required
 @role_required(authorized_roles=["viewer","admin"])
-@app.route('/docs/<path:filename>')
+@route('/docs/<path:filename>')
 def serve_sphinx_docs(filename="index.html"):
     parent_dir = config['general']['sphinx_docs']['parent_dir']
     sub_path = config['general']['sphinx_docs']['sub_path']
@@ -363,5 +576,43 @@ def serve_sphinx_docs(filename="index.html"):
         abort(403)    
     return send_from_directory(safe_file_path, filename)
 
+@route('/metrics')
+def metrics():
+    """
+    App route that exposes the app's metrics (merged across worker processes) in the Prometheus text format. Scrapers can
+    authenticate with the configured 'scrape_token' as a bearer token; otherwise, an admin login is required.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    if metrics_registry is None:
+        abort(404)
+    def render_metrics():
+        return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+    scrape_token = metrics_options.get('scrape_token')
+    if scrape_token and hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {scrape_token}"):
+        return render_metrics()
+    return login_required(role_required(authorized_roles=["admin"])(render_metrics))()
+
+@click.command('archive-submissions')
+@click.option('--older-than-days', type=int, default=None, help="Archive submissions older than this many days (default: the configured 'archive_after_days').")
+@with_appcontext
+def archive_submissions(older_than_days):
+    """
+    Flask CLI command to move old submissions from the datastore into the Parquet archive. Meant to be run periodically,
+    e.g. from cron: `flask --app app archive-submissions`.
+
+    Args:
+        older_than_days(int): (Optional) Override for the configured archive age, in days.
+
+    Returns:
+        None
+    """
+    archived_row_count = datastore.archive_data(older_than_days=older_than_days)
+    click.echo(f"Archived {archived_row_count} submission(s).")
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
@@ -0,0 +1,362 @@
+import argparse
+import asyncio
+import io
+import json
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+from aiohttp import web
+from flask import Flask, render_template
+from werkzeug.wsgi import ClosingIterator
+
+import app as webform
+from loggers.managers import LoggerManager
+from loggers.tracing import RequestTrace, current_trace, trace_span
+from utils import ipinfo, ip_info_check_async, send_session_id_reminder_email_async
+
+## Async serving mode ##
+# Serves /submit, /thank-you and /load_form_data with asyncio handlers, so that a worker process keeps serving other requests
+# while these wait on the database, IPInfo and the email provider. All other routes are served by the Flask app (see
+# WSGIBridge). The handlers share the Flask app's state (set up by app.create_app()) and its session cookie, so a browser
+# can move freely between async and Flask routes.
+
+# The application keys under which the async serving mode keeps its state
+FLASK_APP = web.AppKey('flask_app', Flask)
+WSGI_BRIDGE = web.AppKey('wsgi_bridge', object)
+HTTP_SESSION = web.AppKey('http_session', aiohttp.ClientSession)
+IPINFO_HANDLER = web.AppKey('ipinfo_handler', object)
+
+# The routes served by the async handlers (by route name); requests to these are traced and measured here, since the
+# Flask request hooks do not see them
+ASYNC_ROUTE_NAMES = ('submit', 'thank_you', 'load_form')
+
+# Hop-by-hop headers of the Flask app's responses, which do not apply to the aiohttp connection
+HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'upgrade', 'proxy-authenticate', 'proxy-authorization', 'te', 'trailers'}
+
+def create_async_app(instance_config=None):
+    """
+    Create the Flask app (see app.create_app()) and an aiohttp app that serves its I/O-bound routes asynchronously:
+
+        1. /submit writes the submission with the datastore's async methods (see DatastoreManager.add_data_async()) and looks
+           up the client's IPInfo details with IPInfo's async handler.
+        2. /thank-you sends the session_id reminder email with an aiohttp client session.
+        3. /load_form_data restores a session with the datastore's async methods (see DatastoreManager.get_record_async()).
+
+    Every other route is served by the Flask app on a thread pool. The MySQL datastore's async driver (aiomysql by default)
+    is optional; without it, the datastore calls of the async routes run on a thread pool instead. Configured under the
+    'async_serving' key of the system config. For example:
+
+        system:
+            async_serving:
+                wsgi_threads: 32            # Threads serving the Flask app's routes
+                max_request_size_mb: 64     # Largest request body accepted (e.g. of an upload)
+                http_timeout_seconds: 10    # Timeout of the email provider's API calls
+
+    Serve it with `python async_app.py --port 5000`, or with gunicorn's aiohttp worker, e.g.
+    `gunicorn 'async_app:create_async_app()' --worker-class aiohttp.GunicornWebWorker --workers 2`.
+
+    Args:
+        instance_config(dict): (Optional) The main instance configuration; read from config/config.yaml if not given.
+
+    Returns:
+        An aiohttp web.Application.
+    """
+    flask_app = webform.create_app(instance_config)
+    async_serving_options = webform.config['system'].get('async_serving') or {}
+    web_app = web.Application(
+        middlewares=[observe_async_routes(webform.config['system'].get('tracing'), webform.metrics_registry)],
+        client_max_size=async_serving_options.get('max_request_size_mb', 64) * 1024 * 1024
+    )
+    web_app[FLASK_APP] = flask_app
+    web_app[WSGI_BRIDGE] = WSGIBridge(flask_app, threads=async_serving_options.get('wsgi_threads', 32))
+    web_app.router.add_post('/submit', submit, name='submit')
+    web_app.router.add_get('/thank-you', thank_you, name='thank_you')
+    web_app.router.add_post('/load_form_data', load_form, name='load_form')
+    web_app.router.add_route('*', '/{tail:.*}', web_app[WSGI_BRIDGE].handle, name='wsgi')
+    web_app.on_startup.append(start_async_clients)
+    web_app.on_cleanup.append(close_async_clients)
+    return web_app
+
+async def start_async_clients(web_app):
+    """Prepare the datastore for async requests and create the HTTP clients, in the worker process that serves the app."""
+    webform.datastore.init_async()
+    async_serving_options = webform.config['system'].get('async_serving') or {}
+    web_app[HTTP_SESSION] = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=async_serving_options.get('http_timeout_seconds', 10)))
+    access_token = ((webform.config['advanced_analytics'] or {}).get('sessiondata') or {}).get('ipinfo_token')
+    web_app[IPINFO_HANDLER] = ipinfo.getHandlerAsync(access_token) if access_token else None
+
+async def close_async_clients(web_app):
+    """Close the HTTP clients, the datastore's async resources and the Flask app's thread pool."""
+    await web_app[HTTP_SESSION].close()
+    if web_app[IPINFO_HANDLER] is not None:
+        await web_app[IPINFO_HANDLER].deinit()
+    await webform.datastore.close_async()
+    web_app[WSGI_BRIDGE].executor.shutdown(wait=False)
+
+def observe_async_routes(tracing_options, metrics_registry):
+    """
+    Create a middleware that traces (a sample of) the async routes' requests and records their latency and status code
+    metrics, as init_request_tracing() and init_metrics() do for the Flask app's routes.
+
+    Args:
+        tracing_options(dict): The 'tracing' key of the system config.
+        metrics_registry(MetricsRegistry): The Flask app's metrics registry, or None if metrics are not enabled.
+
+    Returns:
+        An aiohttp middleware.
+    """
+    logger = LoggerManager.get_logger()
+    tracing_enabled = bool(tracing_options and tracing_options.get('enabled'))
+    sample_rate = (tracing_options or {}).get('sample_rate', 1.0)
+    min_duration_ms = (tracing_options or {}).get('min_duration_ms', 0)
+
+    @web.middleware
+    async def middleware(request, handler):
+        route = request.match_info.route
+        if route.name not in ASYNC_ROUTE_NAMES:
+            return await handler(request)
+        trace_token = None
+        if tracing_enabled and (sample_rate >= 1.0 or random.random() < sample_rate):
+            trace_token = current_trace.set(RequestTrace(request.method, request.path))
+        start_time = time.perf_counter()
+        status_code = 500
+        try:
+            response = await handler(request)
+            status_code = response.status
+            return response
+        except web.HTTPException as e:
+            status_code = e.status
+            raise
+        finally:
+            if metrics_registry:
+                route_label = route.resource.canonical
+                metrics_registry.observe('http_request_duration_seconds', time.perf_counter() - start_time, {'route': route_label, 'method': request.method})
+                metrics_registry.inc('http_requests_total', {'route': route_label, 'method': request.method, 'status': str(status_code)})
+            if trace_token is not None:
+                trace = current_trace.get()
+                current_trace.reset(trace_token)
+                trace.status_code = status_code
+                timing = trace.to_dict()
+                if timing['duration_ms'] >= min_duration_ms:
+                    logger.info(json.dumps(timing))
+    return middleware
+
+## Async routes ##
+async def submit(request):
+    """Async version of the /submit route (see app.submit())."""
+    form = await request.post()
+    submission_data = webform.build_submission_data(form, user_agent=request.headers.get('User-Agent'), ip_address=get_ip_address(request))
+    if webform.config['advanced_analytics'] and 'sessiondata' in webform.config['advanced_analytics'].keys():
+        with trace_span('ip_info_check'):
+            ip_info = await ip_info_check_async(submission_data['ip_address'], form_validation_options=webform.config['advanced_analytics'], ipinfo_handler=request.app[IPINFO_HANDLER])
+            submission_data.update(ip_info or {})
+    webform.add_form_validations(submission_data)
+
+    # Save data to datastore
+    await webform.datastore.add_data_async(submission_data)
+    session_data = open_flask_session(request)
+    webform.remember_submission_in_session(session_data, submission_data)
+    response = web.Response(status=302, headers={'Location': str(request.app.router['thank_you'].url_for())})
+    save_flask_session(request, session_data, response)
+    return response
+
+async def thank_you(request):
+    """Async version of the /thank-you route (see app.thank_you())."""
+    session_data = open_flask_session(request)
+    session_id, destination_address, message = webform.pop_thank_you_details(session_data)
+    if destination_address:
+        with trace_span('send_session_id_reminder_email'):
+            await send_session_id_reminder_email_async(destination_address=destination_address, session_id=session_id, config=webform.config, http_session=request.app[HTTP_SESSION])
+    response = web.Response(text=render_flask_template(request, 'thank_you.html', session_id=session_id, message=message), content_type='text/html')
+    save_flask_session(request, session_data, response)
+    return response
+
+async def load_form(request):
+    """Async version of the /load_form_data route (see app.load_form())."""
+    if request.content_type != 'application/json':
+        raise web.HTTPUnsupportedMediaType(text="Did not attempt to load JSON data because the request Content-Type was not 'application/json'.")
+    try:
+        load_request = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="Failed to decode JSON object.")
+    # Pull session ID from request
+    session_id = load_request.get("session_id") if isinstance(load_request, dict) else None
+    if not session_id:
+        return flask_json_response(request, {"error": "No session code provided."}, status=400)
+    # Read replicas may not have a very recent submission from this browser yet; read those from the primary
+    session_data = open_flask_session(request)
+    recently_submitted = 'last_submission_time' in session_data and webform.datastore.is_recent_write(session_data['last_submission_time'])
+    record = await webform.datastore.get_record_async(session_id, include_archive=True, use_primary=recently_submitted)
+    if record is None:
+        return flask_json_response(request, {"error": "Session code not found."}, status=404)
+    return flask_json_response(request, record)
+
+## Flask interoperability ##
+def get_ip_address(request):
+    """Like utils.get_ip_address(), for an aiohttp request."""
+    if request.headers.get('X-Forwarded-For'):
+        return request.headers.get('X-Forwarded-For').split(',')[0]
+    return request.remote
+
+def open_flask_session(request):
+    """
+    Load the Flask session from the request's session cookie, with the Flask app's session interface.
+
+    Args:
+        request(web.Request): The request.
+
+    Returns:
+        The session (a dict-like SessionMixin).
+    """
+    flask_app = request.app[FLASK_APP]
+    # The default (signed cookie) session interface only reads the request's cookies
+    return flask_app.session_interface.open_session(flask_app, request)
+
+def save_flask_session(request, session_data, response):
+    """
+    Save the Flask session into the response's session cookie, with the Flask app's session interface.
+
+    Args:
+        request(web.Request): The request.
+        session_data: The session opened by open_flask_session().
+        response(web.Response): The response to set the cookie on.
+
+    Returns:
+        None
+    """
+    flask_app = request.app[FLASK_APP]
+    # The session interface sets the cookie on a Flask response, from which the headers are copied
+    cookie_response = flask_app.response_class()
+    flask_app.session_interface.save_session(flask_app, session_data, cookie_response)
+    for cookie in cookie_response.headers.getlist('Set-Cookie'):
+        response.headers.add('Set-Cookie', cookie)
+    if 'Vary' in cookie_response.headers:
+        response.headers['Vary'] = cookie_response.headers['Vary']
+
+def render_flask_template(request, template_name, **context):
+    """Render one of the Flask app's templates, in a Flask request context for the request (e.g. for url_for())."""
+    flask_app = request.app[FLASK_APP]
+    with flask_app.request_context(build_wsgi_environ(request, b'')):
+        return render_template(template_name, **context)
+
+def flask_json_response(request, obj, status=200):
+    """Serialize obj to a JSON response with the Flask app's JSON provider, as jsonify() does."""
+    flask_response = request.app[FLASK_APP].json.response(obj)
+    return web.Response(body=flask_response.get_data(), status=status, content_type=flask_response.mimetype)
+
+def build_wsgi_environ(request, body):
+    """
+    Build the WSGI environ of an aiohttp request.
+
+    Args:
+        request(web.Request): The request.
+        body(bytes): The request's body.
+
+    Returns:
+        A WSGI environ dict.
+    """
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'SCRIPT_NAME': '',
+        # WSGI strings are the request's bytes decoded as latin-1
+        'PATH_INFO': request.path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': request.query_string,
+        'SERVER_NAME': request.url.host or 'localhost',
+        'SERVER_PORT': str(request.url.port or ''),
+        'SERVER_PROTOCOL': f"HTTP/{request.version.major}.{request.version.minor}",
+        'REMOTE_ADDR': request.remote or '',
+        'CONTENT_TYPE': request.headers.get('Content-Type', ''),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': request.scheme,
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in request.headers.items():
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        if key in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+            continue
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+class WSGIBridge:
+    """
+    Serves requests with the Flask app on a thread pool, so that the async serving mode serves all of the app's routes. The
+    request body is read before the Flask app is called; the response body is streamed back as the Flask app produces it
+    (e.g. for exports).
+
+    Attributes:
+        flask_app(Flask): The Flask app.
+        executor(ThreadPoolExecutor): The threads that run the Flask app.
+
+    Usage:
+        >>> bridge = WSGIBridge(flask_app, threads=32)
+        >>> web_app.router.add_route('*', '/{tail:.*}', bridge.handle)
+    """
+    def __init__(self, flask_app, threads=32):
+        self.flask_app = flask_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+
+    async def handle(self, request):
+        """
+        aiohttp handler that serves a request with the Flask app.
+
+        Args:
+            request(web.Request): The request.
+
+        Returns:
+            A web.StreamResponse.
+        """
+        loop = asyncio.get_running_loop()
+        environ = build_wsgi_environ(request, await request.read())
+        status, headers, app_iter = await loop.run_in_executor(self.executor, self.start_flask_response, environ)
+        try:
+            response = web.StreamResponse(status=status)
+            for name, value in headers:
+                if name.lower() not in HOP_BY_HOP_HEADERS:
+                    response.headers.add(name, value)
+            await response.prepare(request)
+            end_of_body = object()
+            while True:
+                chunk = await loop.run_in_executor(self.executor, next, app_iter, end_of_body)
+                if chunk is end_of_body:
+                    break
+                await response.write(chunk)
+            await response.write_eof()
+            return response
+        finally:
+            await loop.run_in_executor(self.executor, app_iter.close)
+
+    def start_flask_response(self, environ):
+        """
+        Call the Flask app with a WSGI environ, up to the start of its response.
+
+        Args:
+            environ(dict): The WSGI environ (see build_wsgi_environ()).
+
+        Returns:
+            A (status code, headers, response body iterator) tuple.
+        """
+        response_start = {}
+        def start_response(status, headers, exc_info=None):
+            response_start['status'] = int(status.split(' ', 1)[0])
+            response_start['headers'] = headers
+        app_iter = self.flask_app(environ, start_response)
+        # ClosingIterator calls the body's close() (if it has one), which the WSGI server must call once it is done
+        return response_start['status'], response_start['headers'], ClosingIterator(app_iter)
+
+def main():
+    """Serve the async serving mode with aiohttp's own server."""
+    parser = argparse.ArgumentParser(description="Serve the app with its I/O-bound routes handled asynchronously (see create_async_app()).")
+    parser.add_argument('--host', default='127.0.0.1', help="Interface to listen on (default: 127.0.0.1).")
+    parser.add_argument('--port', type=int, default=5000, help="Port to listen on (default: 5000).")
+    args = parser.parse_args()
+    web.run_app(create_async_app(), host=args.host, port=args.port)
+
+if __name__ == '__main__':
+    main()
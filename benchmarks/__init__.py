@@ -0,0 +1,10 @@
+"""
+benchmarks
+==========
+
+Standalone performance benchmarks for the datastore layer. Benchmarks run against a temporary SQLite datastore built from the
+instance config and form configuration sheet, so they need no database server. Run them from the repository root, e.g.:
+
+    >>> python -m benchmarks.record_reads --rows 10000 --iterations 2000
+
+"""
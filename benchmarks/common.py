@@ -0,0 +1,116 @@
+import copy
+import os
+import statistics
+import sys
+from datetime import datetime, timedelta
+from flask import Flask
+
+from datamodels.managers import DatastoreManager
+from loggers.managers import LoggerManager
+from utils import LazyModule, read_instance_config, generate_websafe_session_id
+
+# Not imported up front, so that the startup benchmark's bare worker can use these helpers without importing pandas
+pd = LazyModule('pandas')
+
+def benchmark_config(form_config_folder, form_config_file_name, breakdown_field='id'):
+    """
+    Build a minimal instance config for benchmarks, so that they run without a config/config.yaml file. Only warnings are
+    logged, since logging every operation would dominate the measurements.
+
+    Args:
+        form_config_folder(str): The absolute path of the folder containing the form configuration sheet.
+        form_config_file_name(str): The file name of the form configuration sheet.
+        breakdown_field(str): (Optional, default='id') The field the dashboard's breakdown chart groups by.
+
+    Returns:
+        An instance config dict.
+    """
+    return {
+        'general': {'websafe_session_id_size': 16},
+        'form': {'form_config_folder': form_config_folder, 'form_config_file_name': form_config_file_name},
+        'dashboard': {'breakdown_visualization_field': breakdown_field},
+        'system': {
+            'logging': {
+                'version': 1,
+                'log_dir': os.path.join(form_config_folder, 'logs'),
+                'handlers': {'console': {'class': 'logging.StreamHandler', 'level': 'WARNING'}},
+                'loggers': {'benchmark': {'level': 'WARNING', 'handlers': ['console']}},
+            },
+        },
+    }
+
+def create_benchmark_datastore(database_folder, config=None):
+    """
+    Create a DatastoreManager backed by a fresh SQLite database, using the instance config (for logging and the form
+    configuration sheet) with every optional datastore feature (caches, replicas, archive) turned off.
+
+    Args:
+        database_folder(str): The folder in which to create the SQLite database.
+        config(dict): (Optional) An instance config to use instead of reading config/config.yaml.
+
+    Returns:
+        A (DatastoreManager, config) tuple.
+    """
+    config = copy.deepcopy(config or read_instance_config(config_folder='config', config_file_name='config.yaml'))
+    LoggerManager.get_logger(config)
+    config['datastore'] = {
+        'datastore_type': 'sqlite',
+        'datastore_params': {'sqlite_database_file': os.path.join(database_folder, 'benchmark.db')},
+    }
+    datastore = DatastoreManager(Flask(__name__), config)
+    # Statement echoing would dominate the measurements
+    datastore.datastore.engine.echo = False
+    return datastore, config
+
+def seed_rows(datastore, config, row_count):
+    """
+    Insert rows containing only the 'id' and 'timestamp' fields, one minute apart.
+
+    Args:
+        datastore(DatastoreManager): The datastore to seed.
+        config(dict): The instance config.
+        row_count(int): The number of rows to insert.
+
+    Returns:
+        The list of inserted session_ids.
+    """
+    start_time = datetime.now() - timedelta(minutes=row_count)
+    ids = [generate_websafe_session_id(config['general']['websafe_session_id_size']) for _ in range(row_count)]
+    datastore.add_bulk_data(pd.DataFrame({
+        'id': ids,
+        'timestamp': [start_time + timedelta(minutes=i) for i in range(row_count)],
+    }))
+    return ids
+
+def summarize_latencies(latencies_seconds):
+    """
+    Summarize a list of latencies.
+
+    Args:
+        latencies_seconds(list): Latencies, in seconds.
+
+    Returns:
+        A dict with the mean, p50 and p99 latencies in microseconds.
+    """
+    # quantiles() needs at least two latencies
+    quantiles = statistics.quantiles(latencies_seconds, n=100) if len(latencies_seconds) > 1 else latencies_seconds * 99
+    return {
+        'mean_us': round(statistics.fmean(latencies_seconds) * 1e6, 1),
+        'p50_us': round(quantiles[49] * 1e6, 1),
+        'p99_us': round(quantiles[98] * 1e6, 1),
+    }
+
+def peak_rss_mib():
+    """
+    Return the peak resident set size of the current process.
+
+    Returns:
+        The peak RSS in MiB, or None on platforms without the resource module (e.g. Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return round(peak_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
@@ -0,0 +1,398 @@
+"""
+Generate synthetic form configuration sheets and submission data, e.g. for benchmarks and load tests.
+
+Generated form configuration sheets have the Pages and Fields sheets that formbuilder.form_utils and
+formbuilder.schema_utils expect, with 'input', 'select' and 'text' fields of every data type, select options (including
+options that contain a comma), group_id groups of input fields and indexed fields. Submission data is generated from a
+Fields sheet, with realistic values for well-known fields (names, emails, ages...) and random, valid values for the rest,
+and is streamed in chunks so that millions of rows can be generated in bounded memory. All generated data is reproducible
+with a seed.
+
+Usage:
+    python -m benchmarks.generators form --fields 200 --pages 5 --output config/form_config/load_test.xlsx
+    python -m benchmarks.generators submissions --form config/form_config/load_test.xlsx --rows 1000000 --to csv --output submissions.csv
+    python -m benchmarks.generators submissions --rows 1000000 --to datastore   # The datastore and form configured in config/config.yaml
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+from formbuilder.schema_utils import parse_select_options
+
+# The kinds of generic fields generated, in rotation: (field_type, data_type, max_length)
+FIELD_KINDS = [
+    ('input', 'STRING', 50),
+    ('select', 'STRING', None),
+    ('input', 'INTEGER', 4),
+    ('input', 'FLOAT', None),
+    ('text', 'STRING', None),
+]
+
+# Well-known fields placed at the start of generated forms, with realistic values: (backend_field_name, field_label,
+# field_type, data_type, select_options, max_length, indexed)
+WELL_KNOWN_FIELDS = [
+    ('applicant_name', 'Full Name', 'input', 'STRING', None, 80, None),
+    ('applicant_email', 'Email Address', 'input', 'STRING', None, 120, None),
+    ('age', 'Age', 'input', 'INTEGER', None, 3, 'Yes'),
+    ('industry', 'Industry', 'select', 'STRING', 'Technology, Healthcare, Finance, Education, Manufacturing, Retail, "Food, Beverage and Hospitality"', None, 'Yes'),
+    ('years_of_experience', 'Years of Experience', 'input', 'INTEGER', None, 2, None),
+    ('annual_revenue', 'Annual Revenue (USD)', 'input', 'FLOAT', None, None, None),
+    ('comments', 'Additional Comments', 'text', 'STRING', None, None, None),
+]
+
+FIRST_NAMES = ['James', 'Mary', 'Wei', 'Priya', 'Carlos', 'Fatima', 'Olga', 'Kwame', 'Aiko', 'Liam', 'Sofia', 'Omar', 'Elena', 'Noah', 'Zara', 'Mateo']
+LAST_NAMES = ['Smith', 'Garcia', 'Chen', 'Patel', 'Okafor', 'Kowalski', 'Nguyen', 'Haddad', 'Johnson', 'Rossi', 'Tanaka', 'Silva', 'Muller', 'Khan']
+EMAIL_DOMAINS = ['example.com', 'example.org', 'mail.example.net', 'buffalo.example.edu']
+WORDS = ('the a of to and in for on with by from our team business growth market customer service product data program '
+         'community funding support project plan local new small regional training skills network partner goal year').split()
+
+def generate_form_config(field_count, page_count=5, group_size=3, required_ratio=0.2, seed=None):
+    """
+    Generate the Pages and Fields sheets of a form configuration sheet. The well-known fields in WELL_KNOWN_FIELDS come first,
+    followed by generic fields that cycle through the kinds in FIELD_KINDS; fields are spread evenly over the pages, and
+    consecutive input fields on a page are put into groups of up to group_size fields.
+
+    Note that the form's page navigation (static/scripts/main.js) currently expects 5 pages.
+
+    Args:
+        field_count(int): The number of fields.
+        page_count(int): (Optional, default=5) The number of pages.
+        group_size(int): (Optional, default=3) The maximum number of input fields per group; 1 disables grouping.
+        required_ratio(float): (Optional, default=0.2) The fraction of fields that are required.
+        seed(int): (Optional) The random seed for the select options and required fields.
+
+    Returns:
+        A (pages, fields) tuple of Pandas DataFrames.
+    """
+    rng = np.random.default_rng(seed)
+    pages = pd.DataFrame({
+        'page_number': range(1, page_count + 1),
+        'page_title': [f"Page {page_number}" for page_number in range(1, page_count + 1)],
+        'page_description': [f"Generated page {page_number} of {page_count}" for page_number in range(1, page_count + 1)],
+    })
+    fields = []
+    for index in range(field_count):
+        if index < len(WELL_KNOWN_FIELDS):
+            backend_field_name, field_label, field_type, data_type, select_options, max_length, indexed = WELL_KNOWN_FIELDS[index]
+        else:
+            field_type, data_type, max_length = FIELD_KINDS[index % len(FIELD_KINDS)]
+            backend_field_name, field_label, indexed = f"field_{index:03d}", f"Field {index}", None
+            select_options = generate_select_options(rng) if field_type == 'select' else None
+        fields.append({
+            'backend_field_name': backend_field_name,
+            'field_label': field_label,
+            'required': 'Yes' if rng.random() < required_ratio else 'No',
+            'field_type': field_type,
+            'data_type': data_type,
+            'select_options': select_options,
+            'page_number': index * page_count // field_count + 1,
+            'group_id': None,
+            'max_length': max_length,
+            'indexed': indexed,
+        })
+    assign_groups(fields, group_size)
+    return pages, pd.DataFrame(fields)
+
+def generate_select_options(rng):
+    """Generate a comma-separated 'select_options' value with 3-8 options, occasionally including a quoted option with a comma."""
+    options = [f"Option {chr(ord('A') + index)}" for index in range(rng.integers(3, 9))]
+    if rng.random() < 0.3:
+        options[-1] = f"\"{options[-1]}, Inc.\""
+    return ', '.join(options)
+
+def assign_groups(fields, group_size):
+    """Give runs of consecutive input fields on the same page a shared group_id, in groups of up to group_size fields."""
+    if group_size < 2:
+        return
+    group_id, group_members = 0, 0
+    for index, field in enumerate(fields):
+        previous_field = fields[index - 1] if index else None
+        continues_group = (
+            previous_field is not None and previous_field['group_id'] is not None and group_members < group_size
+            and previous_field['page_number'] == field['page_number']
+        )
+        if field['field_type'] != 'input':
+            group_members = 0
+            continue
+        if not continues_group:
+            group_id, group_members = group_id + 1, 0
+        field['group_id'] = group_id
+        group_members += 1
+
+def write_form_config(path, field_count, page_count=5, **kwargs):
+    """
+    Write a generated form configuration sheet (see generate_form_config()) to an Excel workbook.
+
+    Args:
+        path(str): The path of the workbook.
+        field_count(int): The number of fields.
+        page_count(int): (Optional, default=5) The number of pages.
+        **kwargs: Other arguments for generate_form_config().
+
+    Returns:
+        The Fields sheet, as a Pandas DataFrame.
+    """
+    pages, fields = generate_form_config(field_count, page_count, **kwargs)
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        pages.to_excel(writer, sheet_name='Pages', index=False)
+        fields.to_excel(writer, sheet_name='Fields', index=False)
+    return fields
+
+def read_form_fields(path):
+    """
+    Read the Fields sheet of a form configuration sheet.
+
+    Args:
+        path(str): The path of the workbook.
+
+    Returns:
+        A Pandas DataFrame, with missing values set to None.
+    """
+    return pd.read_excel(path, 'Fields').replace({np.nan: None})
+
+def read_configured_form_fields(config):
+    """
+    Read the Fields sheet of the form configured in an instance config.
+
+    Args:
+        config(dict): The main instance configuration (from YAML).
+
+    Returns:
+        A Pandas DataFrame, with missing values set to None.
+    """
+    package_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return read_form_fields(os.path.join(package_folder, 'config', config['form']['form_config_folder'], config['form']['form_config_file_name']))
+
+def generate_words(rng, row_count, min_words, max_words, max_length=None):
+    """Generate row_count strings of random words, truncated to max_length characters."""
+    word_counts = rng.integers(min_words, max_words + 1, size=row_count)
+    word_indexes = rng.integers(0, len(WORDS), size=(row_count, max_words))
+    values = [' '.join(WORDS[word_index] for word_index in row[:word_count]).capitalize() for row, word_count in zip(word_indexes, word_counts)]
+    return [value[:max_length] for value in values] if max_length else values
+
+def generate_field_values(field, row_count, rng):
+    """
+    Generate values for a field of the Fields sheet: realistic values for the WELL_KNOWN_FIELDS, and random values that are
+    valid for the field's type otherwise.
+
+    Args:
+        field(dict): A row of the Fields sheet.
+        row_count(int): The number of values.
+        rng(np.random.Generator): The random number generator.
+
+    Returns:
+        A list or NumPy array of values.
+    """
+    name = field['backend_field_name']
+    max_length = int(field['max_length']) if pd.notnull(field.get('max_length')) else None
+    if field['field_type'] == 'select':
+        options = np.array(parse_select_options(field['select_options']), dtype=object)
+        return options[rng.integers(0, len(options), size=row_count)]
+    if 'email' in name:
+        first_names = rng.choice(FIRST_NAMES, size=row_count)
+        last_names = rng.choice(LAST_NAMES, size=row_count)
+        numbers = rng.integers(1, 1000, size=row_count)
+        domains = rng.choice(EMAIL_DOMAINS, size=row_count)
+        return [f"{first.lower()}.{last.lower()}{number}@{domain}"[:max_length or 255] for first, last, number, domain in zip(first_names, last_names, numbers, domains)]
+    if name.endswith('_name'):
+        return [f"{first} {last}" for first, last in zip(rng.choice(FIRST_NAMES, size=row_count), rng.choice(LAST_NAMES, size=row_count))]
+    if name == 'age':
+        return rng.integers(18, 80, size=row_count)
+    if name.startswith('years_'):
+        return rng.integers(0, 45, size=row_count)
+    if field['data_type'] == 'INTEGER':
+        return rng.integers(0, 10 ** min(max_length or 4, 9), size=row_count)
+    if field['data_type'] == 'FLOAT':
+        return np.round(rng.lognormal(mean=11, sigma=1.5, size=row_count), 2)
+    if field['data_type'] == 'BOOLEAN':
+        return rng.random(row_count) < 0.5
+    if field['field_type'] == 'text':
+        return generate_words(rng, row_count, 5, 40, max_length)
+    return generate_words(rng, row_count, 1, 4, max_length or 255)
+
+def generate_session_ids(row_count, rng, size=8):
+    """Generate session_ids in the format of utils.generate_websafe_session_id() (2*size hex digits), from the seeded rng."""
+    return [row.tobytes().hex() for row in rng.integers(0, 256, size=(row_count, size), dtype=np.uint8)]
+
+def generate_submission_rows(fields, row_count, ids=None, start_time=None, rng=None, interval=timedelta(minutes=1), blank_ratio=0.0):
+    """
+    Generate a DataFrame of submission rows for a Fields sheet.
+
+    Args:
+        fields(pd.DataFrame): The Fields sheet.
+        row_count(int): The number of rows.
+        ids(list): (Optional) The session_ids of the rows; generated if not given.
+        start_time(datetime): (Optional) The timestamp of the first row; defaults to row_count intervals ago.
+        rng(np.random.Generator): (Optional) The random number generator to use.
+        interval(timedelta): (Optional, default=1 minute) The average time between consecutive rows.
+        blank_ratio(float): (Optional, default=0) The fraction of values of non-required fields that are left blank.
+
+    Returns:
+        A Pandas DataFrame with 'id', 'timestamp' and one column per field.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    start_time = start_time or datetime.now() - interval * row_count
+    # Jitter each timestamp within its interval, keeping the rows in time order
+    offsets = (np.arange(row_count) + rng.random(row_count)) * interval.total_seconds()
+    rows = {
+        'id': ids if ids is not None else generate_session_ids(row_count, rng),
+        'timestamp': (pd.Timestamp(start_time) + pd.to_timedelta(offsets, unit='s')).floor('us'),
+    }
+    for field in fields.to_dict(orient='records'):
+        values = pd.Series(generate_field_values(field, row_count, rng), dtype=object)
+        if blank_ratio and str(field.get('required')).lower() != 'yes':
+            values[rng.random(row_count) < blank_ratio] = None
+        rows[field['backend_field_name']] = values
+    return pd.DataFrame(rows)
+
+def iter_submission_chunks(fields, row_count, chunk_size=10000, seed=None, start_time=None, interval=timedelta(minutes=1), blank_ratio=0.1, id_size=8):
+    """
+    Generate submission rows in chunks, so that any number of rows can be generated in bounded memory. The rows are in time
+    order across chunks, and the same seed and chunk size always generate the same rows.
+
+    Args:
+        fields(pd.DataFrame): The Fields sheet.
+        row_count(int): The total number of rows.
+        chunk_size(int): (Optional, default=10000) The number of rows per chunk.
+        seed(int): (Optional) The random seed.
+        start_time(datetime): (Optional) The timestamp of the first row; defaults to row_count intervals ago.
+        interval(timedelta): (Optional, default=1 minute) The average time between consecutive rows.
+        blank_ratio(float): (Optional, default=0.1) The fraction of values of non-required fields that are left blank.
+        id_size(int): (Optional, default=8) The size of the generated session_ids (see utils.generate_websafe_session_id()).
+
+    Returns:
+        A generator of Pandas DataFrames.
+    """
+    rng = np.random.default_rng(seed)
+    start_time = start_time or datetime.now() - interval * row_count
+    for chunk_start in range(0, row_count, chunk_size):
+        chunk_row_count = min(chunk_size, row_count - chunk_start)
+        yield generate_submission_rows(
+            fields, chunk_row_count, ids=generate_session_ids(chunk_row_count, rng, id_size), rng=rng,
+            start_time=start_time + interval * chunk_start, interval=interval, blank_ratio=blank_ratio
+        )
+
+def write_submissions_csv(path, chunks):
+    """
+    Stream submission chunks into a CSV file, e.g. for /upload.
+
+    Args:
+        path(str): The path of the CSV file.
+        chunks(iterable): Pandas DataFrames of submissions.
+
+    Returns:
+        The number of rows written.
+    """
+    row_count = 0
+    for chunk_number, chunk in enumerate(chunks):
+        chunk.to_csv(path, mode='w' if chunk_number == 0 else 'a', header=chunk_number == 0, index=False)
+        row_count += len(chunk)
+    return row_count
+
+def write_submissions_xlsx(path, chunks):
+    """
+    Stream submission chunks into an Excel workbook (with a write-only openpyxl workbook, so rows are not kept in memory),
+    e.g. for /upload. Excel sheets are limited to 1,048,576 rows.
+
+    Args:
+        path(str): The path of the workbook.
+        chunks(iterable): Pandas DataFrames of submissions.
+
+    Returns:
+        The number of rows written.
+    """
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('upload')
+    row_count = 0
+    for chunk_number, chunk in enumerate(chunks):
+        if chunk_number == 0:
+            sheet.append(list(chunk.columns))
+        if row_count + len(chunk) >= 1048576:
+            raise ValueError('ERROR: Excel sheets are limited to 1,048,576 rows; write a CSV file instead.')
+        for row in chunk.astype(object).where(chunk.notnull(), None).itertuples(index=False):
+            sheet.append([value.to_pydatetime() if isinstance(value, pd.Timestamp) else value for value in row])
+        row_count += len(chunk)
+    workbook.save(path)
+    return row_count
+
+def load_submissions_into_datastore(datastore, chunks):
+    """
+    Stream submission chunks into a datastore with bulk UPSERTs (DatastoreManager.add_bulk_data(), i.e. upsert_bulk_data()).
+
+    Args:
+        datastore(DatastoreManager): The datastore to load.
+        chunks(iterable): Pandas DataFrames of submissions.
+
+    Returns:
+        The number of rows loaded.
+    """
+    row_count = 0
+    for chunk in chunks:
+        datastore.add_bulk_data(chunk)
+        row_count += len(chunk)
+        print(f"Loaded {row_count} row(s)", file=sys.stderr)
+    return row_count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    form_parser = subparsers.add_parser('form', help='Generate a form configuration sheet')
+    form_parser.add_argument('--fields', type=int, required=True, help='Number of fields')
+    form_parser.add_argument('--pages', type=int, default=5, help='Number of pages')
+    form_parser.add_argument('--group-size', type=int, default=3, help='Maximum input fields per group (1 disables groups)')
+    form_parser.add_argument('--required-ratio', type=float, default=0.2, help='Fraction of required fields')
+    form_parser.add_argument('--seed', type=int, default=None, help='Random seed')
+    form_parser.add_argument('--output', required=True, help='Path of the workbook to write')
+
+    submissions_parser = subparsers.add_parser('submissions', help='Generate submission data')
+    submissions_parser.add_argument('--form', help='Form configuration sheet to generate data for (defaults to the configured form when loading a datastore)')
+    submissions_parser.add_argument('--rows', type=int, required=True, help='Number of rows')
+    submissions_parser.add_argument('--chunk-size', type=int, default=10000, help='Rows generated (and loaded) at a time')
+    submissions_parser.add_argument('--days', type=float, default=90, help='Time span of the submissions, ending now')
+    submissions_parser.add_argument('--blank-ratio', type=float, default=0.1, help='Fraction of blank values in non-required fields')
+    submissions_parser.add_argument('--seed', type=int, default=None, help='Random seed')
+    submissions_parser.add_argument('--to', choices=['csv', 'xlsx', 'datastore'], default='csv', help='Write a file for /upload, or load the configured datastore')
+    submissions_parser.add_argument('--output', help='Path of the file to write (csv/xlsx)')
+    args = parser.parse_args()
+
+    if args.command == 'form':
+        fields = write_form_config(args.output, args.fields, args.pages, group_size=args.group_size, required_ratio=args.required_ratio, seed=args.seed)
+        print(f"Wrote {len(fields)} field(s) on {args.pages} page(s) to {args.output}", file=sys.stderr)
+        return
+
+    datastore = config = None
+    if args.to == 'datastore':
+        from flask import Flask
+        from datamodels.managers import DatastoreManager
+        from loggers.managers import LoggerManager
+        from utils import read_instance_config
+        config = read_instance_config(config_folder='config', config_file_name='config.yaml')
+        LoggerManager.get_logger(config)
+        datastore = DatastoreManager(Flask(__name__), config)
+    elif not args.output:
+        parser.error('--output is required when writing a file.')
+    if args.form:
+        fields = read_form_fields(args.form)
+    elif config:
+        fields = read_configured_form_fields(config)
+    else:
+        parser.error('--form is required when writing a file.')
+
+    interval = timedelta(days=args.days) / max(args.rows, 1)
+    id_size = config['general']['websafe_session_id_size'] if config else 8
+    chunks = iter_submission_chunks(fields, args.rows, chunk_size=args.chunk_size, seed=args.seed, interval=interval, blank_ratio=args.blank_ratio, id_size=id_size)
+    if args.to == 'csv':
+        row_count = write_submissions_csv(args.output, chunks)
+    elif args.to == 'xlsx':
+        row_count = write_submissions_xlsx(args.output, chunks)
+    else:
+        row_count = load_submissions_into_datastore(datastore, chunks)
+    print(f"Generated {row_count} submission(s)", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,340 @@
+"""
+Load test the app over HTTP with scripted user journeys, to see how the routes interact under concurrency (e.g. dashboard
+scans slowing down submissions):
+
+    applicant   GET /, optionally POST /load_form_data (restoring an earlier submission), POST /submit, GET /thank-you
+    admin       POST /login (once per user), GET /dashboard, optionally POST /dashboard (an export)
+
+In closed-loop mode, a fixed number of applicant and admin users run journeys back to back (with an optional think time);
+in open-loop mode, journeys start at a fixed average rate (Poisson arrivals), however slowly the app responds, and journey
+latencies include any time spent waiting for a free client thread. The app is either started locally with a chosen worker
+model, or reached at --base-url.
+
+Reports the count, error rate and mean/p50/p99 latency of every route and journey as JSON (on stdout, or to --output),
+along with the commit and options. The client is a single Python process; for very high loads, run several in parallel.
+
+Usage:
+    python -m benchmarks.generators submissions --rows 100000 --to datastore   # Seed the configured datastore first
+    python -m benchmarks.load_test --server threaded --applicants 20 --admins 2 --admin-password <password> --duration 60
+    python -m benchmarks.load_test --server gunicorn --workers 4 --threads 8 --mode open --rate 50 --admins 0
+    python -m benchmarks.load_test --server async --mode open --rate 200 --admins 0
+    python -m benchmarks.load_test --base-url http://localhost:5000 --form config/form_config/form.xlsx --applicants 10 --admins 0
+"""
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import requests
+
+from benchmarks.common import summarize_latencies
+from benchmarks.generators import iter_submission_chunks, read_configured_form_fields, read_form_fields
+from benchmarks.suite import get_git_commit
+
+PACKAGE_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SESSION_ID_PATTERN = re.compile(r'id="session_id_generated"[^>]*value="([^"]*)"')
+FORM_LOAD_TIME_PATTERN = re.compile(r'id="form_load_time"[^>]*value="([^"]*)"')
+
+class LoadTestResults:
+    """
+    Thread-safe collection of request and journey outcomes.
+
+    Attributes:
+        latencies(dict): The latencies (in seconds) of successful requests/journeys, by name.
+        errors(dict): The number of failed requests/journeys, by name.
+        error_samples(dict): The first few error messages, by name.
+    """
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.error_samples = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, duration_seconds, error=None):
+        """Record the outcome of a request or journey."""
+        with self.lock:
+            self.latencies.setdefault(name, [])
+            self.errors.setdefault(name, 0)
+            if error is None:
+                self.latencies[name].append(duration_seconds)
+            else:
+                self.errors[name] += 1
+                samples = self.error_samples.setdefault(name, [])
+                if len(samples) < 5:
+                    samples.append(error)
+
+    def summarize(self, elapsed_seconds):
+        """
+        Summarize the recorded outcomes.
+
+        Args:
+            elapsed_seconds(float): The duration of the load test, for the throughputs.
+
+        Returns:
+            A dict of summaries (count, errors, error rate, throughput, latencies), by name.
+        """
+        summary = {}
+        with self.lock:
+            for name in sorted(self.latencies):
+                latencies, errors = self.latencies[name], self.errors[name]
+                count = len(latencies) + errors
+                summary[name] = {
+                    'count': count,
+                    'errors': errors,
+                    'error_rate': round(errors / count, 4),
+                    'throughput_per_s': round(count / elapsed_seconds, 2),
+                    **(summarize_latencies(latencies) if latencies else {}),
+                    **({'error_samples': self.error_samples[name]} if errors else {}),
+                }
+        return summary
+
+class JourneyRunner:
+    """
+    Runs the scripted journeys against the app, recording the outcome of every request.
+
+    Attributes:
+        base_url(str): The URL of the app.
+        results(LoadTestResults): Where outcomes are recorded.
+        submission_rows(list): Generated form responses (dicts of field values), used in turn for submissions.
+        options(argparse.Namespace): The load test options.
+        submitted_ids(list): The session_ids submitted so far, restored by later applicant journeys.
+    """
+    def __init__(self, base_url, results, submission_rows, options):
+        self.base_url = base_url.rstrip('/')
+        self.results = results
+        self.submission_rows = submission_rows
+        self.options = options
+        self.submitted_ids = []
+        self.submission_counter = 0
+        self.lock = threading.Lock()
+
+    def request(self, http_session, name, method, path, **kwargs):
+        """
+        Send a request and record its latency under the route name; HTTP errors and connection errors are recorded as errors.
+
+        Returns:
+            The response, or None if the request failed.
+        """
+        start_time = time.perf_counter()
+        try:
+            response = http_session.request(method, self.base_url + path, timeout=self.options.timeout, allow_redirects=False, **kwargs)
+            response.content # Include the time to read the body
+        except requests.RequestException as e:
+            self.results.record(name, time.perf_counter() - start_time, error=type(e).__name__)
+            return None
+        duration_seconds = time.perf_counter() - start_time
+        if response.status_code >= 400:
+            self.results.record(name, duration_seconds, error=f"HTTP {response.status_code}")
+            return None
+        self.results.record(name, duration_seconds)
+        return response
+
+    def next_submission_row(self):
+        """Return the next generated form response, cycling through them."""
+        with self.lock:
+            self.submission_counter += 1
+            return self.submission_rows[self.submission_counter % len(self.submission_rows)]
+
+    def applicant_journey(self, http_session):
+        """
+        Load the form, optionally restore an earlier submission, submit the form and load the thank-you page.
+
+        Returns:
+            True if every request of the journey succeeded.
+        """
+        response = self.request(http_session, 'GET /', 'GET', '/')
+        session_id_match = SESSION_ID_PATTERN.search(response.text) if response is not None else None
+        if session_id_match is None:
+            return False
+        form_load_time_match = FORM_LOAD_TIME_PATTERN.search(response.text)
+        with self.lock:
+            restore_id = random.choice(self.submitted_ids) if self.submitted_ids and random.random() < self.options.restore_ratio else None
+        if restore_id and self.request(http_session, 'POST /load_form_data', 'POST', '/load_form_data', json={'session_id': restore_id}) is None:
+            return False
+        form_data = {field: str(value) for field, value in self.next_submission_row().items() if value is not None}
+        form_data.update({
+            'session_id_form_field': session_id_match.group(1),
+            'form_load_time': form_load_time_match.group(1) if form_load_time_match else datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        if self.request(http_session, 'POST /submit', 'POST', '/submit', data=form_data) is None:
+            return False
+        with self.lock:
+            self.submitted_ids.append(session_id_match.group(1))
+            # Keep only recent submissions, to bound memory in long runs
+            del self.submitted_ids[:-10000]
+        return self.request(http_session, 'GET /thank-you', 'GET', '/thank-you') is not None
+
+    def admin_login(self, http_session):
+        """Log in with the admin credentials; returns True if the login succeeded."""
+        response = self.request(http_session, 'POST /login', 'POST', '/login', data={'username': self.options.admin_user, 'password': self.options.admin_password})
+        return response is not None and response.status_code == 302 and '/dashboard' in response.headers.get('Location', '')
+
+    def admin_journey(self, http_session):
+        """
+        Load the dashboard, and optionally export the datastore in one of the export formats.
+
+        Returns:
+            True if every request of the journey succeeded.
+        """
+        if self.request(http_session, 'GET /dashboard', 'GET', '/dashboard') is None:
+            return False
+        if random.random() < self.options.export_ratio:
+            export_format = random.choice(self.options.export_formats)
+            return self.request(http_session, f"POST /dashboard ({export_format} export)", 'POST', '/dashboard', json={'format': export_format}) is not None
+        return True
+
+    def run_journey(self, journey_name, http_session, scheduled_time=None):
+        """Run a journey and record its outcome; the latency of open-loop journeys counts from their scheduled start."""
+        start_time = scheduled_time or time.perf_counter()
+        journey = self.applicant_journey if journey_name == 'applicant' else self.admin_journey
+        try:
+            succeeded = journey(http_session)
+        except Exception as e:
+            self.results.record(f"journey: {journey_name}", time.perf_counter() - start_time, error=f"{type(e).__name__}: {e}")
+            return
+        self.results.record(f"journey: {journey_name}", time.perf_counter() - start_time, error=None if succeeded else 'A request failed')
+
+def new_http_session(runner, journey_name):
+    """Create an HTTP session (with its own cookies) for a user; admin sessions are logged in."""
+    http_session = requests.Session()
+    if journey_name == 'admin' and not runner.admin_login(http_session):
+        raise RuntimeError('ERROR: Could not log in as the admin user; check --admin-user and --admin-password.')
+    return http_session
+
+def run_closed_loop(runner, options):
+    """Run the applicant and admin users, each running journeys back to back until the duration has elapsed."""
+    end_time = time.perf_counter() + options.duration
+    def user(journey_name):
+        http_session = new_http_session(runner, journey_name)
+        while time.perf_counter() < end_time:
+            runner.run_journey(journey_name, http_session)
+            if options.think_time:
+                time.sleep(random.expovariate(1 / options.think_time))
+    users = [threading.Thread(target=user, args=('applicant',)) for _ in range(options.applicants)]
+    users += [threading.Thread(target=user, args=('admin',)) for _ in range(options.admins)]
+    for thread in users:
+        thread.start()
+    for thread in users:
+        thread.join()
+
+def run_open_loop(runner, options):
+    """Start journeys at the configured average rate (Poisson arrivals) until the duration has elapsed."""
+    admin_session = new_http_session(runner, 'admin') if options.admin_ratio > 0 else None
+    end_time = time.perf_counter() + options.duration
+    next_start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options.max_concurrency) as executor:
+        while next_start_time < end_time:
+            time.sleep(max(0.0, next_start_time - time.perf_counter()))
+            if random.random() < options.admin_ratio:
+                executor.submit(runner.run_journey, 'admin', admin_session, next_start_time)
+            else:
+                # Every applicant is a new visitor, with its own cookies
+                executor.submit(runner.run_journey, 'applicant', requests.Session(), next_start_time)
+            next_start_time += random.expovariate(options.rate)
+
+def start_server(options):
+    """
+    Start the app locally (from the package folder, with its config/config.yaml) with the chosen worker model:
+
+        threaded    the Werkzeug server, with a thread per request
+        processes   the Werkzeug server, with a forked process per request (up to --workers at once)
+        gunicorn    Gunicorn, with --workers processes of --threads threads each (gunicorn must be installed)
+        async       the async serving mode (see async_app.py) in a single process, on aiohttp's server
+
+    Returns:
+        The server process.
+    """
+    if options.server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '--workers', str(options.workers), '--threads', str(options.threads),
+                   '--worker-class', 'gthread', '--bind', f"127.0.0.1:{options.port}", 'app:app']
+    elif options.server == 'async':
+        command = [sys.executable, 'async_app.py', '--port', str(options.port)]
+    else:
+        server_options = 'threaded=True' if options.server == 'threaded' else f"processes={options.workers}"
+        command = [sys.executable, '-c', f"from werkzeug.serving import run_simple; from app import app; run_simple('127.0.0.1', {options.port}, app, {server_options})"]
+    server = subprocess.Popen(command, cwd=PACKAGE_FOLDER, stdout=subprocess.DEVNULL, stderr=None if options.server_output else subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{options.port}"
+    deadline = time.perf_counter() + options.startup_timeout
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"ERROR: The app exited during startup (exit code {server.returncode}); rerun with --server-output to see why.")
+        try:
+            requests.get(base_url + '/', timeout=1)
+            return server
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"ERROR: The app did not start within {options.startup_timeout} seconds.")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', help='URL of a running app; if not given, the app is started locally')
+    parser.add_argument('--server', choices=['threaded', 'processes', 'gunicorn', 'async'], default='threaded', help='Worker model of the locally started app')
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes of the locally started app (processes, gunicorn)')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per worker process of the locally started app (gunicorn)')
+    parser.add_argument('--port', type=int, default=5055, help='Port of the locally started app')
+    parser.add_argument('--startup-timeout', type=float, default=60, help='Seconds to wait for the locally started app')
+    parser.add_argument('--server-output', action='store_true', help="Show the locally started app's output")
+    parser.add_argument('--form', help='Form configuration sheet of the app (defaults to the form configured in config/config.yaml)')
+    parser.add_argument('--mode', choices=['closed', 'open'], default='closed', help='Closed loop (fixed users) or open loop (fixed arrival rate)')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run the load for')
+    parser.add_argument('--applicants', type=int, default=10, help='Concurrent applicant users (closed loop)')
+    parser.add_argument('--admins', type=int, default=1, help='Concurrent admin users (closed loop)')
+    parser.add_argument('--think-time', type=float, default=0, help='Mean seconds between the journeys of a user (closed loop)')
+    parser.add_argument('--rate', type=float, default=10, help='Journeys started per second (open loop)')
+    parser.add_argument('--admin-ratio', type=float, default=0.05, help='Fraction of journeys that are admin journeys (open loop)')
+    parser.add_argument('--max-concurrency', type=int, default=100, help='Maximum journeys in flight (open loop)')
+    parser.add_argument('--restore-ratio', type=float, default=0.2, help='Fraction of applicant journeys that restore an earlier submission')
+    parser.add_argument('--export-ratio', type=float, default=0.2, help='Fraction of admin journeys that export the datastore')
+    parser.add_argument('--export-formats', nargs='+', default=['json', 'parquet'], choices=['json', 'parquet', 'excel'], help='Export formats used by admin journeys')
+    parser.add_argument('--admin-user', default='admin', help='Admin username, for admin journeys')
+    parser.add_argument('--admin-password', help='Admin password, for admin journeys')
+    parser.add_argument('--timeout', type=float, default=60, help='Request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the generated form responses and journey choices')
+    parser.add_argument('--output', help='Write the results to this file instead of stdout')
+    options = parser.parse_args()
+    has_admin_journeys = options.admins > 0 if options.mode == 'closed' else options.admin_ratio > 0
+    if has_admin_journeys and not options.admin_password:
+        parser.error('--admin-password is required for admin journeys (or run none, with --admins 0 / --admin-ratio 0).')
+
+    if options.form:
+        fields = read_form_fields(options.form)
+    else:
+        from utils import read_instance_config
+        fields = read_configured_form_fields(read_instance_config(config_folder='config', config_file_name='config.yaml'))
+    random.seed(options.seed)
+    submission_rows = next(iter_submission_chunks(fields, 1000, chunk_size=1000, seed=options.seed)).drop(columns=['id', 'timestamp']).to_dict(orient='records')
+
+    server = None if options.base_url else start_server(options)
+    results = LoadTestResults()
+    runner = JourneyRunner(options.base_url or f"http://127.0.0.1:{options.port}", results, submission_rows, options)
+    start_time = time.perf_counter()
+    try:
+        (run_closed_loop if options.mode == 'closed' else run_open_loop)(runner, options)
+    finally:
+        elapsed_seconds = time.perf_counter() - start_time
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        'commit': get_git_commit(),
+        'run_at': datetime.now().isoformat(timespec='seconds'),
+        'options': {key: value for key, value in vars(options).items() if key != 'admin_password'},
+        'elapsed_s': round(elapsed_seconds, 2),
+        'results': results.summarize(elapsed_seconds),
+    }
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+if __name__ == '__main__':
+    main()
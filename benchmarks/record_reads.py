@@ -0,0 +1,82 @@
+"""
+Benchmark single-record reads, as served by /load_form_data: the DataFrame path (read_data(id) -> to_dict -> JSON with Flask's
+default provider) against the Core path (get_record(id) -> JSON with the orjson provider, if installed).
+
+Reports latency (mean/p50/p99) and the average peak memory allocated per read, as JSON.
+
+Usage:
+    python -m benchmarks.record_reads --rows 10000 --iterations 2000
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+from flask.json.provider import DefaultJSONProvider
+
+from benchmarks.common import create_benchmark_datastore, seed_rows, summarize_latencies
+from utils import OrjsonProvider, orjson
+
+def measure(read_function, ids, iterations, allocation_iterations):
+    """
+    Measure the latency and allocations of a read function.
+
+    Args:
+        read_function(callable): Called with a session_id; performs one read and serialization.
+        ids(list): The session_ids to read, chosen at random.
+        iterations(int): The number of timed reads.
+        allocation_iterations(int): The number of reads traced for allocations (tracing slows reads, so this is separate).
+
+    Returns:
+        A dict of results.
+    """
+    for id in ids[:50]:
+        read_function(id) # Warm-up
+    latencies = []
+    for _ in range(iterations):
+        id = random.choice(ids)
+        start_time = time.perf_counter()
+        read_function(id)
+        latencies.append(time.perf_counter() - start_time)
+    peak_allocations = []
+    tracemalloc.start()
+    for _ in range(allocation_iterations):
+        id = random.choice(ids)
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        read_function(id)
+        peak_allocations.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+    return {**summarize_latencies(latencies), 'mean_peak_alloc_kib': round(sum(peak_allocations) / len(peak_allocations) / 1024, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000, help='Rows in the benchmark table')
+    parser.add_argument('--iterations', type=int, default=2000, help='Timed reads per path')
+    parser.add_argument('--allocation-iterations', type=int, default=200, help='Reads traced for allocations per path')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as database_folder:
+        datastore, config = create_benchmark_datastore(database_folder)
+        ids = seed_rows(datastore, config, args.rows)
+        app = datastore.datastore.app
+        default_json = DefaultJSONProvider(app)
+        fast_json = OrjsonProvider(app) if orjson is not None else default_json
+
+        def dataframe_path(id):
+            return default_json.dumps(datastore.read_data(id=id).to_dict(orient='records')[0])
+
+        def record_path(id):
+            return fast_json.dumps(datastore.get_record(id))
+
+        results = {
+            'rows': args.rows,
+            'json_encoder': 'orjson' if orjson is not None else 'json',
+            'read_data_to_dict': measure(dataframe_path, ids, args.iterations, args.allocation_iterations),
+            'get_record': measure(record_path, ids, args.iterations, args.allocation_iterations),
+        }
+    print(json.dumps(results, indent=4))
+
+if __name__ == '__main__':
+    main()
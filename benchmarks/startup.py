@@ -0,0 +1,273 @@
+"""
+Benchmark the startup cost of a worker process:
+
+    import        the time taken by 'import app' (from python -X importtime), by top-level package, and the heavy
+                  libraries that importing the app pulls in
+    bare_worker   a worker that creates the app (create_app()) against a local SQLite database and serves only / and
+                  /submit: the time taken to import and create the app and to serve the first requests, its RSS and peak
+                  RSS, and the heavy libraries it has imported by then
+
+Heavy libraries (pandas, pyarrow, ...) are only needed by uploads, exports and the dashboard, so neither list should contain
+them. Every measurement runs in a fresh interpreter, so that nothing imported by the benchmark itself is counted, and is
+repeated --repeat times (medians are reported). Reports JSON (on stdout, or to --output) with the commit and environment, so
+that runs can be compared across commits.
+
+Usage:
+    python -m benchmarks.startup --fields 50 --submissions 20 --repeat 5 --output startup.json
+"""
+# Only standard library modules are imported up front: this module also runs the bare worker (see run_bare_worker())
+import argparse
+import json
+import os
+import platform
+import re
+import secrets
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+PACKAGE_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FORM_CONFIG_FILE_NAME = 'startup.xlsx'
+WORKER_INPUT_FILE_NAME = 'worker_input.json'
+WORKER_RESULTS_FILE_NAME = 'worker_results.json'
+SESSION_ID_PATTERN = re.compile(r'id="session_id_generated"[^>]*value="([^"]*)"')
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'openpyxl', 'bs4', 'requests', 'ipinfo', 'mysql.connector', 'flask_sqlalchemy', 'flask_migrate', 'alembic']
+
+def parse_importtime(importtime_output):
+    """
+    Parse the output of python -X importtime into the time spent importing each top-level package (including its submodules).
+
+    Args:
+        importtime_output(str): The stderr of a python -X importtime run.
+
+    Returns:
+        A dict of {package: self time in microseconds}; the values add up to the total import time.
+    """
+    package_times = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, _, module_name = line[len('import time:'):].split('|', 2)
+        if not self_us.strip().isdigit():
+            continue  # The header line
+        package = module_name.strip().split('.')[0]
+        package_times[package] = package_times.get(package, 0) + int(self_us)
+    return package_times
+
+def measure_import(module_name='app'):
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Args:
+        module_name(str): (Optional, default='app') The module to import.
+
+    Returns:
+        A dict with the import time (import_ms), the wall time of the interpreter run (wall_ms), the import time by
+        top-level package and the heavy libraries that were imported.
+    """
+    code = f"import json, sys; import {module_name}; print(json.dumps(sorted(sys.modules)))"
+    start_time = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=PACKAGE_FOLDER, capture_output=True, text=True)
+    wall_seconds = time.perf_counter() - start_time
+    if process.returncode != 0:
+        raise RuntimeError(f"ERROR: 'import {module_name}' failed:\n{process.stderr[-2000:]}")
+    package_times = parse_importtime(process.stderr)
+    modules = set(json.loads(process.stdout.splitlines()[-1]))
+    return {
+        'import_ms': round(sum(package_times.values()) / 1000, 1),
+        'wall_ms': round(wall_seconds * 1000, 1),
+        'package_times_ms': {package: round(self_us / 1000, 1) for package, self_us in package_times.items()},
+        'heavy_modules_imported': [module for module in HEAVY_MODULES if module in modules],
+    }
+
+def process_memory_mib():
+    """
+    Return the current and peak resident set size of this process, from /proc/self/status. resource.getrusage() is not
+    used for the peak, since on Linux a process started by another process (as the bare worker is) inherits its parent's
+    peak RSS.
+
+    Returns:
+        A (RSS, peak RSS) tuple in MiB, or (None, None) on platforms without /proc (e.g. macOS, Windows).
+    """
+    memory_kib = {}
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    field, value = line.split(':', 1)
+                    memory_kib[field] = int(value.split()[0])
+    except OSError:
+        return None, None
+    return tuple(round(memory_kib[field] / 1024, 1) if field in memory_kib else None for field in ('VmRSS', 'VmHWM'))
+
+def run_bare_worker(folder):
+    """
+    Act as a bare worker (run in a fresh interpreter by measure_bare_worker()): import and create the app with the config
+    in the folder's worker input, then load the form and submit each of the input's form responses. The results are written
+    to the folder, since the app logs to stdout.
+
+    Args:
+        folder(str): The folder containing the worker input (config, form configuration sheet and form responses).
+
+    Returns:
+        None
+    """
+    with open(os.path.join(folder, WORKER_INPUT_FILE_NAME), encoding='utf-8') as input_file:
+        worker_input = json.load(input_file)
+    start_time = time.perf_counter()
+    import app as app_module
+    imported_time = time.perf_counter()
+    flask_app = app_module.create_app(worker_input['config'])
+    created_time = time.perf_counter()
+    # Statement echoing would dominate the measurements
+    app_module.datastore.datastore.engine.echo = False
+
+    client = flask_app.test_client()
+    form_latencies, submit_latencies = [], []
+    for form_data in worker_input['submissions']:
+        request_start_time = time.perf_counter()
+        response = client.get('/')
+        form_latencies.append(time.perf_counter() - request_start_time)
+        session_id_match = SESSION_ID_PATTERN.search(response.get_data(as_text=True))
+        if response.status_code != 200 or session_id_match is None:
+            raise RuntimeError(f"ERROR: GET / failed with status {response.status_code}.")
+        request_start_time = time.perf_counter()
+        response = client.post('/submit', data={**form_data, 'session_id_form_field': session_id_match.group(1)})
+        submit_latencies.append(time.perf_counter() - request_start_time)
+        if response.status_code != 302:
+            raise RuntimeError(f"ERROR: POST /submit failed with status {response.status_code}.")
+
+    rss_mib, peak_rss_mib = process_memory_mib()
+    modules = set(sys.modules)
+    results = {
+        'import_ms': round((imported_time - start_time) * 1000, 1),
+        'create_app_ms': round((created_time - imported_time) * 1000, 1),
+        'first_form_ms': round(form_latencies[0] * 1000, 1),
+        'first_submit_ms': round(submit_latencies[0] * 1000, 1),
+        'form_p50_ms': round(statistics.median(form_latencies) * 1000, 2),
+        'submit_p50_ms': round(statistics.median(submit_latencies) * 1000, 2),
+        'rss_mib': rss_mib,
+        'peak_rss_mib': peak_rss_mib,
+        'modules_imported': len(modules),
+        'heavy_modules_imported': [module for module in HEAVY_MODULES if module in modules],
+    }
+    with open(os.path.join(folder, WORKER_RESULTS_FILE_NAME), 'w', encoding='utf-8') as results_file:
+        json.dump(results, results_file)
+
+def write_worker_input(folder, field_count, submission_count, seed):
+    """
+    Write the bare worker's input to a folder: a generated form configuration sheet, a config that uses it (and a SQLite
+    database in the folder) and generated form responses.
+
+    Args:
+        folder(str): The folder to write to.
+        field_count(int): The number of fields in the generated form.
+        submission_count(int): The number of form responses to generate.
+        seed(int): Seed for the generated form and responses.
+
+    Returns:
+        None
+    """
+    import numpy as np
+    from benchmarks.common import benchmark_config
+    from benchmarks.generators import write_form_config, generate_submission_rows
+
+    fields = write_form_config(os.path.join(folder, FORM_CONFIG_FILE_NAME), field_count, seed=seed)
+    config = benchmark_config(folder, FORM_CONFIG_FILE_NAME)
+    config['general'].update({'flask_app_secret_key': secrets.token_hex(16), 'users': {}})
+    config['advanced_analytics'] = {}
+    config['datastore'] = {'datastore_type': 'sqlite', 'datastore_params': {'sqlite_database_file': os.path.join(folder, 'startup.db')}}
+    rows = generate_submission_rows(fields, submission_count, rng=np.random.default_rng(seed)).drop(columns=['id', 'timestamp'])
+    submissions = [{field: str(value) for field, value in row.items() if value is not None} for row in rows.to_dict(orient='records')]
+    with open(os.path.join(folder, WORKER_INPUT_FILE_NAME), 'w', encoding='utf-8') as input_file:
+        json.dump({'config': config, 'submissions': submissions}, input_file)
+
+def measure_bare_worker(field_count, submission_count, seed):
+    """
+    Run a bare worker (see run_bare_worker()) in a fresh interpreter, with a fresh form and database.
+
+    Args:
+        field_count(int): The number of fields in the generated form.
+        submission_count(int): The number of form responses the worker serves.
+        seed(int): Seed for the generated form and responses.
+
+    Returns:
+        A dict of the worker's results.
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        write_worker_input(folder, field_count, submission_count, seed)
+        process = subprocess.run([sys.executable, '-m', 'benchmarks.startup', '--worker', folder], cwd=PACKAGE_FOLDER, capture_output=True, text=True)
+        if process.returncode != 0:
+            raise RuntimeError(f"ERROR: The bare worker failed:\n{process.stderr[-2000:]}")
+        with open(os.path.join(folder, WORKER_RESULTS_FILE_NAME), encoding='utf-8') as results_file:
+            return json.load(results_file)
+
+def summarize_runs(runs, top=None):
+    """
+    Summarize repeated runs of a measurement: the median of every numeric result, the per-run values of the first one and
+    the results of the last run otherwise. Per-package import times are averaged and only the slowest packages are kept.
+
+    Args:
+        runs(list): The results of each run.
+        top(int): (Optional) The number of slowest packages to keep.
+
+    Returns:
+        A dict of results.
+    """
+    summary = {}
+    for key, value in runs[-1].items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            summary[key] = round(statistics.median(run[key] for run in runs if run[key] is not None), 1) if value is not None else None
+        elif key == 'package_times_ms':
+            packages = {package for run in runs for package in run[key]}
+            mean_times = {package: round(statistics.fmean(run[key].get(package, 0) for run in runs), 1) for package in packages}
+            summary['slowest_packages_ms'] = dict(sorted(mean_times.items(), key=lambda item: item[1], reverse=True)[:top])
+        else:
+            summary[key] = value
+    first_key = next(iter(runs[-1]))
+    summary[f"runs_{first_key}"] = [run[first_key] for run in runs]
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fields', type=int, default=20, help="Number of fields in the bare worker's generated form")
+    parser.add_argument('--submissions', type=int, default=20, help='Form loads and submissions served by the bare worker')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs of each measurement')
+    parser.add_argument('--top', type=int, default=15, help='Number of slowest packages to report')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the generated form and responses')
+    parser.add_argument('--output', help='Write the results to this file instead of stdout')
+    parser.add_argument('--worker', metavar='FOLDER', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        run_bare_worker(args.worker)
+        return
+
+    from benchmarks.suite import get_git_commit
+
+    # A first, unmeasured import compiles any stale bytecode
+    measure_import()
+    import_runs = [measure_import() for _ in range(args.repeat)]
+    print("Finished the import time runs", file=sys.stderr)
+    worker_runs = [measure_bare_worker(args.fields, args.submissions, args.seed) for _ in range(args.repeat)]
+    print("Finished the bare worker runs", file=sys.stderr)
+
+    results = {
+        'commit': get_git_commit(),
+        'run_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'options': {key: getattr(args, key) for key in ['fields', 'submissions', 'repeat', 'seed']},
+        'import': summarize_runs(import_runs, top=args.top),
+        'bare_worker': summarize_runs(worker_runs),
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=4)
+    else:
+        print(json.dumps(results, indent=4))
+
+if __name__ == '__main__':
+    main()
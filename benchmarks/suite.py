@@ -0,0 +1,165 @@
+"""
+Benchmark the main paths of the app for a range of form widths and table sizes, fully offline against a local SQLite
+database:
+
+    form_render   generate_form_html_from_config_file(), as served by /
+    bulk_upload   DatastoreManager.add_bulk_data() (upsert_bulk_data), used to seed the table in chunks
+    submit        DatastoreManager.add_data() (upsert_data) of new submissions, as /submit does
+    dashboard     the aggregations and full read (rendered as HTML) of a /dashboard page load
+    export_<fmt>  download_datastore_in_specific_format() in each export format
+
+Each (form width, table size) case runs in a separate process, so that its peak RSS is measured on its own. Reports
+throughput, mean/p50/p99 latency and peak RSS per case as JSON (on stdout, or to --output), along with the commit and
+environment, so that runs can be compared across commits.
+
+Usage:
+    python -m benchmarks.suite --widths 10 100 500 --rows 1000 100000 1000000 --output results.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+
+from benchmarks.common import benchmark_config, create_benchmark_datastore, peak_rss_mib, summarize_latencies
+from benchmarks.generators import write_form_config, generate_submission_rows
+
+FORM_CONFIG_FILE_NAME = 'benchmark.xlsx'
+
+def measure(operation, iterations, total_items=None):
+    """
+    Time repeated calls of an operation.
+
+    Args:
+        operation(callable): Called with the iteration number.
+        iterations(int): The number of calls.
+        total_items(int): (Optional) The number of items (e.g. rows) processed by all calls together, for the throughput;
+                          defaults to one item per call.
+
+    Returns:
+        A dict with the latency summary and the throughput in items per second.
+    """
+    latencies = []
+    for iteration in range(iterations):
+        start_time = time.perf_counter()
+        operation(iteration)
+        latencies.append(time.perf_counter() - start_time)
+    return {
+        **summarize_latencies(latencies),
+        'iterations': iterations,
+        'throughput_per_s': round((total_items or iterations) / sum(latencies), 1),
+    }
+
+def run_case(field_count, row_count, args):
+    """
+    Run every benchmark for one form width and table size, in a fresh database.
+
+    Args:
+        field_count(int): The number of fields in the generated form.
+        row_count(int): The number of rows the table is seeded with.
+        args(dict): The benchmark options (see main()).
+
+    Returns:
+        A dict of results.
+    """
+    # Imported here, so that they are imported in the case's own process
+    from formbuilder.form_utils import generate_form_html_from_config_file
+    from utils import download_datastore_in_specific_format
+
+    rng = np.random.default_rng(args['seed'])
+    with tempfile.TemporaryDirectory() as folder:
+        fields = write_form_config(os.path.join(folder, FORM_CONFIG_FILE_NAME), field_count, seed=args['seed'])
+        select_fields = fields.loc[fields['field_type'] == 'select', 'backend_field_name'].to_list()
+        config = benchmark_config(folder, FORM_CONFIG_FILE_NAME, breakdown_field=select_fields[0] if select_fields else 'id')
+        datastore, config = create_benchmark_datastore(folder, config)
+        app = datastore.datastore.app
+        results = {'fields': field_count, 'rows': row_count}
+
+        results['form_render'] = measure(
+            lambda _: generate_form_html_from_config_file(config_folder=folder, config_filename=FORM_CONFIG_FILE_NAME),
+            args['iterations']
+        )
+
+        chunk_size = min(args['chunk_size'], row_count)
+        chunks = [
+            generate_submission_rows(fields, min(chunk_size, row_count - start), [f"seed-{row}" for row in range(start, min(start + chunk_size, row_count))], rng=rng)
+            for start in range(0, row_count, chunk_size)
+        ]
+        results['bulk_upload'] = measure(lambda chunk: datastore.add_bulk_data(chunks[chunk]), len(chunks), total_items=row_count)
+        del chunks
+
+        submissions = generate_submission_rows(fields, args['iterations'], [f"submit-{row}" for row in range(args['iterations'])], start_time=datetime.now(), rng=rng)
+        submissions = submissions.to_dict(orient='records')
+        results['submit'] = measure(lambda submission: datastore.add_data(submissions[submission]), len(submissions))
+
+        def load_dashboard(_):
+            datastore.read_aggregated_data(group_by_field='timestamp', aggregation_function='count', aggregation_field='id',
+                                           field_options={'CAST': {'target_field': 'timestamp', 'target_type': 'date'}})
+            datastore.read_aggregated_data(group_by_field=config['dashboard']['breakdown_visualization_field'], aggregation_function='count', aggregation_field='id')
+            datastore.read_data(analytical=True).to_html(classes=['table', 'table-striped', 'table-bordered'], index=False)
+        results['dashboard'] = measure(load_dashboard, args['scan_iterations'])
+
+        for export_format in args['export_formats']:
+            def export(_):
+                with app.test_request_context():
+                    response = download_datastore_in_specific_format(datastore=datastore, target_format=export_format)
+                    if hasattr(response, 'direct_passthrough'):
+                        response.direct_passthrough = False
+                        response.get_data()
+            results[f"export_{export_format}"] = measure(export, args['scan_iterations'], total_items=row_count * args['scan_iterations'])
+
+        results['peak_rss_mib'] = peak_rss_mib()
+    return results
+
+def get_git_commit():
+    """Return the current commit hash, or None if it cannot be determined."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--widths', type=int, nargs='+', default=[10, 100], help='Form widths (numbers of fields) to benchmark')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000], help='Table sizes (numbers of rows) to benchmark')
+    parser.add_argument('--iterations', type=int, default=200, help='Timed form renders and submissions per case')
+    parser.add_argument('--scan-iterations', type=int, default=5, help='Timed dashboard loads and exports per case')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='Rows per bulk upload')
+    parser.add_argument('--export-formats', nargs='+', default=['json', 'parquet'], choices=['json', 'parquet', 'excel'], help='Export formats to benchmark')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the generated data')
+    parser.add_argument('--output', help='Write the results to this file instead of stdout')
+    args = parser.parse_args()
+    case_args = {key: getattr(args, key) for key in ['iterations', 'scan_iterations', 'chunk_size', 'export_formats', 'seed']}
+
+    cases = []
+    # A fresh process per case, so that peak RSS is measured per case
+    spawn_context = multiprocessing.get_context('spawn')
+    for field_count in args.widths:
+        for row_count in args.rows:
+            with spawn_context.Pool(1) as pool:
+                case = pool.apply(run_case, (field_count, row_count, case_args))
+            print(f"Finished {field_count} field(s) x {row_count} row(s)", file=sys.stderr)
+            cases.append(case)
+
+    results = {
+        'commit': get_git_commit(),
+        'run_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'options': case_args,
+        'cases': cases,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=4)
+    else:
+        print(json.dumps(results, indent=4))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+import glob
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from datamodels.mysql import WRITTEN_AT_FIELD
+from datamodels.segmented_store import SegmentedLocalDatastore
+from loggers.managers import LoggerManager
+
+class AnalyticsReplica:
+    """
+    A local, columnar copy of the datastore that serves the dashboard's aggregations and full exports, so that analytical
+    queries never compete with form submissions for the primary database.
+
+    The replica is a SegmentedLocalDatastore (Parquet segments on local disk). It is synced incrementally by write order: the
+    datastore stamps every written row with the database's current time in a 'written_at' column (added to the table when an
+    analytics replica is configured), and each sync copies the rows written at or after the last synced 'written_at', minus
+    an overlap window that catches rows committed slightly out of order. Rows written with an older 'timestamp' (bulk uploads,
+    replayed spooled submissions) are therefore synced like any other write. Syncs run on a background thread,
+    and reads also sync first if the replica is older than the configured staleness bound. Rows deleted from the datastore
+    (e.g. by archival) are dropped by periodically comparing the replica's session_ids with the datastore's (an 'id'-only
+    scan), and sync_deletions() drops them right away.
+
+    Every process keeps its own copy in a subfolder of the replica folder, so that workers never share segments. A forked
+    worker starts from hard links to its parent's segments instead of copying the datastore again, and copies left behind by
+    processes that have exited are removed on startup. reset() builds a new copy in a new subfolder and swaps it in once it
+    is complete, so reads never see a partially rebuilt replica.
+
+    Configured under the 'analytics_replica' key of the datastore config. For example:
+
+        datastore:
+            analytics_replica:
+                replica_folder: analytics_replica   # Folder for the replica's per-process copies
+                max_staleness_seconds: 60           # Reads never see data older than this
+                sync_interval_seconds: 30           # How often the background thread syncs (default: half the staleness bound)
+                sync_overlap_seconds: 5             # How far before the last synced 'written_at' each sync starts
+                deletion_check_interval_seconds: 3600  # How often rows deleted from the datastore are dropped from the replica
+
+    Attributes:
+        source(MySQLDatastore): The datastore being replicated.
+        replica_folder(str): The folder containing the per-process copies of the replica.
+        store(SegmentedLocalDatastore): This process's copy of the replica.
+        retired_stores(list): (copy, retire time) pairs of the copies replaced by reset(), removed once reads on them have finished.
+        watermark(datetime): The latest 'written_at' synced into the replica, or None before the first sync.
+        synced_row_versions(set): The (id, written_at) pairs synced within the overlap window before the watermark.
+        last_sync_time(datetime): When the last sync started, or None before the first sync.
+        last_deletion_check_time(datetime): When deleted rows were last dropped from the replica.
+        logger(LoggerManager): A singleton logger instance for logging.
+
+    Usage:
+        >>> replica = AnalyticsReplica(app, config, datastore.datastore) # Should be done within a DatastoreManager instance
+        >>> replica.query_aggregated_data(group_by_field='industry')
+    """
+    def __init__(self, app, config, source):
+        """
+        Remove copies left behind by exited processes, build this process's copy and start the background sync thread.
+
+        Args:
+            app(Flask): The Flask app implementing this replica.
+            config(dict): The full contents of the config.yaml configuration file
+            source(MySQLDatastore): The datastore to replicate; must implement query_updated_since() and set 'written_at'.
+        Returns:
+            None
+        """
+        self.logger = LoggerManager.get_logger()
+        self.app = app
+        self.config = config
+        self.source = source
+        replica_config = config['datastore']['analytics_replica']
+        self.replica_folder = replica_config.get('replica_folder', 'analytics_replica')
+        self.compaction_min_segments = replica_config.get('compaction_min_segments', 8)
+        self.max_staleness = timedelta(seconds=replica_config.get('max_staleness_seconds', 60))
+        self.sync_interval_seconds = replica_config.get('sync_interval_seconds', self.max_staleness.total_seconds() / 2)
+        self.sync_overlap = timedelta(seconds=replica_config.get('sync_overlap_seconds', 5))
+        self.deletion_check_interval = timedelta(seconds=replica_config.get(
+            'deletion_check_interval_seconds', replica_config.get('full_resync_interval_seconds', 3600)
+        ))
+        self.sync_lock = threading.Lock()
+        self.store = None
+        self.retired_stores = []
+        os.makedirs(self.replica_folder, exist_ok=True)
+        self.remove_stale_copies()
+        # Always start from a full copy: the replica may have missed deletions while the app was not running
+        self.reset()
+        self.start_sync_thread()
+
+    def start_sync_thread(self):
+        """Start the background sync thread."""
+        self.stop_event = threading.Event()
+        self.sync_thread = threading.Thread(target=self.run_sync_loop, name='analytics-replica-sync', daemon=True)
+        self.sync_thread.start()
+
+    def open_store(self, source_folder=None):
+        """
+        Open a new, process-owned copy of the replica in a new subfolder of the replica folder.
+
+        Args:
+            source_folder(str): (Optional) A copy whose segments the new copy starts from. Segments are immutable, so they are
+                                hard-linked rather than copied. The new copy is empty if not specified.
+
+        Returns:
+            A SegmentedLocalDatastore.
+        """
+        store_folder = os.path.join(self.replica_folder, f"{os.getpid()}-{datetime.now():%Y%m%d%H%M%S%f}")
+        os.makedirs(store_folder)
+        if source_folder:
+            for segment_path in glob.glob(os.path.join(source_folder, 'segment-*.parquet')):
+                os.link(segment_path, os.path.join(store_folder, os.path.basename(segment_path)))
+        store_config = {
+            **self.config,
+            'datastore': {
+                'datastore_type': 'local',
+                'datastore_params': {
+                    'local_store_folder': store_folder,
+                    'compaction_min_segments': self.compaction_min_segments,
+                },
+            },
+        }
+        return SegmentedLocalDatastore(self.app, store_config)
+
+    def remove_stale_copies(self):
+        """Remove the copies of processes that are no longer running (e.g. after a restart or a crashed worker)."""
+        for store_folder in glob.glob(os.path.join(self.replica_folder, '*-*')):
+            pid = os.path.basename(store_folder).split('-')[0]
+            if not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                shutil.rmtree(store_folder, ignore_errors=True)
+                self.logger.info(f"Removed the analytics replica copy of exited process {pid} ('{store_folder}').")
+            except PermissionError:
+                # The process exists but belongs to another user
+                pass
+
+    def retire_store(self, store):
+        """Stop a replaced copy's compaction thread; its folder is removed later (see remove_retired_stores())."""
+        store.stop_event.set()
+        self.retired_stores.append((store, datetime.now()))
+
+    def remove_retired_stores(self):
+        """
+        Remove the folders of copies replaced at least one sync interval ago, by which time reads that started on them have
+        finished. Must be called with the sync lock held.
+        """
+        removal_cutoff = datetime.now() - timedelta(seconds=self.sync_interval_seconds)
+        for store, retire_time in self.retired_stores:
+            if retire_time <= removal_cutoff:
+                shutil.rmtree(store.store_folder, ignore_errors=True)
+        self.retired_stores = [(store, retire_time) for store, retire_time in self.retired_stores if retire_time > removal_cutoff]
+
+    def after_fork(self):
+        """
+        Give a forked child process its own copy of the replica, hard-linked from the parent's, and restart the sync thread,
+        which does not survive the fork. The parent keeps syncing its own copy.
+        """
+        self.sync_lock = threading.Lock()
+        # The parent's copy and its retired copies belong to the parent; the child must never modify or remove them
+        self.retired_stores = []
+        self.store = self.open_store(source_folder=self.store.store_folder)
+        self.start_sync_thread()
+
+    def sync(self):
+        """
+        Copy new and updated rows from the datastore into the replica.
+
+        Returns:
+            The number of rows copied.
+        """
+        with self.sync_lock:
+            self.remove_retired_stores()
+            sync_time = datetime.now()
+            # Before the first row with a 'written_at' is synced, compare against the earliest point in time, which skips the
+            # rows written before the column was added (reset() already copied them)
+            since = self.watermark - self.sync_overlap if self.watermark is not None else datetime.min
+            changes_df = self.source.query_updated_since(since)
+            # Skip rows from the overlap window that were already synced, so that an idle datastore writes no new segments
+            row_versions = list(zip(changes_df['id'], changes_df[WRITTEN_AT_FIELD]))
+            changes_df = changes_df.loc[[row_version not in self.synced_row_versions for row_version in row_versions]]
+            if not changes_df.empty:
+                self.store.upsert_bulk_data(changes_df)
+                self.advance_watermark(changes_df[WRITTEN_AT_FIELD].max())
+                self.synced_row_versions = {
+                    (id, written_at) for id, written_at in row_versions
+                    if pd.notna(written_at) and written_at >= self.watermark - self.sync_overlap
+                }
+            self.last_sync_time = sync_time
+        self.logger.info(f"Synced {len(changes_df)} row(s) into the analytics replica (watermark: {self.watermark}).")
+        return len(changes_df)
+
+    def advance_watermark(self, written_at):
+        """
+        Move the watermark forward to a synced 'written_at'. Rows written before the 'written_at' column was added have none;
+        they are copied by reset() (which runs on startup) and never move the watermark.
+        """
+        if pd.notna(written_at) and (self.watermark is None or written_at > self.watermark):
+            self.watermark = written_at
+
+    def sync_deletions(self):
+        """
+        Drop the rows that were deleted from the datastore (e.g. by archival) from the replica, by comparing the session_ids
+        of both. The sync lock is held throughout, so no row can be synced between the two reads.
+
+        Returns:
+            The number of rows dropped.
+        """
+        with self.sync_lock:
+            check_time = datetime.now()
+            source_ids = set(self.source.query(columns=['id'])['id'])
+            replica_ids = self.store.query(columns=['id'])['id']
+            deleted_ids = replica_ids.loc[~replica_ids.isin(source_ids)].to_list()
+            self.store.delete_records(deleted_ids)
+            self.last_deletion_check_time = check_time
+        self.logger.info(f"Dropped {len(deleted_ids)} deleted row(s) from the analytics replica.")
+        return len(deleted_ids)
+
+    def ensure_fresh(self):
+        """Sync now if the last sync is older than the staleness bound."""
+        if self.last_sync_time is None or datetime.now() - self.last_sync_time > self.max_staleness:
+            self.sync()
+
+    def reset(self):
+        """
+        Rebuild the replica from scratch in a new copy, then swap it in. Reads keep using the previous copy until the swap.
+
+        Returns:
+            None
+        """
+        new_store = self.open_store()
+        changes_df = self.source.query_updated_since(None)
+        if not changes_df.empty:
+            new_store.upsert_bulk_data(changes_df)
+        with self.sync_lock:
+            previous_store, self.store = self.store, new_store
+            if previous_store is not None:
+                self.retire_store(previous_store)
+            self.watermark = None
+            self.advance_watermark(changes_df[WRITTEN_AT_FIELD].max())
+            self.synced_row_versions = set()
+            self.last_sync_time = None
+            self.last_deletion_check_time = datetime.now()
+        # Catch up with rows written while the new copy was being built
+        self.sync()
+
+    def run_sync_loop(self):
+        """Background thread target: periodically sync the replica, and periodically drop rows deleted from the datastore."""
+        while not self.stop_event.wait(self.sync_interval_seconds):
+            try:
+                self.sync()
+                if datetime.now() - self.last_deletion_check_time > self.deletion_check_interval:
+                    self.sync_deletions()
+            except Exception as e:
+                self.logger.error(f"Analytics replica sync failed: {e}")
+
+    def query(self, id=None, columns=None):
+        """Query the replica; see SegmentedLocalDatastore.query()."""
+        self.ensure_fresh()
+        return self.store.query(id=id, columns=columns)
+
+    def query_aggregated_data(self, **kwargs):
+        """Perform an aggregation over the replica; see SegmentedLocalDatastore.query_aggregated_data()."""
+        self.ensure_fresh()
+        return self.store.query_aggregated_data(**kwargs)
@@ -0,0 +1,123 @@
+import os
+import secrets
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from loggers.managers import LoggerManager
+
+class ParquetArchive:
+    """
+    Cold storage for old form submissions, kept as Parquet files on local disk and partitioned by the year and month of their
+    'timestamp' (e.g. archive/year=2025/month=3/part-20250701120000-1a2b3c4d.parquet).
+
+    Files are never rewritten; each archival run adds new files. Reads are lazy and column-pruned: only the footers of the
+    files are read (once per file), and only the requested columns of the year=/month= partitions overlapping any time bounds
+    are loaded. If the same session_id was archived more than once, the copy with the latest 'timestamp' wins.
+
+    Attributes:
+        archive_folder(str): The folder containing the archive's Parquet files.
+        logger(LoggerManager): A singleton logger instance for logging.
+        file_schemas(dict): The schema of every archive file seen so far, keyed by file path.
+        cached_dataset(pyarrow.dataset.Dataset): The dataset built over the files in file_schemas, reused until files are added.
+
+    Usage:
+        >>> archive = ParquetArchive('archive')
+        >>> archive.write(old_rows_df)
+        >>> archive.read(columns=['id', 'timestamp', 'industry'])
+    """
+    def __init__(self, archive_folder='archive'):
+        self.archive_folder = archive_folder
+        self.logger = LoggerManager.get_logger()
+        self.file_schemas = {}
+        self.cached_dataset = None
+        os.makedirs(self.archive_folder, exist_ok=True)
+
+    def write(self, df):
+        """
+        Append rows to the archive as new Parquet files, one per (year, month) of the rows' 'timestamp'.
+
+        Args:
+            df(pd.DataFrame): The rows to archive; must contain the 'id' and 'timestamp' columns.
+
+        Returns:
+            The number of rows written.
+        """
+        if df.empty:
+            return 0
+        run_suffix = f"{datetime.now():%Y%m%d%H%M%S}-{secrets.token_hex(4)}"
+        timestamps = pd.to_datetime(df['timestamp'])
+        for (year, month), month_df in df.groupby([timestamps.dt.year, timestamps.dt.month]):
+            partition_folder = os.path.join(self.archive_folder, f"year={year}", f"month={month}")
+            os.makedirs(partition_folder, exist_ok=True)
+            pq.write_table(pa.Table.from_pandas(month_df, preserve_index=False), os.path.join(partition_folder, f"part-{run_suffix}.parquet"))
+        self.logger.info(f"Archived {len(df)} row(s) to '{self.archive_folder}'.")
+        return len(df)
+
+    def dataset(self):
+        """
+        Open the archive as a lazy PyArrow dataset, partitioned on the integer 'year' and 'month' keys of its folders. Files
+        written before a field was added to the form config lack that column, so the schemas of all files are unified
+        (missing columns read as nulls). Listing the folders is cheap; the footers of files are only read the first time they
+        are seen, and the dataset is only rebuilt when files were added (by this or another process).
+
+        Returns:
+            A pyarrow.dataset.Dataset, or None if the archive is empty.
+        """
+        file_paths = sorted(
+            os.path.join(folder, filename)
+            for folder, _, filenames in os.walk(self.archive_folder)
+            for filename in filenames if filename.endswith('.parquet')
+        )
+        if not file_paths:
+            return None
+        if self.cached_dataset is None or file_paths != list(self.file_schemas):
+            for file_path in file_paths:
+                if file_path not in self.file_schemas:
+                    self.file_schemas[file_path] = pq.read_schema(file_path)
+            self.file_schemas = {file_path: self.file_schemas[file_path] for file_path in file_paths}
+            partition_schema = pa.schema([('year', pa.int32()), ('month', pa.int32())])
+            schema = pa.unify_schemas(list(self.file_schemas.values()) + [partition_schema], promote_options='permissive')
+            partitioning = ds.partitioning(partition_schema, flavor='hive')
+            self.cached_dataset = ds.dataset(file_paths, schema=schema, format='parquet', partitioning=partitioning, partition_base_dir=self.archive_folder)
+        return self.cached_dataset
+
+    def read(self, columns=None, id=None, start_time=None, end_time=None):
+        """
+        Read rows from the archive, loading only the requested columns and rows.
+
+        Args:
+            columns(list): (Optional) The columns to load; all columns are loaded if not specified.
+            id(str): (Optional) A session_id value to look up in the archive.
+            start_time(datetime): (Optional) Only read rows with a 'timestamp' at or after this point in time.
+            end_time(datetime): (Optional) Only read rows with a 'timestamp' before this point in time.
+
+        Returns:
+            A Pandas DataFrame containing the matching rows, with one row per session_id. If the archive is empty, it has the
+            requested columns (or 'id' and 'timestamp') and no rows.
+        """
+        dataset = self.dataset()
+        if dataset is None:
+            return pd.DataFrame(columns=columns or ['id', 'timestamp'])
+        data_columns = [name for name in dataset.schema.names if name not in ['year', 'month']]
+        requested_columns = [name for name in (columns or data_columns) if name in dataset.schema.names]
+        # 'id' and 'timestamp' are always needed to resolve rows that were archived more than once
+        loaded_columns = list(dict.fromkeys(requested_columns + ['id', 'timestamp']))
+        filters = []
+        if id:
+            filters.append(ds.field('id') == id)
+        # The year/month predicates only touch the partition keys, so files in other months are skipped without being opened
+        if start_time:
+            filters.append((ds.field('year') > start_time.year) | ((ds.field('year') == start_time.year) & (ds.field('month') >= start_time.month)))
+            filters.append(ds.field('timestamp') >= pa.scalar(start_time, type=dataset.schema.field('timestamp').type))
+        if end_time:
+            filters.append((ds.field('year') < end_time.year) | ((ds.field('year') == end_time.year) & (ds.field('month') <= end_time.month)))
+            filters.append(ds.field('timestamp') < pa.scalar(end_time, type=dataset.schema.field('timestamp').type))
+        row_filter = None
+        for condition in filters:
+            row_filter = condition if row_filter is None else row_filter & condition
+        df = dataset.to_table(columns=loaded_columns, filter=row_filter).to_pandas()
+        df = df.sort_values('timestamp').drop_duplicates(subset='id', keep='last')
+        return df[requested_columns].reset_index(drop=True)
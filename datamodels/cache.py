@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+
+class RecordCache:
+    """
+    A bounded, thread-safe LRU cache with per-entry expiry (TTL), used by DatastoreManager to serve repeated single-record
+    lookups (e.g. session restores) without querying the datastore.
+
+    Entries can be positive (a record) or negative (a marker that a key does not exist); negative entries use a shorter TTL,
+    so that a record created by another process becomes visible quickly.
+
+    Attributes:
+        max_entries(int): The maximum number of entries; the least recently used entry is evicted beyond this.
+        ttl_seconds(float): How long a positive entry stays valid.
+        negative_ttl_seconds(float): How long a negative entry stays valid.
+        stats(dict): Counters of hits, negative hits, misses and evictions.
+
+    Usage:
+        >>> cache = RecordCache(max_entries=10000, ttl_seconds=300, negative_ttl_seconds=10)
+        >>> cache.put('abc123', record)
+        >>> hit, record = cache.get('abc123')
+    """
+    MISSING = object()
+
+    def __init__(self, max_entries=10000, ttl_seconds=300, negative_ttl_seconds=10):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key):
+        """
+        Look up a key.
+
+        Args:
+            key: The key to look up.
+
+        Returns:
+            A (hit, value) tuple. On a hit, value is the cached value, or RecordCache.MISSING for a negative entry; on a miss
+            (including an expired entry), it is None.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] < now:
+                if entry is not None:
+                    del self.entries[key]
+                self.stats['misses'] += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.stats['negative_hits' if entry[0] is self.MISSING else 'hits'] += 1
+            return True, entry[0]
+
+    def put(self, key, value):
+        """
+        Cache a value, evicting the least recently used entry if the cache is full.
+
+        Args:
+            key: The key to cache.
+            value: The value, or RecordCache.MISSING to record that the key does not exist.
+
+        Returns:
+            None
+        """
+        ttl_seconds = self.negative_ttl_seconds if value is self.MISSING else self.ttl_seconds
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl_seconds)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, *keys):
+        """Remove the given keys from the cache, if present."""
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        with self.lock:
+            self.entries.clear()
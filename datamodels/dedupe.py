@@ -0,0 +1,158 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+
+from datamodels.cache import RecordCache
+from loggers.managers import LoggerManager
+from loggers.tracing import traced
+
+# The column in which each row's fingerprint is stored, so that duplicates are also recognized by other processes
+FINGERPRINT_FIELD = 'submission_fingerprint'
+
+class SubmissionDeduplicator:
+    """
+    Recognizes resubmissions of identical form content (double-clicked submit buttons, browser POST retries) so that they can
+    be skipped instead of rewriting the row and bumping its 'timestamp'.
+
+    A submission's fingerprint is a SHA-256 hash of its session_id and form schema fields; metadata such as the elapsed time
+    or IP checks are not included, since they differ between retries of the same form. Fingerprints are kept in a small
+    in-memory LRU index (per process) and in the row itself; a submission is a duplicate if its fingerprint matches the one
+    last written for its session_id, no more than window_seconds ago.
+
+    Configured under the 'submission_dedupe' key of the datastore config. For example:
+
+        datastore:
+            submission_dedupe:
+                window_seconds: 300           # Identical resubmissions within this window are skipped
+                max_entries: 10000            # Fingerprints kept in memory
+                check_stored_fingerprint: true  # On an in-memory miss, compare with the fingerprint stored in the row
+
+    Attributes:
+        fields(list): The form schema fields included in fingerprints.
+        window_seconds(float): How long after a write an identical resubmission is skipped.
+        check_stored_fingerprint(bool): Whether to read the stored fingerprint on an in-memory miss (one primary-key lookup).
+        fingerprints(RecordCache): The in-memory index of fingerprints, by session_id.
+        stats(dict): Counters of skipped writes and where their duplicates were found.
+
+    Usage:
+        >>> deduplicator = SubmissionDeduplicator(form_schema, dedupe_options)
+        >>> fingerprint = deduplicator.fingerprint(submission_data)
+        >>> if not deduplicator.is_duplicate(submission_data['id'], fingerprint, lookup_record=datastore.get_record):
+        ...     datastore.upsert_data({**submission_data, FINGERPRINT_FIELD: fingerprint})
+        ...     deduplicator.remember(submission_data['id'], fingerprint)
+    """
+    def __init__(self, form_schema, dedupe_options):
+        self.fields = sorted(form_schema)
+        self.window_seconds = dedupe_options.get('window_seconds', 300)
+        self.check_stored_fingerprint = dedupe_options.get('check_stored_fingerprint', True)
+        self.fingerprints = RecordCache(
+            max_entries=dedupe_options.get('max_entries', 10000),
+            ttl_seconds=self.window_seconds
+        )
+        self.logger = LoggerManager.get_logger()
+        self.stats_lock = threading.Lock()
+        self.stats = {'skipped_writes': 0, 'skipped_in_memory': 0, 'skipped_on_row': 0}
+
+    def fingerprint(self, submission_data):
+        """
+        Compute the fingerprint of a submission.
+
+        Args:
+            submission_data(dict): A dict containing JSON-equivalent form submission information.
+
+        Returns:
+            A hex-encoded SHA-256 hash.
+        """
+        content = [submission_data.get('id')] + [submission_data.get(field) for field in self.fields]
+        return hashlib.sha256(json.dumps(content, default=str, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+    @traced('dedupe_check')
+    def is_duplicate(self, id, fingerprint, lookup_record=None):
+        """
+        Check whether a fingerprint matches the one last written for a session_id within the window, first in memory and
+        then (if enabled and a lookup function is given) in the stored row. A failed lookup is logged and treated as a miss.
+
+        Args:
+            id(str): The session_id of the submission.
+            fingerprint(str): The fingerprint of the submission.
+            lookup_record(callable): (Optional) Called with the session_id; returns the stored row as a dict, or None.
+
+        Returns:
+            True if the submission is a duplicate and its write can be skipped.
+        """
+        hit, remembered_fingerprint = self.fingerprints.get(id)
+        if hit:
+            duplicate_source = 'skipped_in_memory' if remembered_fingerprint == fingerprint else None
+        elif self.check_stored_fingerprint and lookup_record is not None:
+            try:
+                record = lookup_record(id)
+            except Exception as e:
+                self.logger.warning(f"Could not read the stored fingerprint of '{id}' ({e}); writing the submission.")
+                record = None
+            duplicate_source = 'skipped_on_row' if record and self.matches_stored_record(record, fingerprint) else None
+        else:
+            duplicate_source = None
+        return self.count_duplicate(id, duplicate_source)
+
+    @traced('dedupe_check')
+    async def is_duplicate_async(self, id, fingerprint, lookup_record=None):
+        """
+        Async version of is_duplicate(), for a lookup function that is a coroutine function (e.g. in the async serving mode).
+
+        Args:
+            See is_duplicate().
+
+        Returns:
+            True if the submission is a duplicate and its write can be skipped.
+        """
+        hit, remembered_fingerprint = self.fingerprints.get(id)
+        if hit:
+            duplicate_source = 'skipped_in_memory' if remembered_fingerprint == fingerprint else None
+        elif self.check_stored_fingerprint and lookup_record is not None:
+            try:
+                record = await lookup_record(id)
+            except Exception as e:
+                self.logger.warning(f"Could not read the stored fingerprint of '{id}' ({e}); writing the submission.")
+                record = None
+            duplicate_source = 'skipped_on_row' if record and self.matches_stored_record(record, fingerprint) else None
+        else:
+            duplicate_source = None
+        return self.count_duplicate(id, duplicate_source)
+
+    def count_duplicate(self, id, duplicate_source):
+        """
+        Count (and log) a skipped resubmission.
+
+        Args:
+            id(str): The session_id of the submission.
+            duplicate_source(str): Where the matching fingerprint was found (a key of stats), or None if it is not a duplicate.
+
+        Returns:
+            True if the submission is a duplicate.
+        """
+        if duplicate_source is None:
+            return False
+        with self.stats_lock:
+            self.stats['skipped_writes'] += 1
+            self.stats[duplicate_source] += 1
+        self.logger.info(f"Skipped an identical resubmission of '{id}'.")
+        return True
+
+    def matches_stored_record(self, record, fingerprint):
+        """Check whether a stored row carries the fingerprint and was written within the window."""
+        if record.get(FINGERPRINT_FIELD) != fingerprint or record.get('timestamp') is None:
+            return False
+        return record['timestamp'] >= datetime.now() - timedelta(seconds=self.window_seconds)
+
+    def remember(self, id, fingerprint):
+        """Record the fingerprint just written for a session_id."""
+        self.fingerprints.put(id, fingerprint)
+
+    def forget(self, *ids):
+        """Drop the remembered fingerprints of session_ids whose rows were changed by other means (e.g. a draft)."""
+        self.fingerprints.invalidate(*ids)
+
+    def clear(self):
+        """Drop all remembered fingerprints."""
+        self.fingerprints.clear()
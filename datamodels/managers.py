@@ -1,8 +1,23 @@
+import asyncio
 import os
-from datamodels.local_store import ParquetLocalDataStore
+import threading
+import time
+from datetime import datetime, timedelta
+from datamodels.cache import RecordCache
+from datamodels.dedupe import SubmissionDeduplicator, FINGERPRINT_FIELD
 from datamodels.mysql import MySQLDatastore
+from datamodels.replicas import ReplicaRouter
+from datamodels.resilience import ResilientWriter
+from datamodels.sqlite import SQLiteDatastore
 
+from formbuilder.schema_utils import generate_schema_from_config_file
 from loggers.managers import LoggerManager
+from loggers.tracing import traced
+from utils import LazyModule
+
+# The Parquet-backed components (the 'local' datastore, the archive and the analytics replica) and the partitioned MySQL
+# datastore import pandas and pyarrow, so they are imported below only when configured.
+pd = LazyModule('pandas')
 
 class BaseDatastoreManager:
     """
@@ -34,38 +49,302 @@ class BaseDatastoreManager:
 
 class DatastoreManager(BaseDatastoreManager):
     """
-    Main datastore-managing class that currently handles the following datastores: [mysql]
+    Main datastore-managing class that currently handles the following datastores: [mysql, sqlite, local]
+
+    Old submissions can optionally be moved into a local Parquet archive (see ParquetArchive and archive_data()), configured
+    under the 'archive' key of the datastore config. For example:
+
+        datastore:
+            archive:
+                archive_folder: archive   # Folder for the archive's Parquet files
+                archive_after_days: 120   # Submissions not updated for this many days are archived
+                batch_size: 5000          # Rows moved per batch
+
+    Archived submissions are only included in reads when asked for with include_archive=True.
+
+    Aggregations and full (analytical) reads can be served by a local AnalyticsReplica instead of the datastore, configured
+    under the 'analytics_replica' key of the datastore config (see AnalyticsReplica for its options).
+
+    SQL datastores can also spread reads across read replicas, configured under the 'read_replicas' key of the datastore_params
+    config (see ReplicaRouter for its options). Writes, and reads of session_ids that were just written, stay on the primary.
+
+    Single-record reads (e.g. session restores) can be served from an in-process RecordCache, configured under the
+    'record_cache' key of the datastore config. For example:
+
+        datastore:
+            record_cache:
+                max_entries: 10000        # Records kept, least recently used first out
+                ttl_seconds: 300          # How long a record is served from the cache
+                negative_ttl_seconds: 10  # How long an unknown session_id is remembered as unknown
+
+    The cache is populated by reads and by add_data(), and cleared by bulk uploads and archival. Other processes' writes become
+    visible once a cached record expires, so the TTL bounds how stale a restored session can be in multi-process deployments.
+
+    Submissions can be protected against a slow or unavailable database with a ResilientWriter (a circuit breaker and a local
+    spool), configured under the 'write_resilience' key of the datastore config (see ResilientWriter for its options).
+
+    Partially filled forms are autosaved with save_draft(), which writes only the fields that changed since the last autosave.
+
+    Identical resubmissions (e.g. a double-clicked submit button) can be skipped without a write, configured under the
+    'submission_dedupe' key of the datastore config (see SubmissionDeduplicator for its options).
+
+    In the async serving mode (see async_app.py), submissions and session restores use add_data_async() and get_record_async(),
+    which use the SQL datastore's async methods once init_async() has prepared them (e.g. the MySQL datastore's async engine).
+    Features that have no async implementation (the 'local' and partitioned datastores, read replicas and write resilience)
+    are served by running the sync methods on a thread pool instead.
     """
     def __init__(self, app, config):
         self.datastore_type = config['datastore']['datastore_type']
         self.logger = LoggerManager.get_logger()
         self.logger.info(f"Datastore Manager configured with '{self.datastore_type}' datastore_type")
         if self.datastore_type == 'local':
-            raise DeprecationWarning("The 'local' datastore_type is deprecated; consider implementing/using an ORM-based approach eg. SQLite ")
-            # TODO: Ensure critical keys available in dict
-            # 1. Information about whether the file exists or not at initialization
-            local_store_filename = config['datastore']['datastore_file_name']
-            if os.path.exists(local_store_filename):
-                self.logger.info('INIT: Local store file exists; appending data.')
-            else:
-                self.logger.info("Local datastore does not exist.")
+            from datamodels.segmented_store import SegmentedLocalDatastore
+            self.datastore = SegmentedLocalDatastore(app, config)
         elif self.datastore_type == 'mysql':
             # TODO: Ensure critical keys available in dict
-            self.datastore = MySQLDatastore(app, config)
+            if config['datastore']['datastore_params'].get('mysql_partitioning', {}).get('enabled'):
+                self.logger.info("Partitioning enabled; the MySQL table will be RANGE-partitioned by month on 'timestamp'.")
+                from datamodels.partitioning import PartitionedMySQLDatastore
+                self.datastore = PartitionedMySQLDatastore(app, config)
+            else:
+                self.datastore = MySQLDatastore(app, config)
+        elif self.datastore_type == 'sqlite':
+            self.datastore = SQLiteDatastore(app, config)
         else:
             raise ValueError(f"ERROR: '{self.datastore_type}' is not a valid datastore_type value.")
-    
+        self.archive_config = config['datastore'].get('archive')
+        self.archive = None
+        if self.archive_config:
+            from datamodels.archive import ParquetArchive
+            self.archive = ParquetArchive(self.archive_config.get('archive_folder', 'archive'))
+        self.analytics_replica = None
+        if config['datastore'].get('analytics_replica'):
+            if self.datastore_type == 'local':
+                self.logger.warning("The 'local' datastore is already columnar; the analytics replica will not be used.")
+            else:
+                from datamodels.analytics import AnalyticsReplica
+                self.analytics_replica = AnalyticsReplica(app, config, self.datastore)
+        self.replica_router = None
+        read_replica_options = (config['datastore'].get('datastore_params') or {}).get('read_replicas')
+        if read_replica_options:
+            if self.datastore_type == 'local':
+                self.logger.warning("The 'local' datastore does not support read replicas; they will not be used.")
+            else:
+                self.replica_router = ReplicaRouter(self.datastore.engine, read_replica_options)
+        record_cache_options = config['datastore'].get('record_cache')
+        self.record_cache = RecordCache(**record_cache_options) if record_cache_options else None
+        write_resilience_options = config['datastore'].get('write_resilience')
+        self.resilient_writer = ResilientWriter(self.datastore, write_resilience_options) if write_resilience_options else None
+        self.deduplicator = None
+        dedupe_options = config['datastore'].get('submission_dedupe')
+        if dedupe_options:
+            form_schema = generate_schema_from_config_file(
+                config_folder=os.path.join('config', config['form'].get('form_config_folder', 'form_config')),
+                config_filename=config['form']['form_config_file_name']
+            )
+            self.deduplicator = SubmissionDeduplicator(form_schema, dedupe_options)
+        self.write_stats = {'drafts_saved': 0, 'draft_fields_written': 0}
+        self.write_stats_lock = threading.Lock()
+        self.async_datastore = None
+
+    def after_fork(self):
+        """
+        Reset the state inherited from the parent in a forked child process (e.g. a worker of an app preloaded by the server):
+        give the child its own connection pools and restart the background threads, which do not survive the fork. Called
+        from the child by create_app()'s fork handler; the parent's one-time setup (e.g. migrations) is not repeated.
+
+        Returns:
+            None
+        """
+        self.datastore.after_fork()
+        for component in [self.analytics_replica, self.replica_router, self.resilient_writer]:
+            if component is not None:
+                component.after_fork()
+
+    @traced()
     def add_data(self, submission_data):
         """
-        Data INSERT operation, implements UPSERT logic.
+        Data INSERT operation, implements UPSERT logic. If submission deduplication is configured, a resubmission identical to
+        the last write of its session_id within the deduplication window is skipped.
         
         Args:
             submission_data(dict): A dict containing JSON-equivalent form submission information.
         Returns:
             None
         """
-        self.datastore.upsert_data(submission_data)
+        if self.deduplicator:
+            fingerprint = self.deduplicator.fingerprint(submission_data)
+            if self.deduplicator.is_duplicate(submission_data['id'], fingerprint, lookup_record=self.get_stored_record_for_dedupe()):
+                return
+            submission_data = {**submission_data, FINGERPRINT_FIELD: fingerprint}
+        self.write_submission(submission_data)
+        self.record_submission_written(submission_data)
+
+    def init_async(self):
+        """
+        Prepare the datastore for the async serving mode (e.g. create the async engine of a MySQL datastore). Datastores
+        without async support, or whose async driver is not installed, are served by add_data_async() and
+        get_record_async() on a thread pool instead.
+
+        Returns:
+            True if the datastore's async methods will be used.
+        """
+        init_async = getattr(self.datastore, 'init_async', None)
+        if init_async is None:
+            self.logger.warning(f"The '{self.datastore_type}' datastore has no async support; async requests will use a thread pool.")
+            return False
+        try:
+            init_async()
+        except (ImportError, NotImplementedError) as e:
+            self.logger.warning(f"Could not prepare the datastore for async requests ({e}); they will use a thread pool.")
+            return False
+        self.async_datastore = self.datastore
+        return True
+
+    async def close_async(self):
+        """Release what init_async() set up (e.g. the async engine's connections), if anything."""
+        if self.async_datastore is not None:
+            await self.async_datastore.close_async()
+            self.async_datastore = None
+
+    @traced()
+    async def add_data_async(self, submission_data):
+        """
+        Async version of add_data(), for the async serving mode. The deduplication lookup and the write use the datastore's
+        async methods; without them, or with write resilience configured, add_data() runs on a thread pool instead.
+
+        Args:
+            submission_data(dict): A dict containing JSON-equivalent form submission information.
+        Returns:
+            None
+        """
+        if self.async_datastore is None or self.resilient_writer:
+            return await asyncio.to_thread(self.add_data, submission_data)
+        if self.deduplicator:
+            fingerprint = self.deduplicator.fingerprint(submission_data)
+            if await self.deduplicator.is_duplicate_async(submission_data['id'], fingerprint, lookup_record=self.async_datastore.get_record_async):
+                return
+            submission_data = {**submission_data, FINGERPRINT_FIELD: fingerprint}
+        await self.async_datastore.upsert_data_async(submission_data)
+        self.record_submission_written(submission_data)
+
+    def record_submission_written(self, submission_data):
+        """
+        Update the deduplicator, the record cache and the read-your-writes tracking of the read replicas after a submission
+        is written.
+
+        Args:
+            submission_data(dict): The submission as written.
+
+        Returns:
+            None
+        """
+        if self.deduplicator:
+            self.deduplicator.remember(submission_data['id'], submission_data[FINGERPRINT_FIELD])
+        if self.record_cache:
+            # Cached records are keyed by (id, include_archive); a freshly written record is the result of both lookups
+            record = self.stored_record(submission_data)
+            for include_archive in [False, True]:
+                if record is None:
+                    self.record_cache.invalidate((submission_data['id'], include_archive))
+                else:
+                    self.record_cache.put((submission_data['id'], include_archive), dict(record))
+        if self.replica_router:
+            self.replica_router.record_write([submission_data['id']])
+
+    def stored_record(self, submission_data):
+        """
+        Return a written submission as get_record() would read it back: only the columns of the table model, with values of
+        the columns' types.
+
+        Args:
+            submission_data(dict): The submission as written.
+
+        Returns:
+            A dict of field values, or None if the stored row cannot be derived from the submission alone (e.g. it does not
+            set every column, a value would be converted when stored, or the datastore has no table model).
+        """
+        table_model = getattr(self.datastore, 'table_model', None)
+        if table_model is None:
+            return None
+        record = {}
+        for column in table_model.__table__.columns:
+            if column.name not in submission_data:
+                return None
+            value = submission_data[column.name]
+            try:
+                if value is not None and not isinstance(value, column.type.python_type):
+                    return None
+            except NotImplementedError:
+                return None
+            record[column.name] = value
+        return record
+
+    @traced()
+    def save_draft(self, id, changed_fields):
+        """
+        Autosave a partially filled form by writing only the fields that changed, so that the cost of an autosave scales with
+        the number of edits rather than the width of the form. Fields that are not sent keep their saved values.
+
+        The SQL datastores keep drafts in a drafts table (see MySQLDatastore.save_draft()), since a form whose required fields
+        are not filled in yet cannot be written to the submissions table; restoring a session merges its draft into the
+        submitted record (see get_record()). Other datastores UPSERT the changed fields into the session's row.
+
+        Args:
+            id(str): The session_id of the form.
+            changed_fields(dict): The changed fields and their new values.
+
+        Returns:
+            None
+        """
+        if self.deduplicator:
+            # The session no longer matches its last submission, so an identical resubmission must be written again
+            self.deduplicator.forget(id)
+        if getattr(self.datastore, 'drafts_model', None) is not None:
+            self.datastore.save_draft(id, changed_fields, datetime.now())
+        else:
+            draft_data = {'id': id, 'timestamp': datetime.now(), **changed_fields}
+            if self.deduplicator:
+                draft_data[FINGERPRINT_FIELD] = None
+            self.write_submission(draft_data)
+        with self.write_stats_lock:
+            self.write_stats['drafts_saved'] += 1
+            self.write_stats['draft_fields_written'] += len(changed_fields)
+        if self.record_cache:
+            # Unlike a full submission, a draft is not the whole record, so the cached record is dropped rather than replaced
+            self.record_cache.invalidate((id, False), (id, True))
+        if self.replica_router:
+            self.replica_router.record_write([id])
+
+    def get_stored_record_for_dedupe(self):
+        """
+        Return the function used to look up a stored row's fingerprint on an in-memory miss, or None to skip the lookup while
+        writes are being spooled (the database is presumed unavailable, and the lookup would only add latency).
+
+        Returns:
+            A callable taking a session_id, or None.
+        """
+        if self.resilient_writer and (self.resilient_writer.backlog or self.resilient_writer.breaker.state != 'closed'):
+            return None
+        return lambda id: self.get_record(id, use_primary=True)
+
+    def write_submission(self, submission_data):
+        """
+        UPSERT a (full or partial) submission, through the ResilientWriter if write resilience is configured.
+
+        Args:
+            submission_data(dict): A dict containing JSON-equivalent form submission information.
 
+        Returns:
+            None
+        """
+        if self.resilient_writer:
+            # Spooled submissions are still acknowledged; they are written once the datastore recovers
+            self.resilient_writer.write(submission_data)
+        else:
+            self.datastore.upsert_data(submission_data)
+
+    @traced()
     def add_bulk_data(self, bulk_upload_data):
         """
         Bulk data INSERT operation, implements UPSERT logic.
@@ -77,21 +356,217 @@ class DatastoreManager(BaseDatastoreManager):
             None
         """
         self.datastore.upsert_bulk_data(bulk_upload_data)
+        if self.record_cache:
+            self.record_cache.clear()
+        if self.deduplicator:
+            self.deduplicator.clear()
+        if self.replica_router and 'id' in bulk_upload_data.columns:
+            self.replica_router.record_write(bulk_upload_data['id'].to_list())
+
+    def get_pool_stats(self):
+        """
+        Return the connection pool usage of the SQL datastore's engine and any read replica engines, e.g. for monitoring.
+
+        Returns:
+            A dict of {engine label: {size, checked_out, checked_in, overflow}}, or an empty dict for the 'local' datastore.
+            Pools that do not track their connections (e.g. NullPool) are left out.
+        """
+        engines = {}
+        if hasattr(self.datastore, 'engine'):
+            engines['primary'] = self.datastore.engine
+        if self.replica_router:
+            for index, replica_engine in enumerate(self.replica_router.replica_engines):
+                engines[f"replica_{index}"] = replica_engine
+        pool_stats = {}
+        for label, engine in engines.items():
+            pool = engine.pool
+            if all(hasattr(pool, method) for method in ['size', 'checkedout', 'checkedin', 'overflow']):
+                pool_stats[label] = {'size': pool.size(), 'checked_out': pool.checkedout(), 'checked_in': pool.checkedin(), 'overflow': pool.overflow()}
+        return pool_stats
+
+    def get_cache_stats(self):
+        """
+        Return the record cache counters and size, and the UPSERT statement cache counters of SQL datastores, e.g. for
+        monitoring.
+
+        Returns:
+            A dict of {cache name: {counter: value}}.
+        """
+        cache_stats = {}
+        if self.record_cache:
+            with self.record_cache.lock:
+                cache_stats['record_cache'] = {**self.record_cache.stats, 'entries': len(self.record_cache.entries)}
+        if hasattr(self.datastore, 'statement_stats'):
+            with self.datastore.statement_cache_lock:
+                cache_stats['upsert_statements'] = dict(self.datastore.statement_stats)
+        return cache_stats
+
+    def get_write_stats(self):
+        """
+        Return the draft autosave counters, and the deduplication counters and the state of the write circuit breaker and
+        spool (if configured), e.g. for monitoring.
+
+        Returns:
+            A dict of counters and gauges.
+        """
+        with self.write_stats_lock:
+            write_stats = dict(self.write_stats)
+        if self.deduplicator:
+            with self.deduplicator.stats_lock:
+                write_stats.update(self.deduplicator.stats)
+        if self.resilient_writer:
+            write_stats.update(self.resilient_writer.get_stats())
+        return write_stats
+
+    def is_recent_write(self, write_timestamp):
+        """
+        Check whether a write made at a point in time may not have reached the read replicas yet, e.g. to keep a browser
+        session's reads of its own submission on the primary (this process only tracks the session_ids that it wrote itself).
+
+        Args:
+            write_timestamp(float): The time of the write, as a POSIX timestamp.
+
+        Returns:
+            True if read replicas are configured and the write is within their read-your-writes window.
+        """
+        return bool(self.replica_router) and time.time() - write_timestamp <= self.replica_router.read_your_writes_seconds
     
-    def read_data(self, id=None):
+    @traced()
+    def read_data(self, id=None, include_archive=False, analytical=False, use_primary=False):
         """
         A query interface into the datastore; an optional ID controls if a specific row or all rows are returned.
 
         Args:
             id(str): A session_id value to look up in the datastore. If blank, all results are returned.
+            include_archive(bool): (Optional, default=False) If True and an archive is configured, archived rows are included.
+                                   A row that exists in both the datastore and the archive is returned from the datastore.
+            analytical(bool): (Optional, default=False) If True and an analytics replica is configured, a full read is served by
+                              the replica (which may lag the datastore by up to its staleness bound). Use for exports and
+                              reports, never for reads that must see the latest writes.
+            use_primary(bool): (Optional, default=False) If True, the read is never served by a read replica or the record cache.
 
         """
-        return self.datastore.query(id)
-    
-    def read_aggregated_data(self,group_by_field, aggregation_function, aggregation_field, field_options=None):
+        if id:
+            record = self.get_record(id, include_archive=include_archive, use_primary=use_primary)
+            return pd.DataFrame([record]) if record else pd.DataFrame()
+        if analytical and self.analytics_replica:
+            df = self.analytics_replica.query()
+        elif self.replica_router:
+            df = self.datastore.query(engine=self.replica_router.choose_engine(use_primary=use_primary))
+        else:
+            df = self.datastore.query()
+        if include_archive and self.archive:
+            archived_df = self.archive.read()
+            archived_df = archived_df.loc[~archived_df['id'].isin(df['id'])]
+            if not archived_df.empty:
+                df = pd.concat([archived_df, df], ignore_index=True).sort_values('timestamp', ignore_index=True)
+        return df
+
+    def merge_draft(self, id, record):
+        """
+        Merge the autosaved draft of a session (if any, and if newer than the record) into its record.
+
+        Args:
+            id(str): The session_id of the record.
+            record(dict): The record as stored, or None if the session was never submitted.
+
+        Returns:
+            A dict of field values, or None if the session has neither a record nor a draft.
+        """
+        if getattr(self.datastore, 'drafts_model', None) is None:
+            return record
+        draft = self.datastore.get_draft(id)
+        if draft is None:
+            return record
+        draft_time, draft_fields = draft
+        if record is not None and record['timestamp'] >= draft_time:
+            return record
+        if record is None:
+            record = {**dict.fromkeys(self.datastore.table_model.__table__.columns.keys()), 'id': id}
+        return {**record, **draft_fields, 'timestamp': draft_time}
+
+    @traced()
+    def get_record(self, id, include_archive=False, use_primary=False):
+        """
+        Look up a single submission as a dict of its fields, without building a DataFrame. Lookups are served by the record
+        cache (if configured), then by a read replica (if configured) and finally by the primary. A newer autosaved draft of
+        the session is merged into the record (see save_draft()).
+
+        Args:
+            id(str): The session_id to look up.
+            include_archive(bool): (Optional, default=False) If True and an archive is configured, the archive is searched if the
+                                   session_id is not in the datastore.
+            use_primary(bool): (Optional, default=False) If True, the lookup is never served by a read replica or the record cache.
+
+        Returns:
+            A dict of field values (missing values are None), or None if the session_id was not found.
+        """
+        if self.record_cache and not use_primary:
+            hit, record = self.record_cache.get((id, include_archive))
+            if hit:
+                return None if record is RecordCache.MISSING else dict(record)
+        if self.replica_router:
+            engine = self.replica_router.choose_engine(id=id, use_primary=use_primary)
+            record = self.datastore.get_record(id, engine=engine)
+            if record is None and engine is not self.replica_router.primary_engine:
+                # The session_id may have been written (by another process) after the replica's last replicated change
+                record = self.datastore.get_record(id)
+        else:
+            record = self.datastore.get_record(id)
+        if record is None and include_archive and self.archive:
+            record = self.get_archived_record(id)
+        record = self.merge_draft(id, record)
+        if self.record_cache:
+            self.record_cache.put((id, include_archive), RecordCache.MISSING if record is None else dict(record))
+        return record
+
+    @traced()
+    async def get_record_async(self, id, include_archive=False, use_primary=False):
+        """
+        Async version of get_record(), for the async serving mode. The lookup uses the datastore's async methods; without them,
+        or with read replicas configured, get_record() runs on a thread pool instead, as do lookups in the archive.
+
+        Args:
+            See get_record().
+
+        Returns:
+            A dict of field values (missing values are None), or None if the session_id was not found.
+        """
+        if self.async_datastore is None or self.replica_router:
+            return await asyncio.to_thread(self.get_record, id, include_archive, use_primary)
+        if self.record_cache and not use_primary:
+            hit, record = self.record_cache.get((id, include_archive))
+            if hit:
+                return None if record is RecordCache.MISSING else dict(record)
+        record = await self.async_datastore.get_record_async(id)
+        if record is None and include_archive and self.archive:
+            record = await asyncio.to_thread(self.get_archived_record, id)
+        record = await asyncio.to_thread(self.merge_draft, id, record)
+        if self.record_cache:
+            self.record_cache.put((id, include_archive), RecordCache.MISSING if record is None else dict(record))
+        return record
+
+    def get_archived_record(self, id):
+        """
+        Look up a single submission in the archive.
+
+        Args:
+            id(str): The session_id to look up.
+
+        Returns:
+            A dict of field values (missing values are None), or None if the session_id is not archived.
+        """
+        archived_df = self.archive.read(id=id)
+        if archived_df.empty:
+            return None
+        return archived_df.astype(object).where(archived_df.notnull(), None).iloc[0].to_dict()
+
+    @traced()
+    def read_aggregated_data(self,group_by_field, aggregation_function, aggregation_field, field_options=None, start_time=None, end_time=None, include_archive=False):
         """
         A query interface into the datastore specifically meant for aggregations; see the underlying query_aggregated_data() 
-        method for implementation specifics.
+        method for implementation specifics. Aggregations are served by the analytics replica, if one is configured, and
+        otherwise by a read replica, if any are configured.
 
         Args:
             group_by_field(str): Defaults to 'timestamp'. This denotes the field that would be used in an equivalent SQL GROUP BY clause.
@@ -107,12 +582,72 @@ class DatastoreManager(BaseDatastoreManager):
                         }
                     }
                 ```
+            start_time(datetime): (Optional) Only aggregate rows with a 'timestamp' at or after this point in time.
+            end_time(datetime): (Optional) Only aggregate rows with a 'timestamp' before this point in time.
+            include_archive(bool): (Optional, default=False) If True and an archive is configured, archived rows are included.
         Returns:
             A Pandas DataFrame object containing aggregated query results.
         """
-        return self.datastore.query_aggregated_data(
+        aggregation_options = dict(
             group_by_field=group_by_field,
             aggregation_function=aggregation_function,
             aggregation_field=aggregation_field,
-            field_options=field_options
-        )
\ No newline at end of file
+            field_options=field_options,
+            start_time=start_time,
+            end_time=end_time
+        )
+        if self.analytics_replica:
+            df = self.analytics_replica.query_aggregated_data(**aggregation_options)
+        elif self.replica_router:
+            df = self.datastore.query_aggregated_data(**aggregation_options, engine=self.replica_router.choose_engine())
+        else:
+            df = self.datastore.query_aggregated_data(**aggregation_options)
+        if include_archive and self.archive:
+            archived_df = self.aggregate_archived_data(group_by_field, aggregation_function, aggregation_field, field_options, start_time, end_time)
+            if df.empty:
+                df = archived_df
+            elif not archived_df.empty:
+                # Partial aggregates combine into the same function, except for counts, which add up
+                combine_function = 'sum' if aggregation_function == 'count' else aggregation_function
+                df = pd.concat([df, archived_df]).groupby('grouping', as_index=False)['aggregation'].agg(combine_function)
+        return df
+
+    def aggregate_archived_data(self, group_by_field, aggregation_function, aggregation_field, field_options=None, start_time=None, end_time=None):
+        """
+        Aggregate archived rows the same way query_aggregated_data() aggregates rows in the datastore. Only the columns involved
+        are read from the archive, and rows that also exist in the datastore are skipped, since they are counted there.
+
+        Args:
+            See read_aggregated_data().
+
+        Returns:
+            A Pandas DataFrame with 'grouping' and 'aggregation' columns.
+        """
+        columns = list(dict.fromkeys(['id', group_by_field, aggregation_field]))
+        from datamodels.segmented_store import aggregate_dataframe
+        archived_df = self.archive.read(columns=columns, start_time=start_time, end_time=end_time)
+        archived_df = archived_df.loc[~archived_df['id'].isin((self.analytics_replica or self.datastore).query(columns=['id'])['id'])]
+        return aggregate_dataframe(archived_df, group_by_field, aggregation_function, aggregation_field, field_options)
+
+    def archive_data(self, older_than_days=None):
+        """
+        Move submissions that have not been updated for a number of days from the datastore into the archive.
+
+        Args:
+            older_than_days(int): (Optional) The age, in days, after which submissions are archived. Defaults to the configured
+                                  'archive_after_days' value.
+
+        Returns:
+            The number of rows archived.
+        """
+        if not self.archive:
+            raise RuntimeError("No archive is configured; add an 'archive' key to the datastore config to enable archival.")
+        older_than_days = older_than_days or self.archive_config['archive_after_days']
+        cutoff = datetime.now() - timedelta(days=older_than_days)
+        self.logger.info(f"Archiving submissions older than {older_than_days} day(s) (before {cutoff}).")
+        archived_rows = self.datastore.archive_rows_older_than(self.archive, cutoff, batch_size=self.archive_config.get('batch_size', 5000))
+        if self.analytics_replica and archived_rows:
+            self.analytics_replica.sync_deletions()
+        if self.record_cache:
+            self.record_cache.clear()
+        return archived_rows
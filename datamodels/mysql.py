@@ -1,17 +1,23 @@
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import create_engine, cast
-from sqlalchemy import Column, Integer, Date, String, Float, Boolean, DateTime
-from sqlalchemy.dialects.mysql import insert
-from utils import generate_websafe_session_id
+from sqlalchemy import create_engine, cast, inspect, literal_column, select, update
+from sqlalchemy import Column, Integer, Date, String, Float, Boolean, DateTime, Enum, Text, SmallInteger, BigInteger
+from sqlalchemy.dialects.mysql import insert, DATETIME, TINYINT, MEDIUMINT
+from utils import generate_websafe_session_id, LazyModule
 from datetime import datetime
 from sqlalchemy.orm import Session
-from flask_migrate import Migrate, init, migrate, upgrade
-import mysql.connector
-import pandas as pd
+import json
 import os
+import time
+from threading import Lock
 from sqlalchemy.sql import func
 
+from datamodels.dedupe import FINGERPRINT_FIELD
+from datamodels.schema_migrations import OnlineSchemaMigrator
+from formbuilder.schema_utils import parse_select_options, read_form_config_workbook
 from loggers.managers import LoggerManager
+from loggers.tracing import traced
+
+# pandas is only needed for bulk uploads, exports and aggregations, not to serve the form
+pd = LazyModule('pandas')
 
 SQLALCHEMY_TYPE_MAPPING = {
     "INTEGER": Integer,
@@ -20,6 +26,61 @@ SQLALCHEMY_TYPE_MAPPING = {
     "BOOLEAN": Boolean
 }
 
+# The smallest integer type that can hold every value with up to N decimal digits (keyed by N, in ascending order). The
+# MySQL-only TINYINT and MEDIUMINT types are used as variants so that the model stays portable to other dialects.
+SQLALCHEMY_INTEGER_TYPES_BY_DIGITS = {
+    2: SmallInteger().with_variant(TINYINT(), 'mysql'),
+    4: SmallInteger(),
+    6: Integer().with_variant(MEDIUMINT(), 'mysql'),
+    9: Integer(),
+}
+
+# Records when a row was last written, by the database's clock, so that the analytics replica can sync rows in write order
+# rather than by their 'timestamp' (which bulk uploads and replayed submissions carry over from the original submission)
+WRITTEN_AT_FIELD = 'written_at'
+
+def derive_column_type(field):
+    """
+    Derive a compact SQLAlchemy column type for a field from the Fields sheet of the form_config Excel sheet, so that rows (and
+    the indexes that contain them) stay as narrow as possible:
+
+        1. 'select' fields with a STRING data_type become a VARCHAR sized by the optional 'max_length' column (default 255),
+           widened to fit the longest of their 'select_options', so that editing the options never changes the column
+           (and values of removed options stay valid). Fields marked 'Yes' in the optional 'enum' column of the Fields sheet
+           become an ENUM of their options instead (stored in 1-2 bytes per row), at the cost of a table rebuild whenever an
+           option is changed or removed, and of rejecting values that are no longer options.
+        2. 'text' fields become TEXT; all other STRING fields become a VARCHAR sized by the optional 'max_length' column
+           (default 255).
+        3. INTEGER fields become the smallest integer type that fits 'max_length' decimal digits (TINYINT, SMALLINT,
+           MEDIUMINT, INTEGER or BIGINT); without 'max_length', INTEGER is used.
+        4. FLOAT and BOOLEAN fields map directly (see SQLALCHEMY_TYPE_MAPPING).
+
+    Args:
+        field(dict): A row of the Fields sheet, with missing values set to None.
+
+    Returns:
+        A SQLAlchemy type instance.
+    """
+    data_type = field.get('data_type') or 'STRING'
+    max_length = int(field['max_length']) if field.get('max_length') else None
+    if data_type == 'INTEGER':
+        if not max_length:
+            return Integer()
+        for digits, integer_type in SQLALCHEMY_INTEGER_TYPES_BY_DIGITS.items():
+            if max_length <= digits:
+                return integer_type
+        return BigInteger()
+    if data_type in ['FLOAT', 'BOOLEAN']:
+        return SQLALCHEMY_TYPE_MAPPING[data_type]
+    select_options = parse_select_options(field.get('select_options'))
+    if field.get('field_type') == 'select' and select_options:
+        if str(field.get('enum') or 'no').lower() == 'yes':
+            return Enum(*select_options, name=f"{field['backend_field_name']}_options")
+        return String(max(max_length or 255, *[len(option) for option in select_options]))
+    if field.get('field_type') == 'text':
+        return Text()
+    return String(max_length or 255)
+
 class MySQLDatastore:
     """
     SQLAlchemy-interfaced, ORM-bound MySQL Datastore class. Implements low-level data operations on a configured MySQL instance.
@@ -27,21 +88,40 @@ class MySQLDatastore:
     Attributes:
         app(Flask): The Flask app implementing this Datastore instance.
         db(SQLAlchemy): The Flask-SQLAlchemy instance used to perform ORM-bound operations
+        model_base: The declarative base class of the table model (db.Model)
         config(dict): The full contents of the config.yaml configuration file
         table_name(str): The name of the table that will contain form submission data (from config)
         table_model(db.Model): A SQLAlchemy model of the table, generated at runtime using the form_config Excel sheet
+        drafts_model(db.Model): A SQLAlchemy model of the drafts table, which holds autosaved fields (see save_draft()), or
+                                None if the table does not exist (the auto-migration is skipped in dry-run mode)
         migrate(Migrate): An Alembic Migrate object used to initialize and govern migrations (changes in schema)
+        schema_migrator(OnlineSchemaMigrator): Applies additive schema changes online (without blocking writes) ahead of Alembic
+        upsert_statements(dict): Parameterized UPSERT statements for the current table model, by the set of columns written
+                                 and whether existing rows are only overwritten by newer submissions
+        statement_stats(dict): Counters of UPSERT statements built, cache hits and the time spent compiling statements
         logger(LoggerManager): A singleton logger instance for logging.
         sqlalchemy_database_uri: A SQLAlchemy URI generated using the config and added to the app dictionary
         engine: A SQLAlchemy ORM Engine to handle specific low-level data operations
+        async_engine: A SQLAlchemy AsyncEngine for the async serving mode; None until init_async() is called
 
     Usage:
         >>> datastore = MySQLDatastore(app, config) # Should be done within a DatastoreManager instance
     """
+    # Whether 'timestamp' is part of the table's primary key; required by subclasses that partition the table by time
+    timestamp_in_primary_key = False
+
     def __init__(self, app, config):
         """
         Set up a MySQL connection, initialize the ORM engine and use Flask-Migrate (Alembic) to perform any necessary migrations
-        to bring the database in sync with the fields in the form configuration sheet.
+        to bring the database in sync with the fields in the form configuration sheet. Additive changes (e.g. a new field in the
+        form configuration sheet) are first applied online by an OnlineSchemaMigrator, unless disabled under the
+        'mysql_online_schema_migration' key of the datastore_params config. For example:
+
+            datastore_params:
+                mysql_online_schema_migration:
+                    enabled: true     # Set to false to let Alembic apply all changes with plain ALTER TABLE statements
+                    dry_run: false    # Set to true to only report planned changes and their lock impact; no migrations run
+                    batch_size: 5000  # Rows copied per batch if a shadow-table copy is required
 
         Args:
             app(Flask): The Flask app implementing this Datastore instance.
@@ -49,12 +129,19 @@ class MySQLDatastore:
         Returns:
             None
         """
+        # Flask-SQLAlchemy and Flask-Migrate (Alembic) are only used by the MySQL datastore, for migrations, so they are not
+        # imported unless a MySQL datastore is configured
+        from flask_sqlalchemy import SQLAlchemy
+        from flask_migrate import Migrate, init, migrate, upgrade
+
         self.app = app
         self.db = SQLAlchemy()
+        self.model_base = self.db.Model
         self.config = config
         self.table_name = self.config['form']['form_config_file_name'].split('.')[0]
         self.table_schema = self.config['datastore']['datastore_params']['mysql_database'] # Not a typo - MySQL does not have "schemas"
         self.logger = LoggerManager.get_logger()
+        self.reset_statement_cache()
         # Set up MYSQL and initialize the SQLAlchemy ORM engine
         mysql_config_params = self.config['datastore']['datastore_params']
         self.sqlalchemy_database_uri = self.generate_database_uri_from_config(mysql_config_params=mysql_config_params)
@@ -63,22 +150,81 @@ class MySQLDatastore:
         for key, value in mysql_config_params.get('mysql_sqlalchemy_engine_options',{}).items():
             app.config[key] = value
             self.logger.info(f"Added {key}={value} to app config")
-        self.table_model = self.generate_table_orm_from_config_file(config_folder='form_config',config_filename=self.config['form']['form_config_file_name'])  
+        self.table_model = self.generate_table_orm_from_config_file(config_folder=self.config['form'].get('form_config_folder', 'form_config'),config_filename=self.config['form']['form_config_file_name'])  
+        self.drafts_model = self.generate_drafts_orm()
         self.db.init_app(self.app)
         self.create_engine()
+        self.async_engine = None
 
-        # Initialize flask-migrate (Alembic), load the table model and run a single migration if required
-        self.migrate = Migrate(self.app, self.db)
-        with self.app.app_context():
-            if not os.path.exists('migrations'):
-                self.logger.warning("Initial setup, no migrations folder found. Initializing new migrations folder.")
-                init()
-            migrate(message="auto-migration")
-            upgrade()
+        # Apply additive schema changes online before Alembic sees them, so that they never lock the table for writes
+        online_migration_options = mysql_config_params.get('mysql_online_schema_migration', {})
+        self.schema_migrator = None
+        if online_migration_options.get('enabled', True):
+            self.schema_migrator = OnlineSchemaMigrator(
+                self.engine,
+                self.table_model,
+                table_schema=self.table_schema,
+                dry_run=online_migration_options.get('dry_run', False),
+                batch_size=online_migration_options.get('batch_size', 5000)
+            )
+            self.schema_migrator.run(query_patterns=self.generate_query_patterns())
+
+        # Initialize flask-migrate (Alembic), load the table model and run a single migration if required. Column type changes
+        # are owned by the online schema migrator when it is enabled, so Alembic must not re-attempt any that it skipped.
+        self.migrate = Migrate(self.app, self.db, compare_type=self.schema_migrator is None)
+        if self.schema_migrator and self.schema_migrator.dry_run:
+            self.logger.warning("Online schema migration is in dry-run mode; skipping the auto-migration. The table may be out of sync with the form config.")
+            if not inspect(self.engine).has_table(self.drafts_model.__tablename__, schema=self.table_schema):
+                self.logger.warning("The drafts table has not been created yet; autosaves will be written to the submissions table.")
+                self.drafts_model = None
+        else:
+            with self.app.app_context():
+                if not os.path.exists('migrations'):
+                    self.logger.warning("Initial setup, no migrations folder found. Initializing new migrations folder.")
+                    init()
+                migrate(message="auto-migration")
+                upgrade()
 
     def create_engine(self):
         """Create a SQLAlchemy engine to handle low-level data operations (IUD)"""
         self.engine = create_engine(self.sqlalchemy_database_uri, echo=True)
+
+    def init_async(self):
+        """
+        Create a SQLAlchemy AsyncEngine for the async serving mode (see async_app.py), on the same database as the engine but
+        through an asyncio driver (aiomysql by default, which must be installed). The driver and the engine's pool options
+        are set under the 'mysql_async_driver' and 'mysql_async_engine_options' keys of the datastore_params config. For
+        example:
+
+            datastore_params:
+                mysql_async_driver: asyncmy
+                mysql_async_engine_options:
+                    pool_size: 20
+                    pool_recycle: 3600
+
+        Returns:
+            None
+        """
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        mysql_config_params = self.config['datastore']['datastore_params']
+        driver = mysql_config_params.get('mysql_async_driver', 'aiomysql')
+        async_database_uri = self.sqlalchemy_database_uri.replace('mysql+pymysql://', f"mysql+{driver}://", 1)
+        self.async_engine = create_async_engine(async_database_uri, echo=self.engine.echo, **mysql_config_params.get('mysql_async_engine_options', {}))
+        self.logger.info(f"Created an async engine using the '{driver}' driver")
+
+    async def close_async(self):
+        """Close the async engine's pooled connections, e.g. when the async serving mode shuts down."""
+        if self.async_engine is not None:
+            await self.async_engine.dispose()
+            self.async_engine = None
+
+    def after_fork(self):
+        """
+        Reset the state inherited from the parent in a forked child process (e.g. a worker of a preloaded app). The child starts
+        with an empty connection pool instead of sharing the parent's connections, which are left open for the parent.
+        """
+        self.engine.dispose(close=False)
     
     def generate_database_uri_from_config(self, mysql_config_params):
         """
@@ -104,6 +250,14 @@ class MySQLDatastore:
         The model is generated dynamically using the form_config Excel sheet, and will be used as a reference by Alembic
         to build migration scripts. The first "migration" will be blank, since this method also creates the 
 
+        If submission deduplication is configured, a nullable 'submission_fingerprint' column is added as well. If an analytics
+        replica is configured, a nullable, indexed 'written_at' column records when each row was last written, by the database's
+        clock (see query_updated_since()).
+
+        Column types are derived from the Fields sheet by derive_column_type(). Secondary indexes are declared on 'timestamp'
+        (dashboard trends and exports), on the field configured as the dashboard's 'breakdown_visualization_field', and on any
+        field marked 'Yes' in the optional 'indexed' column of the Fields sheet (TEXT fields cannot be indexed).
+
         Args:
             config_folder(str): (Optional, default='formbuilder') The name of the folder, under the config/ directory, 
                                 containing the form_config Excel sheet.
@@ -111,7 +265,7 @@ class MySQLDatastore:
                                   configuration information. Essentially controls the schema of the database table and ORM,
         
         Returns:
-            A SQLAlchemy db.Model class object 
+            A SQLAlchemy model class (a subclass of model_base) 
         """
         # Define the default table schema with ID and timestamp fields
         attributes = {
@@ -119,26 +273,144 @@ class MySQLDatastore:
             "__table_args__": {'extend_existing': True, 'schema': self.table_schema},
         }
         attributes['id'] = Column(String(255), nullable=False, primary_key=True)
-        attributes['timestamp'] = Column(DateTime, nullable=False, primary_key=False)
+        attributes['timestamp'] = Column(DateTime, nullable=False, primary_key=self.timestamp_in_primary_key, index=True)
+        if self.config['datastore'].get('submission_dedupe'):
+            # Lets other processes recognize identical resubmissions (see SubmissionDeduplicator)
+            attributes[FINGERPRINT_FIELD] = Column(String(64), nullable=True)
+        if self.config['datastore'].get('analytics_replica'):
+            attributes[WRITTEN_AT_FIELD] = Column(DateTime().with_variant(DATETIME(fsp=6), 'mysql'), nullable=True, index=True)
+        breakdown_field = self.config.get('dashboard', {}).get('breakdown_visualization_field')
 
         # Then build the remainder of the schema dynamically from the form config file
         config_folder = os.path.join('config',config_folder)
         config_filepath = os.path.join(config_folder, config_filename)
         current_folder = os.path.dirname(os.path.abspath(__file__))
         relative_config_file_path = os.path.join(current_folder,'..',config_filepath)
-        config_workbook = pd.ExcelFile(relative_config_file_path)
-
-        form_fields = pd.read_excel(config_workbook, 'Fields')
-        for _, row in form_fields.iterrows():
+        _, form_fields = read_form_config_workbook(relative_config_file_path)
+        for row in form_fields:
             col_name = row["backend_field_name"]
-            col_type = SQLALCHEMY_TYPE_MAPPING.get(row["data_type"], String(255))
+            col_type = derive_column_type(row)
             nullable = True if row["required"].lower() == 'no' else False
-            attributes[col_name] = Column(col_type, nullable=nullable, primary_key=False)
-        model = type(attributes['__tablename__'], (self.db.Model,), attributes)
+            indexed = str(row.get("indexed") or 'no').lower() == 'yes' or col_name == breakdown_field
+            if indexed and isinstance(col_type, Text):
+                self.logger.warning(f"Field '{col_name}' is a 'text' field and cannot be indexed; its index will be skipped.")
+                indexed = False
+            attributes[col_name] = Column(col_type, nullable=nullable, primary_key=False, index=indexed)
+        model = type(attributes['__tablename__'], (self.model_base,), attributes)
         return model
 
+    def generate_drafts_orm(self):
+        """
+        Generates the ORM of the drafts table ('<table name>_drafts'), which holds the autosaved fields of each session as a
+        JSON object. Drafts are kept out of the submissions table, whose required fields are NOT NULL: a session that was
+        never submitted has no row there, and a partially filled form cannot create one. Like the table model, the drafts
+        model is created and migrated by Alembic.
+
+        Returns:
+            A SQLAlchemy model class (a subclass of model_base)
+        """
+        attributes = {
+            "__tablename__": f"{self.table_model.__tablename__}_drafts",
+            "__table_args__": {'extend_existing': True, 'schema': self.table_schema},
+            'id': Column(String(255), nullable=False, primary_key=True),
+            'timestamp': Column(DateTime, nullable=False),
+            'fields': Column(Text, nullable=False),
+        }
+        return type(attributes['__tablename__'], (self.model_base,), attributes)
+
+    def build_draft_upsert_statement(self, draft_values):
+        """
+        Build an INSERT ... ON DUPLICATE KEY UPDATE statement that writes a draft.
+
+        Args:
+            draft_values(dict): The 'id', 'timestamp' and 'fields' values of the draft.
+
+        Returns:
+            A SQLAlchemy Insert statement.
+        """
+        stmt = insert(self.drafts_model.__table__).values(**draft_values)
+        return stmt.on_duplicate_key_update(timestamp=stmt.inserted.timestamp, fields=stmt.inserted.fields)
+
+    @traced()
+    def save_draft(self, id, changed_fields, timestamp):
+        """
+        Autosave the changed fields of a session into its draft, merging them with the fields saved by earlier autosaves.
+        Autosaves from before the session's last submission are discarded, since the submission contains every field.
+
+        Args:
+            id(str): The session_id of the form.
+            changed_fields(dict): The changed fields and their new values.
+            timestamp(datetime): The time of the autosave.
+
+        Returns:
+            None
+        """
+        table = self.table_model.__table__
+        drafts = self.drafts_model.__table__
+        with self.engine.begin() as connection:
+            draft = connection.execute(select(drafts.c.timestamp, drafts.c.fields).where(drafts.c.id == id).with_for_update()).first()
+            submission_time = connection.execute(select(table.c.timestamp).where(table.c.id == id).limit(1)).scalar()
+            fields = {}
+            if draft is not None and (submission_time is None or draft.timestamp > submission_time):
+                fields = json.loads(draft.fields)
+            fields.update(changed_fields)
+            connection.execute(self.build_draft_upsert_statement({'id': id, 'timestamp': timestamp, 'fields': json.dumps(fields)}))
+            if submission_time is not None and FINGERPRINT_FIELD in table.c:
+                # The session no longer matches its last submission, so an identical resubmission must be written again
+                connection.execute(update(table).where(table.c.id == id).values({FINGERPRINT_FIELD: None}))
+        self.logger.info(f"Saved {len(changed_fields)} draft field(s) of '{id}'")
+
+    def get_draft(self, id):
+        """
+        Look up the draft of a session, on the primary (a draft is only read right after it is written, by the same browser).
+
+        Args:
+            id(str): The session_id to look up.
+
+        Returns:
+            A (timestamp, fields) tuple, where fields is a dict of the autosaved fields, or None if the session has no draft.
+        """
+        drafts = self.drafts_model.__table__
+        with self.engine.connect() as connection:
+            draft = connection.execute(select(drafts.c.timestamp, drafts.c.fields).where(drafts.c.id == id)).first()
+        return (draft.timestamp, json.loads(draft.fields)) if draft else None
+
+    def generate_query_patterns(self):
+        """
+        Build the queries that the dashboard and exports run against the table, so that the OnlineSchemaMigrator can report
+        how their query plans change when indexes are added.
+
+        Returns:
+            A dict of {label: SQLAlchemy Select}.
+        """
+        table = self.table_model.__table__
+        submission_date = self.cast_to_date(table.c.timestamp)
+        query_patterns = {
+            'dashboard: submissions per day': select(submission_date, func.count(table.c.id)).group_by(submission_date),
+            'export: all submissions by time': select(table).order_by(table.c.timestamp),
+        }
+        breakdown_field = self.config.get('dashboard', {}).get('breakdown_visualization_field', 'id')
+        if breakdown_field in table.c and breakdown_field != 'id':
+            breakdown_column = table.c[breakdown_field]
+            query_patterns[f"dashboard: breakdown by {breakdown_field}"] = select(breakdown_column, func.count(table.c.id)).group_by(breakdown_column)
+        return query_patterns
+
+    def cast_to_date(self, column):
+        """
+        Build a SQL expression that truncates a DATETIME column to its date, e.g. for per-day aggregations.
+
+        Args:
+            column: A SQLAlchemy column or column expression.
+
+        Returns:
+            A SQLAlchemy column expression of type Date.
+        """
+        return cast(column, Date)
+
     def check_connection(self):
         """'Check' the existing connection associated with this Datastore instance by opening and closing the configured connection."""
+        import mysql.connector
+
         mysql_config_params = self.config['datastore']['datastore_params']
         self.con = mysql.connector.connect(
                 user=mysql_config_params['mysql_username'],
@@ -149,26 +421,117 @@ class MySQLDatastore:
         self.con.close()
         self.logger.info('Datastore connection check OK.')
     
-    def upsert_data(self, submission_data):
+    def reset_statement_cache(self):
+        """Discard all cached UPSERT statements and zero the statement counters."""
+        self.statement_cache_lock = Lock()
+        self.upsert_statements = {}
+        self.upsert_statements_model = None
+        self.statement_stats = {'statements_built': 0, 'cache_hits': 0, 'compile_seconds': 0.0}
+
+    def build_upsert_statement(self, columns, only_if_newer=False):
+        """
+        Build a parameterized INSERT ... ON DUPLICATE KEY UPDATE statement that writes the given columns; the row values are
+        bound at execution time, so the same statement serves every row (and executemany) with these columns.
+
+        Args:
+            columns(tuple): The names of the columns written.
+            only_if_newer(bool): (Optional, default=False) If True, an existing row is only updated if the written 'timestamp'
+                                 is newer than the stored one.
+
+        Returns:
+            A SQLAlchemy Insert statement.
+        """
+        table = self.table_model.__table__
+        stmt = insert(table)
+        if WRITTEN_AT_FIELD in table.c:
+            stmt = stmt.values({WRITTEN_AT_FIELD: self.write_time_expression()})
+            columns = (*columns, WRITTEN_AT_FIELD)
+        primary_key_columns = [column.name for column in table.primary_key]
+        updated_columns = [column for column in columns if column not in primary_key_columns]
+        if not only_if_newer:
+            return stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in updated_columns})
+        # MySQL applies the assignments in order, so 'timestamp' must be assigned after every column compared against it
+        is_newer = stmt.inserted.timestamp > table.c.timestamp
+        return stmt.on_duplicate_key_update([
+            (column, func.if_(is_newer, stmt.inserted[column], table.c[column]))
+            for column in sorted(updated_columns, key=lambda column: column == 'timestamp')
+        ])
+
+    def write_time_expression(self):
+        """Return the SQL expression written to the 'written_at' column: the database's current time, in microseconds."""
+        return literal_column('NOW(6)')
+
+    def get_upsert_statement(self, columns, only_if_newer=False):
+        """
+        Return the cached UPSERT statement for a set of columns, building it on first use. The cache is discarded whenever the
+        table model is regenerated (i.e. the form schema changed). Because the cached statement object is reused, SQLAlchemy's
+        compiled cache also serves its compiled SQL, instead of compiling a new statement with inlined values on every call.
+
+        Args:
+            columns(iterable): The names of the columns written.
+            only_if_newer(bool): (Optional, default=False) See build_upsert_statement().
+
+        Returns:
+            A SQLAlchemy Insert statement.
+        """
+        columns = tuple(sorted(columns))
+        with self.statement_cache_lock:
+            if self.upsert_statements_model is not self.table_model:
+                self.upsert_statements = {}
+                self.upsert_statements_model = self.table_model
+            upsert_statement = self.upsert_statements.get((columns, only_if_newer))
+            if upsert_statement is not None:
+                self.statement_stats['cache_hits'] += 1
+                return upsert_statement
+            upsert_statement = self.build_upsert_statement(columns, only_if_newer=only_if_newer)
+            # Compile once up front to measure the cost that caching saves on every subsequent call
+            compile_start_time = time.perf_counter()
+            upsert_statement.compile(dialect=self.engine.dialect, column_keys=list(columns))
+            compile_seconds = time.perf_counter() - compile_start_time
+            self.upsert_statements[(columns, only_if_newer)] = upsert_statement
+            self.statement_stats['statements_built'] += 1
+            self.statement_stats['compile_seconds'] += compile_seconds
+        self.logger.info(f"Built an UPSERT statement for {len(columns)} column(s) of {self.table_name} (compiled in {compile_seconds * 1000:.2f} ms)")
+        return upsert_statement
+
+    @traced()
+    def upsert_data(self, submission_data, only_if_newer=False):
         """
         Perform an UPSERT (UPDATE row with the same session_id as the submission data, INSERT if such a row does not exist)
         against the data in the database using the provided submission data.
 
         Args:
             submission_data(dict): A JSON-equivalent dict containing form submission information.
+            only_if_newer(bool): (Optional, default=False) If True, an existing row is only updated if the submission's
+                                 'timestamp' is newer than the stored one, e.g. when replaying spooled submissions that
+                                 another process may have overtaken with a newer write.
 
         Returns:
             None
         """
-        # Create a session
-        with Session(self.engine) as session:
-            # Create an instance of the dynamic model
-            stmt = insert(self.table_model).values(**submission_data)
-            upsert_stmt = stmt.on_duplicate_key_update(**submission_data)
-            session.execute(upsert_stmt)
-            session.commit()
-            self.logger.info(f"Upserted row into {self.table_name}: {submission_data}")
+        with self.engine.begin() as connection:
+            connection.execute(self.get_upsert_statement(submission_data, only_if_newer=only_if_newer), submission_data)
+        self.logger.info(f"Upserted row '{submission_data['id']}' into {self.table_name}")
+        # The full submission is only formatted if DEBUG logging is enabled
+        self.logger.debug("Upserted submission data: %s", submission_data)
     
+    @traced()
+    async def upsert_data_async(self, submission_data):
+        """
+        Async version of upsert_data(), on the async engine (see init_async()).
+
+        Args:
+            submission_data(dict): A JSON-equivalent dict containing form submission information.
+
+        Returns:
+            None
+        """
+        async with self.async_engine.begin() as connection:
+            await connection.execute(self.get_upsert_statement(submission_data), submission_data)
+        self.logger.info(f"Upserted row '{submission_data['id']}' into {self.table_name}")
+        self.logger.debug("Upserted submission data: %s", submission_data)
+
+    @traced()
     def upsert_bulk_data(self, bulk_upload_data):
         """
         Perform a bulk UPSERT (UPDATE rows with the same session_ids as the submission data, INSERT if such rows do not exist). Also
@@ -181,8 +544,27 @@ class MySQLDatastore:
         Returns:
             None
         """
-        # Ensure the default id and timestamp fields are present in the dataframe 
         num_rows = len(bulk_upload_data)
+        bulk_upload_data = self.prepare_bulk_upload_data(bulk_upload_data)
+        if not bulk_upload_data:
+            return
+        # Executed as an executemany with bound parameters, which the driver batches into multi-row INSERTs
+        with self.engine.begin() as connection:
+            connection.execute(self.get_upsert_statement(bulk_upload_data[0]), bulk_upload_data)
+        self.logger.info(f"Bulk-upserted {num_rows} row(s) into {self.table_name}")
+
+    def prepare_bulk_upload_data(self, bulk_upload_data):
+        """
+        Ensure that the 'id' and 'timestamp' fields are present in uploaded data (generating them if not), and convert it into
+        a list of row dicts with missing values set to None, ready for bulk upsertion.
+
+        Args:
+            bulk_upload_data(pd.DataFrame): A Pandas DataFrame that contains several instances (rows) of form submission data.
+
+        Returns:
+            A list of dicts, one per row.
+        """
+        # Ensure the default id and timestamp fields are present in the dataframe 
         bulk_upload_data_columns = [x.lower() for x in bulk_upload_data.columns]
         if 'id' not in bulk_upload_data_columns:
             self.logger.warning("The 'id' field was not found in the uploaded dataset. New IDs will be generated.")
@@ -190,40 +572,155 @@ class MySQLDatastore:
         if 'timestamp' not in bulk_upload_data_columns:
             self.logger.warning("The 'timestamp' field was not found in the uploaded dataset. New timestamps will be generated.")
             bulk_upload_data['timestamp'] = datetime.now()
+        elif 'timestamp' in bulk_upload_data.columns:
+            # Timestamps read from CSV uploads are strings, which not every driver accepts for DateTime columns
+            bulk_upload_data['timestamp'] = pd.to_datetime(bulk_upload_data['timestamp'])
+        # Fields missing from the upload are written as NULL, so that all rows share one set of columns (and one statement)
+        for column in self.table_model.__table__.columns.keys():
+            if column not in bulk_upload_data.columns:
+                bulk_upload_data[column] = None
+        # 'written_at' is set by the database when the rows are written, never from the upload (e.g. a re-uploaded export)
+        bulk_upload_data = bulk_upload_data.drop(columns=[WRITTEN_AT_FIELD], errors='ignore')
         # Prepare the data for bulk upsertion by converting it to a dict
         bulk_upload_data = bulk_upload_data.where((pd.notnull(bulk_upload_data)), None)
-        bulk_upload_data = bulk_upload_data.to_dict(orient="records")
-        # Create a session
-        with Session(self.engine) as session:
-            # Create an instance of the dynamic model
-            stmt = insert(self.table_model).values(bulk_upload_data)
-            update_dict = {col.name: getattr(stmt.inserted, col.name) for col in self.table_model.__table__.columns}
-            upsert_stmt = stmt.on_duplicate_key_update(update_dict)
-            session.execute(upsert_stmt)
-            session.commit()
-            self.logger.info(f"Bulk-upserted {num_rows} row(s) into {self.table_name}")
+        return bulk_upload_data.to_dict(orient="records")
 
-    def query(self, id=None):
+    @traced()
+    def query(self, id=None, columns=None, engine=None):
         """
-        Query the MySQL database associated with this Datastore instance; return all rows or a specific one using an ID if provided.
+        Query the MySQL database associated with this Datastore instance; return all rows (oldest first) or a specific one using an
+        ID if provided.
 
         Args:
             id(str): (Optional) An optional session_id value to look up in the underlying MySQL database.
+            columns(list): (Optional) The columns to return; all columns are returned if not specified.
+            engine: (Optional) The SQLAlchemy engine to query, e.g. a read replica's; defaults to the primary's engine.
 
         Returns:
             A Pandas DataFrame object containing query results.  
         """
-        with Session(self.engine) as session:
-            query = session.query(self.table_model)
+        engine = engine or self.engine
+        with Session(engine) as session:
+            if columns:
+                query = session.query(*[getattr(self.table_model, column) for column in columns])
+            else:
+                query = session.query(self.table_model)
             if id:
                 query = query.filter_by(id=id)
-            df = pd.read_sql(query.statement, con=self.engine)
+            else:
+                query = query.order_by(self.table_model.timestamp)
+            df = pd.read_sql(query.statement, con=engine)
             # Drop SQLAlchemy-specific metadata
             if '_sa_instance_state' in df.columns:
                 df = df.drop(columns=["_sa_instance_state"])
             return df
     
-    def query_aggregated_data(self, group_by_field='timestamp', aggregation_function='count', aggregation_field='id', field_options=None):
+    @traced()
+    def get_record(self, id, engine=None):
+        """
+        Look up a single row by its session_id with a Core SELECT, without the ORM or pandas. Much cheaper than query(id) when
+        the caller needs a dict, e.g. to return a record as JSON.
+
+        Args:
+            id(str): The session_id to look up.
+            engine: (Optional) The SQLAlchemy engine to query, e.g. a read replica's; defaults to the primary's engine.
+
+        Returns:
+            A dict of the row's fields (as declared in the table model), or None if there is no such row.
+        """
+        table = self.table_model.__table__
+        with (engine or self.engine).connect() as connection:
+            row = connection.execute(select(table).where(table.c.id == id).limit(1)).mappings().first()
+        return dict(row) if row else None
+
+    @traced()
+    async def get_record_async(self, id):
+        """
+        Async version of get_record(), on the async engine (see init_async()).
+
+        Args:
+            id(str): The session_id to look up.
+
+        Returns:
+            A dict of the row's fields (as declared in the table model), or None if there is no such row.
+        """
+        table = self.table_model.__table__
+        async with self.async_engine.connect() as connection:
+            row = (await connection.execute(select(table).where(table.c.id == id).limit(1))).mappings().first()
+        return dict(row) if row else None
+
+    def iter_records(self, columns=None, batch_size=1000, engine=None):
+        """
+        Iterate over all rows (oldest first) as dicts with a Core SELECT, fetching them from the database in batches so that
+        memory use stays flat regardless of the table size.
+
+        Args:
+            columns(list): (Optional) The fields to return; all fields in the table model are returned if not specified.
+            batch_size(int): (Optional, default=1000) The number of rows fetched from the database at a time.
+            engine: (Optional) The SQLAlchemy engine to query, e.g. a read replica's; defaults to the primary's engine.
+
+        Returns:
+            A generator of dicts.
+        """
+        table = self.table_model.__table__
+        selected_columns = [table.c[column] for column in columns] if columns else list(table.c)
+        with (engine or self.engine).connect() as connection:
+            result = connection.execution_options(yield_per=batch_size).execute(select(*selected_columns).order_by(table.c.timestamp))
+            for row in result.mappings():
+                yield dict(row)
+
+    def query_updated_since(self, since=None):
+        """
+        Return the rows written at or after a point in time, using the index on 'written_at' (or on 'timestamp' if the table
+        has no 'written_at' column). Used to incrementally sync the analytics replica. 'written_at' is set by the database on
+        every write, so rows written with an older 'timestamp' (bulk uploads, replayed spooled submissions) are included too.
+
+        Args:
+            since(datetime): (Optional) The point in time, by the database's clock; all rows are returned if not specified.
+
+        Returns:
+            A Pandas DataFrame object containing query results.
+        """
+        table = self.table_model.__table__
+        changes_query = select(table)
+        if since:
+            order_column = table.c[WRITTEN_AT_FIELD] if WRITTEN_AT_FIELD in table.c else table.c.timestamp
+            changes_query = changes_query.where(order_column >= since)
+        return pd.read_sql(changes_query, con=self.engine)
+
+    def archive_rows_older_than(self, archive, cutoff, batch_size=5000):
+        """
+        Move rows with a 'timestamp' before a cutoff into an archive, in batches: each batch is read in 'id' order, written to
+        the archive and only then deleted. Rows that are updated while being archived get a new 'timestamp' and are therefore
+        kept, and their fresher copy takes precedence over the archived one when both are read.
+
+        Args:
+            archive(ParquetArchive): The archive to move rows into.
+            cutoff(datetime): Rows with a 'timestamp' before this point in time are archived.
+            batch_size(int): (Optional, default=5000) The number of rows moved per batch.
+
+        Returns:
+            The number of rows archived.
+        """
+        table = self.table_model.__table__
+        last_id, archived_rows = None, 0
+        while True:
+            batch_query = select(table).where(table.c.timestamp < cutoff).order_by(table.c.id).limit(batch_size)
+            if last_id is not None:
+                batch_query = batch_query.where(table.c.id > last_id)
+            batch_df = pd.read_sql(batch_query, con=self.engine)
+            if batch_df.empty:
+                break
+            archive.write(batch_df)
+            with self.engine.begin() as connection:
+                connection.execute(table.delete().where(table.c.id.in_(batch_df['id'].to_list()), table.c.timestamp < cutoff))
+            last_id = batch_df['id'].iloc[-1]
+            archived_rows += len(batch_df)
+        self.logger.info(f"Archived {archived_rows} row(s) older than {cutoff} from {self.table_name}")
+        return archived_rows
+
+    @traced()
+    def query_aggregated_data(self, group_by_field='timestamp', aggregation_function='count', aggregation_field='id', field_options=None, start_time=None, end_time=None, engine=None):
         """
         Helper function to perform aggregation queries against the MySQL database associated with this Datastore instance. Used primarily for
         reporting and visualization purposes.
@@ -243,6 +740,12 @@ class MySQLDatastore:
                     }
                 ```
                 target_type must be one of ['date','']
+            start_time(datetime): (Optional) Only aggregate rows with a 'timestamp' at or after this point in time.
+            end_time(datetime): (Optional) Only aggregate rows with a 'timestamp' before this point in time.
+
+                Time bounds are applied to the raw 'timestamp' column (never to a CAST of it), so that they can use its index
+                and, on partitioned tables, prune partitions that lie outside the bounds.
+            engine: (Optional) The SQLAlchemy engine to query, e.g. a read replica's; defaults to the primary's engine.
         Returns:
             A Pandas DataFrame object containing aggregated query results.
         """
@@ -269,7 +772,8 @@ class MySQLDatastore:
             return pd.DataFrame()
 
         # Perform the aggregation query against the table
-        with Session(self.engine) as session:
+        engine = engine or self.engine
+        with Session(engine) as session:
             if field_options:
                 # Handle any field options eg. CASTs
                 if 'CAST' in field_options:
@@ -280,8 +784,8 @@ class MySQLDatastore:
                         return pd.DataFrame()
                     else:
                         if target_type == 'date':
-                            group_by_field = cast(getattr(self.table_model, group_by_field), Date) if target_field == group_by_field else getattr(self.table_model, group_by_field)
-                            aggregation_field = cast(getattr(self.table_model, aggregation_field), Date) if target_field == aggregation_field else getattr(self.table_model, aggregation_field)
+                            group_by_field = self.cast_to_date(getattr(self.table_model, group_by_field)) if target_field == group_by_field else getattr(self.table_model, group_by_field)
+                            aggregation_field = self.cast_to_date(getattr(self.table_model, aggregation_field)) if target_field == aggregation_field else getattr(self.table_model, aggregation_field)
                         elif target_type == 'int':
                             group_by_field = cast(getattr(self.table_model, group_by_field), Integer) if target_field == group_by_field else getattr(self.table_model, group_by_field)
                             aggregation_field = cast(getattr(self.table_model, aggregation_field), Integer) if target_field == aggregation_field else getattr(self.table_model, aggregation_field)
@@ -294,7 +798,11 @@ class MySQLDatastore:
                 group_by_field.label("grouping"), 
                 aggregation_function(aggregation_field).label("aggregation")
             ).group_by(group_by_field)                            
-            df = pd.read_sql(aggregation_query.statement, con=self.engine)
+            if start_time:
+                aggregation_query = aggregation_query.filter(self.table_model.timestamp >= start_time)
+            if end_time:
+                aggregation_query = aggregation_query.filter(self.table_model.timestamp < end_time)
+            df = pd.read_sql(aggregation_query.statement, con=engine)
             # Drop SQLAlchemy-specific metadata
             if '_sa_instance_state' in df.columns:
                 df = df.drop(columns=["_sa_instance_state"])
@@ -0,0 +1,316 @@
+from datetime import datetime, timedelta
+from threading import Lock
+from sqlalchemy import select, update, delete, text, inspect
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.exc import OperationalError
+import pandas as pd
+
+from datamodels.mysql import MySQLDatastore, WRITTEN_AT_FIELD
+from datamodels.schema_migrations import OnlineSchemaMigrator
+from loggers.tracing import traced
+
+# MySQL error code for a transaction that was rolled back to resolve a deadlock; such transactions are safe to retry.
+DEADLOCK_ERROR_CODE = 1213
+
+def month_start(timestamp, months_ahead=0):
+    """
+    Return midnight on the first day of the month containing a timestamp, optionally shifted by a number of months.
+
+    Args:
+        timestamp(datetime): Any point in time.
+        months_ahead(int): (Optional, default=0) The number of months to shift by; may be negative.
+
+    Returns:
+        A datetime at the start of the target month.
+    """
+    month_index = timestamp.year * 12 + (timestamp.month - 1) + months_ahead
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+class PartitionedMySQLDatastore(MySQLDatastore):
+    """
+    A MySQLDatastore whose submissions table is RANGE-partitioned by month on 'timestamp'. Time-bounded queries only scan the
+    partitions they need (partition pruning), and old data can be removed by dropping whole partitions instead of running
+    large row-by-row DELETEs.
+
+    MySQL requires every unique key of a partitioned table to include the partitioning column, so the primary key becomes
+    ('id', 'timestamp') and a session_id can no longer be UPSERTed with ON DUPLICATE KEY UPDATE. Instead, UPSERTs lock the
+    'id' with a locking read (which also blocks concurrent INSERTs of the same 'id') and then UPDATE or INSERT the row.
+
+    Partitioning is opt-in under the 'mysql_partitioning' key of the datastore_params config. For example:
+
+        datastore_params:
+            mysql_partitioning:
+                enabled: true
+                future_partitions: 3   # Monthly partitions kept ready ahead of the current month
+                retention_months: 24   # (Optional) Drop partitions whose data is older than this many months
+
+    An existing, unpartitioned table is converted on startup using a shadow-table copy (see OnlineSchemaMigrator).
+
+    Attributes:
+        future_partitions(int): The number of monthly partitions kept ready ahead of the current month.
+        retention_months(int): If set, partitions older than this many months are dropped during maintenance.
+        partition_migrator(OnlineSchemaMigrator): Used to convert an unpartitioned table with a shadow-table copy.
+        qualified_table_name(str): The quoted, schema-qualified table name used in partition maintenance DDL.
+        next_maintenance_time(datetime): The time after which the next UPSERT triggers partition maintenance.
+    """
+    timestamp_in_primary_key = True
+
+    def __init__(self, app, config):
+        """
+        Initialize the MySQL datastore, then ensure the table is partitioned and that future partitions exist.
+
+        Args:
+            app(Flask): The Flask app implementing this Datastore instance.
+            config(dict): The full contents of the config.yaml configuration file
+        Returns:
+            None
+        """
+        partitioning_options = config['datastore']['datastore_params'].get('mysql_partitioning', {})
+        self.future_partitions = partitioning_options.get('future_partitions', 3)
+        self.retention_months = partitioning_options.get('retention_months')
+        self.maintenance_lock = Lock()
+        super().__init__(app, config)
+        self.partition_migrator = self.schema_migrator or OnlineSchemaMigrator(self.engine, self.table_model, table_schema=self.table_schema)
+        self.qualified_table_name = self.partition_migrator.qualified_name(self.table_model.__table__.name)
+        self.ensure_partitioned()
+        self.maintain_partitions()
+
+    def after_fork(self):
+        """Reset the inherited connection pool and maintenance lock in a forked child process."""
+        super().after_fork()
+        self.maintenance_lock = Lock()
+
+    def init_async(self):
+        """Not supported: UPSERTs into the partitioned table take a locking read first (see upsert_data()), which is only implemented for the sync engine."""
+        raise NotImplementedError("the partitioned MySQL datastore has no async UPSERT")
+
+    def get_partitions(self):
+        """
+        Return the partitions of the table, as reported by information_schema.
+
+        Returns:
+            A list of (partition name, partition upper bound) tuples in partition order, where the upper bound is a datetime
+            (or None for the catch-all MAXVALUE partition). An empty list means the table is not partitioned.
+        """
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                text("SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+                     "WHERE TABLE_SCHEMA = :table_schema AND TABLE_NAME = :table_name AND PARTITION_NAME IS NOT NULL "
+                     "ORDER BY PARTITION_ORDINAL_POSITION"),
+                {'table_schema': self.table_schema, 'table_name': self.table_model.__table__.name}
+            ).all()
+        partitions = []
+        for name, _ in rows:
+            upper_bound = None
+            if name.startswith('p') and name[1:].isdigit():
+                upper_bound = month_start(datetime.strptime(name[1:], '%Y%m'), months_ahead=1)
+            partitions.append((name, upper_bound))
+        return partitions
+
+    def render_partition_definitions(self, first_month, last_month):
+        """
+        Render monthly partition definitions (plus a catch-all MAXVALUE partition) covering a range of months.
+
+        Args:
+            first_month(datetime): The start of the first month to create a partition for.
+            last_month(datetime): The start of the last month to create a partition for.
+
+        Returns:
+            A comma-separated string of PARTITION definitions.
+        """
+        definitions = []
+        current_month = first_month
+        while current_month <= last_month:
+            upper_bound = month_start(current_month, months_ahead=1)
+            definitions.append(f"PARTITION p{current_month:%Y%m} VALUES LESS THAN (TO_DAYS('{upper_bound:%Y-%m-%d}'))")
+            current_month = upper_bound
+        definitions.append("PARTITION pfuture VALUES LESS THAN MAXVALUE")
+        return ', '.join(definitions)
+
+    def ensure_partitioned(self):
+        """
+        Convert the table into a monthly RANGE-partitioned table if it is not partitioned yet. The conversion changes the
+        primary key to ('id', 'timestamp') and is applied with a shadow-table copy, so that submissions are not blocked.
+        In dry-run mode (see OnlineSchemaMigrator) the planned conversion is only reported. A table that does not exist yet
+        (the auto-migration is skipped in dry-run mode) is left alone; it is converted on the first startup after it exists.
+
+        Returns:
+            None
+        """
+        if self.get_partitions():
+            return
+        table = self.table_model.__table__
+        if not inspect(self.engine).has_table(table.name, schema=self.table_schema):
+            self.logger.warning(f"Table '{table.name}' does not exist yet; skipping the conversion to monthly RANGE partitions.")
+            return
+        with self.engine.connect() as connection:
+            oldest_timestamp = connection.execute(text(f"SELECT MIN(timestamp) FROM {self.qualified_table_name}")).scalar()
+            primary_key = connection.execute(
+                text("SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE WHERE TABLE_SCHEMA = :table_schema "
+                     "AND TABLE_NAME = :table_name AND CONSTRAINT_NAME = 'PRIMARY' ORDER BY ORDINAL_POSITION"),
+                {'table_schema': self.table_schema, 'table_name': table.name}
+            ).scalars().all()
+        now = datetime.now()
+        first_month = month_start(min(oldest_timestamp or now, now))
+        partition_definitions = self.render_partition_definitions(first_month, month_start(now, months_ahead=self.future_partitions))
+        clauses = [] if primary_key == ['id', 'timestamp'] else ["DROP PRIMARY KEY", "ADD PRIMARY KEY (id, timestamp)"]
+        table_options = f"PARTITION BY RANGE (TO_DAYS(timestamp)) ({partition_definitions})"
+        if self.partition_migrator.dry_run:
+            self.logger.warning(f"Table '{table.name}' is not partitioned (DRY RUN - nothing will be applied). Planned shadow-table copy:")
+            for clause in clauses:
+                self.logger.warning(f"  {clause}")
+            self.logger.warning(f"  {table_options}")
+            return
+        self.logger.warning(f"Table '{table.name}' is not partitioned; converting it to monthly RANGE partitions from {first_month:%Y-%m} onwards.")
+        self.partition_migrator.shadow_copy(clauses, table_options=table_options)
+
+    def maintain_partitions(self):
+        """
+        Create monthly partitions ahead of time (by splitting the empty catch-all partition) and, if a retention period is
+        configured, drop partitions that have aged out. Safe to call at any time; does nothing if no work is due, or in
+        dry-run mode (see OnlineSchemaMigrator).
+
+        Returns:
+            None
+        """
+        with self.maintenance_lock:
+            now = datetime.now()
+            self.next_maintenance_time = now + timedelta(days=1)
+            if self.partition_migrator.dry_run:
+                self.logger.info(f"Partition maintenance for '{self.table_name}' skipped (DRY RUN).")
+                return
+            monthly_upper_bounds = [upper_bound for _, upper_bound in self.get_partitions() if upper_bound]
+            last_month = month_start(now, months_ahead=self.future_partitions)
+            if monthly_upper_bounds and monthly_upper_bounds[-1] <= last_month:
+                partition_definitions = self.render_partition_definitions(monthly_upper_bounds[-1], last_month)
+                try:
+                    with self.engine.begin() as connection:
+                        connection.execute(text(
+                            f"ALTER TABLE {self.qualified_table_name} "
+                            f"REORGANIZE PARTITION pfuture INTO ({partition_definitions})"
+                        ))
+                    self.logger.info(f"Created monthly partitions up to {last_month:%Y-%m} for '{self.table_name}'.")
+                except OperationalError as e:
+                    # Another worker may have created the same partitions concurrently
+                    self.logger.warning(f"Could not create future partitions ({e.orig}); they will be retried at the next maintenance.")
+            if self.retention_months:
+                self.drop_partitions_before(month_start(now, months_ahead=-self.retention_months))
+
+    def drop_partitions_before(self, cutoff):
+        """
+        Drop every monthly partition whose data lies entirely before a cutoff. This is a metadata operation that removes
+        whole months of data at once, instead of a row-by-row DELETE.
+
+        Args:
+            cutoff(datetime): Partitions whose upper bound is at or before this point in time are dropped.
+
+        Returns:
+            A list of the names of the dropped partitions.
+        """
+        expired_partitions = [name for name, upper_bound in self.get_partitions() if upper_bound and upper_bound <= cutoff]
+        if expired_partitions:
+            with self.engine.begin() as connection:
+                connection.execute(text(
+                    f"ALTER TABLE {self.qualified_table_name} "
+                    f"DROP PARTITION {', '.join(expired_partitions)}"
+                ))
+            self.logger.warning(f"Dropped {len(expired_partitions)} partition(s) of '{self.table_name}' older than {cutoff:%Y-%m-%d}: {expired_partitions}")
+        return expired_partitions
+
+    @traced()
+    def upsert_data(self, submission_data, only_if_newer=False):
+        """
+        Perform an UPSERT against the partitioned table: lock the submission's 'id' with a locking read, then UPDATE the
+        existing row (moving it to a different partition if its 'timestamp' changes) or INSERT a new one. Transactions
+        rolled back to resolve a deadlock between two concurrent UPSERTs of the same 'id' are retried once.
+
+        Args:
+            submission_data(dict): A JSON-equivalent dict containing form submission information.
+            only_if_newer(bool): (Optional, default=False) See MySQLDatastore.upsert_data().
+
+        Returns:
+            None
+        """
+        if datetime.now() >= self.next_maintenance_time:
+            self.maintain_partitions()
+        table = self.table_model.__table__
+        if WRITTEN_AT_FIELD in table.c:
+            submission_data = {**submission_data, WRITTEN_AT_FIELD: self.write_time_expression()}
+        for attempt in range(2):
+            try:
+                with self.engine.begin() as connection:
+                    existing_row = connection.execute(
+                        select(table.c.id).where(table.c.id == submission_data['id']).with_for_update()
+                    ).first()
+                    if existing_row:
+                        update_statement = update(table).where(table.c.id == submission_data['id'])
+                        if only_if_newer:
+                            update_statement = update_statement.where(table.c.timestamp < submission_data['timestamp'])
+                        connection.execute(update_statement.values(**submission_data))
+                    else:
+                        connection.execute(insert(table).values(**submission_data))
+                break
+            except OperationalError as e:
+                if attempt or e.orig is None or e.orig.args[0] != DEADLOCK_ERROR_CODE:
+                    raise
+                self.logger.warning(f"Deadlock while upserting id '{submission_data['id']}'; retrying.")
+        self.logger.info(f"Upserted row '{submission_data['id']}' into {self.table_name}")
+        self.logger.debug("Upserted submission data: %s", submission_data)
+
+    @traced()
+    def upsert_bulk_data(self, bulk_upload_data):
+        """
+        Perform a bulk UPSERT against the partitioned table by replacing any existing rows with the uploaded ones. Existing
+        rows are locked and deleted, and all uploaded rows are inserted, in a single transaction.
+
+        Args:
+            bulk_upload_data(pd.DataFrame): A Pandas DataFrame that contains several instances (rows) of form submission data.
+
+        Returns:
+            None
+        """
+        num_rows = len(bulk_upload_data)
+        rows = self.prepare_bulk_upload_data(bulk_upload_data)
+        table = self.table_model.__table__
+        ids = [row['id'] for row in rows]
+        with self.engine.begin() as connection:
+            for chunk_start in range(0, len(ids), 1000):
+                chunk_ids = ids[chunk_start:chunk_start + 1000]
+                connection.execute(select(table.c.id).where(table.c.id.in_(chunk_ids)).with_for_update()).all()
+                connection.execute(delete(table).where(table.c.id.in_(chunk_ids)))
+            insert_statement = insert(table)
+            if WRITTEN_AT_FIELD in table.c:
+                insert_statement = insert_statement.values({WRITTEN_AT_FIELD: self.write_time_expression()})
+            connection.execute(insert_statement, rows)
+        self.logger.info(f"Bulk-upserted {num_rows} row(s) into {self.table_name}")
+
+    def archive_rows_older_than(self, archive, cutoff, batch_size=5000):
+        """
+        Move whole months of rows before a cutoff into an archive: the cutoff is rounded down to the start of its month, the
+        rows of every partition before it are written to the archive in batches, and the partitions are then dropped instead
+        of deleting their rows one by one.
+
+        Args:
+            archive(ParquetArchive): The archive to move rows into.
+            cutoff(datetime): Rows before the start of this point in time's month are archived.
+            batch_size(int): (Optional, default=5000) The number of rows read per batch.
+
+        Returns:
+            The number of rows archived.
+        """
+        cutoff = month_start(cutoff)
+        table = self.table_model.__table__
+        last_id, archived_rows = None, 0
+        while True:
+            batch_query = select(table).where(table.c.timestamp < cutoff).order_by(table.c.id).limit(batch_size)
+            if last_id is not None:
+                batch_query = batch_query.where(table.c.id > last_id)
+            batch_df = pd.read_sql(batch_query, con=self.engine)
+            if batch_df.empty:
+                break
+            archive.write(batch_df)
+            last_id = batch_df['id'].iloc[-1]
+            archived_rows += len(batch_df)
+        self.drop_partitions_before(cutoff)
+        self.logger.info(f"Archived {archived_rows} row(s) older than {cutoff} from {self.table_name}")
+        return archived_rows
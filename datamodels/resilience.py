@@ -0,0 +1,505 @@
+import glob
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import datetime
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+
+from loggers.managers import LoggerManager
+from loggers.tracing import traced
+
+# Errors raised when the database cannot be reached or does not respond in time, which a later retry may get past. Any other
+# error (e.g. an IntegrityError, or a value that does not fit its column) would fail again on every retry.
+RETRYABLE_ERRORS = (OperationalError, InterfaceError, DisconnectionError, PoolTimeoutError, ConnectionError, TimeoutError)
+
+class CircuitBreaker:
+    """
+    A circuit breaker for datastore writes. While 'closed', calls go through and consecutive failures and slow calls are
+    counted; once either count reaches its threshold the breaker 'opens' and calls are refused, so that requests stop waiting
+    on a database that is down or stalled. After a cool-down the breaker is 'half_open' and lets a single trial call through:
+    its success closes the breaker again, and its failure re-opens it.
+
+    Attributes:
+        failure_threshold(int): Consecutive failed calls that open the breaker.
+        slow_call_seconds(float): Calls taking longer than this count as slow.
+        slow_call_threshold(int): Consecutive slow calls that open the breaker.
+        open_seconds(float): How long the breaker stays open before allowing a trial call.
+        state(str): One of 'closed', 'open' or 'half_open'.
+        stats(dict): Counters of failures, slow calls and times the breaker opened.
+
+    Usage:
+        >>> breaker = CircuitBreaker(failure_threshold=5, slow_call_seconds=2, slow_call_threshold=5, open_seconds=30)
+        >>> if breaker.allow_request():
+        ...     start_time = time.monotonic()
+        ...     datastore.upsert_data(submission_data) # On an exception, call breaker.record_failure() instead
+        ...     breaker.record_success(time.monotonic() - start_time)
+    """
+    def __init__(self, failure_threshold=5, slow_call_seconds=2.0, slow_call_threshold=5, open_seconds=30):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_threshold = slow_call_threshold
+        self.open_seconds = open_seconds
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.consecutive_slow_calls = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+        self.lock = threading.Lock()
+        self.logger = LoggerManager.get_logger()
+        self.stats = {'failures': 0, 'slow_calls': 0, 'times_opened': 0}
+
+    def allow_request(self):
+        """
+        Check whether a call may go through now; in the 'half_open' state, only one caller at a time is allowed.
+
+        Returns:
+            True if the call may proceed.
+        """
+        with self.lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = 'half_open'
+            if self.state == 'closed':
+                return True
+            if self.state == 'half_open' and not self.trial_in_progress:
+                self.trial_in_progress = True
+                return True
+            return False
+
+    def record_success(self, duration_seconds):
+        """
+        Record a completed call; a slow call counts towards opening the breaker.
+
+        Args:
+            duration_seconds(float): How long the call took.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.trial_in_progress = False
+            self.consecutive_failures = 0
+            if duration_seconds > self.slow_call_seconds:
+                self.stats['slow_calls'] += 1
+                self.consecutive_slow_calls += 1
+                if self.state == 'half_open' or self.consecutive_slow_calls >= self.slow_call_threshold:
+                    self.open(f"{self.consecutive_slow_calls} consecutive slow call(s) ({duration_seconds:.2f}s)")
+                return
+            self.consecutive_slow_calls = 0
+            if self.state != 'closed':
+                self.logger.info("Datastore write circuit breaker closed; writes go to the database again.")
+            self.state = 'closed'
+
+    def record_failure(self):
+        """Record a failed call."""
+        with self.lock:
+            self.trial_in_progress = False
+            self.stats['failures'] += 1
+            self.consecutive_failures += 1
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                self.open(f"{self.consecutive_failures} consecutive failure(s)")
+
+    def open(self, reason):
+        """Open the breaker. Must be called with the lock held."""
+        if self.state != 'open':
+            self.stats['times_opened'] += 1
+            self.logger.warning(f"Datastore write circuit breaker opened after {reason}; writes will be spooled.")
+        self.state = 'open'
+        self.opened_at = time.monotonic()
+
+class WriteSpool:
+    """
+    A durable, append-only spool of submissions that could not be written to the datastore. Each process appends to its own
+    JSON Lines file (spool-<pid>.jsonl), and every append is fsync'd before it is acknowledged, so a spooled submission
+    survives a crash. Replay progress is tracked as a byte offset into the file and persisted next to it (spool-<pid>.offset);
+    the file is truncated once fully replayed. Submissions that can never be written are moved to a dead-letter file
+    (dead-letter-<pid>.jsonl) together with their error, so that they do not block the submissions spooled after them.
+
+    Spool files left behind by processes that are no longer running (e.g. after a restart) are claimed and replayed too.
+
+    Attributes:
+        spool_folder(str): The folder containing the spool files.
+        spool_path(str): The path of this process's spool file.
+        dead_letter_path(str): The path of this process's dead-letter file.
+        stats(dict): Counters of spooled, replayed and dead-lettered submissions.
+    """
+    def __init__(self, spool_folder='spool'):
+        self.spool_folder = spool_folder
+        os.makedirs(self.spool_folder, exist_ok=True)
+        self.lock = threading.RLock()
+        self.logger = LoggerManager.get_logger()
+        self.stats = {'spooled': 0, 'replayed': 0, 'dead_lettered': 0}
+        self.open_own_spool()
+
+    def open_own_spool(self):
+        """(Re)point the spool at this process's files; called on startup and after a fork."""
+        self.pid = os.getpid()
+        self.spool_path = os.path.join(self.spool_folder, f"spool-{self.pid}.jsonl")
+        self.dead_letter_path = os.path.join(self.spool_folder, f"dead-letter-{self.pid}.jsonl")
+
+    def after_fork(self):
+        """Point a forked child process at its own spool file, with a new lock and counters."""
+        self.lock = threading.RLock()
+        self.stats = {'spooled': 0, 'replayed': 0, 'dead_lettered': 0}
+        self.open_own_spool()
+
+    def append(self, submission_data):
+        """
+        Durably append a submission to this process's spool file.
+
+        Args:
+            submission_data(dict): A JSON-equivalent dict containing form submission information.
+
+        Returns:
+            The number of bytes appended.
+        """
+        line = (json.dumps(submission_data, default=str) + '\n').encode('utf-8')
+        with self.lock:
+            with open(self.spool_path, 'ab') as spool_file:
+                spool_file.write(line)
+                spool_file.flush()
+                os.fsync(spool_file.fileno())
+            self.stats['spooled'] += 1
+        return len(line)
+
+    def dead_letter(self, submission_data, error):
+        """
+        Durably append a submission that can never be written, and the error it failed with, to this process's dead-letter
+        file, for an operator to inspect and correct.
+
+        Args:
+            submission_data(dict): A JSON-equivalent dict containing form submission information.
+            error(Exception): The error the write failed with.
+
+        Returns:
+            None
+        """
+        line = json.dumps({
+            'dead_lettered_at': datetime.now(),
+            'error': f"{type(error).__name__}: {error}",
+            'submission': submission_data,
+        }, default=str) + '\n'
+        with self.lock:
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as dead_letter_file:
+                dead_letter_file.write(line)
+                dead_letter_file.flush()
+                os.fsync(dead_letter_file.fileno())
+            self.stats['dead_lettered'] += 1
+        self.logger.error(f"Submission '{submission_data.get('id')}' can not be written ({error}); moved it to '{self.dead_letter_path}'.")
+
+    def replayable_paths(self):
+        """
+        Return the spool files this process should replay: its own, and those of processes that are no longer running, which
+        are first claimed by renaming them (so that only one live process replays each of them).
+
+        Returns:
+            A list of file paths.
+        """
+        spool_paths = []
+        for spool_path in glob.glob(os.path.join(self.spool_folder, 'spool-*.jsonl')) + glob.glob(os.path.join(self.spool_folder, 'claimed-*.jsonl')):
+            # Files are named spool-<pid>.jsonl or claimed-<pid>-<token>.jsonl, where <pid> is the owning process
+            owner_pid = int(os.path.basename(spool_path)[:-len('.jsonl')].split('-')[1])
+            if owner_pid == self.pid:
+                spool_paths.append(spool_path)
+            elif not process_is_running(owner_pid):
+                claimed_path = self.claim(spool_path)
+                if claimed_path:
+                    spool_paths.append(claimed_path)
+        return sorted(spool_paths, key=os.path.getmtime)
+
+    def claim(self, spool_path):
+        """
+        Take over the spool file of a process that is no longer running.
+
+        Args:
+            spool_path(str): The spool file to claim.
+
+        Returns:
+            The new path of the claimed file, or None if another process claimed it first.
+        """
+        claimed_path = os.path.join(self.spool_folder, f"claimed-{self.pid}-{secrets.token_hex(4)}.jsonl")
+        try:
+            os.rename(spool_path, claimed_path)
+        except FileNotFoundError:
+            return None
+        offset_path = spool_path[:-len('.jsonl')] + '.offset'
+        if os.path.exists(offset_path):
+            os.replace(offset_path, claimed_path[:-len('.jsonl')] + '.offset')
+        self.logger.info(f"Claimed spool file '{spool_path}' of a process that is no longer running.")
+        return claimed_path
+
+    def read_offset(self, spool_path):
+        """Return the replay offset (in bytes) of a spool file."""
+        offset_path = spool_path[:-len('.jsonl')] + '.offset'
+        if not os.path.exists(offset_path):
+            return 0
+        with open(offset_path, 'r') as offset_file:
+            return int(offset_file.read() or 0)
+
+    def write_offset(self, spool_path, offset):
+        """Persist the replay offset (in bytes) of a spool file."""
+        offset_path = spool_path[:-len('.jsonl')] + '.offset'
+        with open(offset_path + '.tmp', 'w') as offset_file:
+            offset_file.write(str(offset))
+        os.replace(offset_path + '.tmp', offset_path)
+
+    def pending_bytes(self):
+        """
+        Return the number of spooled bytes that have not been replayed yet. Lists the replayable files, so it claims the files
+        of processes that are no longer running (see replayable_paths()).
+        """
+        return sum(max(os.path.getsize(spool_path) - self.read_offset(spool_path), 0) for spool_path in self.replayable_paths())
+
+    def replay(self, write_function, batch_size=500):
+        """
+        Replay spooled submissions, oldest first, until a write fails with a retryable error (see RETRYABLE_ERRORS) or a batch
+        of submissions has been replayed. A submission whose write fails with any other error is dead-lettered (see
+        dead_letter()) and the replay moves on. Fully replayed files are truncated (this process's file) or deleted (adopted
+        files).
+
+        Args:
+            write_function(callable): Called with each submission; raises if it could not be written.
+            batch_size(int): (Optional, default=500) The maximum number of submissions replayed per call.
+
+        Returns:
+            The number of submissions replayed.
+        """
+        replayed_count = 0
+        for spool_path in self.replayable_paths():
+            offset = self.read_offset(spool_path)
+            with open(spool_path, 'r', encoding='utf-8') as spool_file:
+                spool_file.seek(offset)
+                try:
+                    while replayed_count < batch_size:
+                        line = spool_file.readline()
+                        if not line.endswith('\n'):
+                            break # End of file, or a partially written line that is still being appended
+                        submission_data = json.loads(line)
+                        submission_data['timestamp'] = datetime.fromisoformat(submission_data['timestamp'])
+                        try:
+                            write_function(submission_data)
+                            self.stats['replayed'] += 1
+                        except RETRYABLE_ERRORS:
+                            raise
+                        except Exception as e:
+                            self.dead_letter(submission_data, e)
+                        offset = spool_file.tell()
+                        replayed_count += 1
+                finally:
+                    self.write_offset(spool_path, offset)
+            with self.lock:
+                if offset >= os.path.getsize(spool_path):
+                    # Fully replayed, and no appends can happen while the lock is held
+                    if spool_path == self.spool_path:
+                        open(spool_path, 'w').close()
+                    else:
+                        os.remove(spool_path)
+                    os.remove(spool_path[:-len('.jsonl')] + '.offset')
+            if replayed_count >= batch_size:
+                break
+        return replayed_count
+
+def process_is_running(pid):
+    """
+    Check whether a process with a given pid is running.
+
+    Args:
+        pid(int): The process id.
+
+    Returns:
+        True if the process exists.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class ResilientWriter:
+    """
+    Guards datastore writes with a CircuitBreaker and a WriteSpool, so that a slow or unavailable database never blocks
+    form submissions: while the breaker is open (or earlier submissions are still spooled, to preserve their order),
+    submissions are spooled instead of written, and a background replayer drains the spool into the datastore with UPSERT
+    semantics once it recovers. Replayed submissions only overwrite rows with an older 'timestamp', so that a replay never
+    overwrites a newer write of the same session_id, including one made directly by another process.
+
+    Only retryable errors (see RETRYABLE_ERRORS) are spooled and retried. A write that fails with any other error (e.g. an
+    IntegrityError) would fail on every retry: it is raised to the caller, and if it was already spooled, it is moved to the
+    spool's dead-letter file when replayed.
+
+    Configured under the 'write_resilience' key of the datastore config. For example:
+
+        datastore:
+            write_resilience:
+                spool_folder: spool           # Folder for the spool files
+                failure_threshold: 5          # Consecutive failed writes that open the breaker
+                slow_call_seconds: 2.0        # Writes slower than this count as slow
+                slow_call_threshold: 5        # Consecutive slow writes that open the breaker
+                open_seconds: 30              # How long the breaker stays open before a trial write
+                replay_interval_seconds: 5    # How often the replayer checks the spool
+                replay_batch_size: 500        # Submissions replayed per check
+                spool_scan_interval_seconds: 60  # How often the replayer looks for spool files of exited processes
+
+    Note that a write already in progress cannot be interrupted; pair the breaker with driver-level connect/read timeouts
+    (e.g. via 'mysql_sqlalchemy_engine_options') to bound how long the first slow writes can block.
+
+    Only the replayer thread scans the spool folder (which may claim the files of exited processes); writes and monitoring
+    reads use its cached backlog state.
+
+    Attributes:
+        datastore: The datastore written to; must implement upsert_data().
+        breaker(CircuitBreaker): The circuit breaker guarding writes.
+        spool(WriteSpool): The spool for submissions that could not be written.
+        backlog(bool): Whether spooled submissions are waiting to be replayed.
+        spool_pending_bytes(int): The number of spooled bytes not replayed yet, as of the replayer's last scan and the
+                                  submissions spooled since.
+    """
+    def __init__(self, datastore, resilience_options):
+        self.datastore = datastore
+        self.logger = LoggerManager.get_logger()
+        self.breaker = CircuitBreaker(
+            failure_threshold=resilience_options.get('failure_threshold', 5),
+            slow_call_seconds=resilience_options.get('slow_call_seconds', 2.0),
+            slow_call_threshold=resilience_options.get('slow_call_threshold', 5),
+            open_seconds=resilience_options.get('open_seconds', 30)
+        )
+        self.spool = WriteSpool(resilience_options.get('spool_folder', 'spool'))
+        self.replay_interval_seconds = resilience_options.get('replay_interval_seconds', 5)
+        self.replay_batch_size = resilience_options.get('replay_batch_size', 500)
+        self.spool_scan_interval_seconds = resilience_options.get('spool_scan_interval_seconds', 60)
+        self.replay_lock = threading.Lock()
+        self.backlog = False
+        self.spool_pending_bytes = 0
+        self.start_replayer()
+
+    def start_replayer(self):
+        """Start the background replayer thread; also called in a forked child, where threads do not survive the fork."""
+        self.stop_event = threading.Event()
+        self.replayer_thread = threading.Thread(target=self.run_replay_loop, name='spool-replayer', daemon=True)
+        self.replayer_thread.start()
+
+    def after_fork(self):
+        """
+        Reset the state inherited from the parent in a forked child process: the child spools to its own file (the parent
+        keeps replaying its own), with new locks and its own replayer thread.
+        """
+        self.breaker.lock = threading.Lock()
+        self.spool.after_fork()
+        self.replay_lock = threading.Lock()
+        self.backlog = False
+        self.spool_pending_bytes = 0
+        self.start_replayer()
+
+    @traced('resilient_write')
+    def write(self, submission_data):
+        """
+        Write a submission to the datastore, or spool it if the breaker is open, the write fails with a retryable error or
+        there is a backlog.
+
+        Args:
+            submission_data(dict): A JSON-equivalent dict containing form submission information.
+
+        Returns:
+            True if the submission was written to the datastore, False if it was spooled.
+        """
+        if self.backlog or not self.breaker.allow_request():
+            self.spool_submission(submission_data)
+            return False
+        start_time = time.monotonic()
+        try:
+            self.datastore.upsert_data(submission_data)
+        except RETRYABLE_ERRORS as e:
+            self.breaker.record_failure()
+            self.logger.error(f"Writing submission '{submission_data.get('id')}' failed ({e}); spooling it for replay.")
+            self.spool_submission(submission_data)
+            return False
+        except Exception:
+            # The database answered, so the breaker counts the call as completed
+            self.breaker.record_success(time.monotonic() - start_time)
+            raise
+        self.breaker.record_success(time.monotonic() - start_time)
+        return True
+
+    def spool_submission(self, submission_data):
+        """Spool a submission and flag the backlog, atomically with respect to the replayer's backlog check."""
+        with self.spool.lock:
+            self.spool_pending_bytes += self.spool.append(submission_data)
+            self.backlog = True
+
+    def replay_write(self, submission_data):
+        """
+        Write one spooled submission through the breaker, unless the stored row is newer; raises if the breaker refuses it or
+        the write fails.
+        """
+        if not self.breaker.allow_request():
+            raise ConnectionError("The circuit breaker is open.")
+        start_time = time.monotonic()
+        try:
+            self.datastore.upsert_data(submission_data, only_if_newer=True)
+        except RETRYABLE_ERRORS:
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            # The database answered, so the breaker counts the call as completed (the submission is then dead-lettered)
+            self.breaker.record_success(time.monotonic() - start_time)
+            raise
+        self.breaker.record_success(time.monotonic() - start_time)
+
+    def replay(self):
+        """
+        Drain a batch of the spool into the datastore.
+
+        Returns:
+            The number of submissions replayed.
+        """
+        with self.replay_lock:
+            try:
+                replayed_count = self.spool.replay(self.replay_write, batch_size=self.replay_batch_size)
+            except Exception as e:
+                self.logger.warning(f"Spool replay paused: {e}")
+                replayed_count = 0
+            self.scan_spool()
+        if replayed_count:
+            self.logger.info(f"Replayed {replayed_count} spooled submission(s); {self.spool_pending_bytes} byte(s) still spooled.")
+        return replayed_count
+
+    def scan_spool(self):
+        """
+        Update the cached backlog state from the spool folder, claiming the spool files of exited processes. Only called by
+        the replayer, atomically with respect to spool_submission().
+        """
+        with self.spool.lock:
+            self.spool_pending_bytes = self.spool.pending_bytes()
+            self.backlog = self.spool_pending_bytes > 0
+
+    def run_replay_loop(self):
+        """
+        Background thread target: scan the spool folder on start and periodically (to adopt the spool files left behind by
+        exited processes), and replay the spool while it has a backlog.
+        """
+        next_scan_time = time.monotonic()
+        while True:
+            if time.monotonic() >= next_scan_time:
+                self.scan_spool()
+                next_scan_time = time.monotonic() + self.spool_scan_interval_seconds
+            if self.backlog:
+                self.replay()
+            if self.stop_event.wait(self.replay_interval_seconds):
+                break
+
+    def get_stats(self):
+        """
+        Return the state of the breaker and spool, e.g. for monitoring.
+
+        Returns:
+            A dict of counters and gauges.
+        """
+        return {
+            'breaker_state': self.breaker.state,
+            **self.breaker.stats,
+            **self.spool.stats,
+            'spool_pending_bytes': self.spool_pending_bytes,
+        }
@@ -0,0 +1,493 @@
+import glob
+import json
+import os
+import threading
+import atexit
+from datetime import datetime
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils import generate_websafe_session_id
+from loggers.managers import LoggerManager
+from loggers.tracing import traced
+
+def aggregate_dataframe(df, group_by_field, aggregation_function, aggregation_field, field_options=None):
+    """
+    Aggregate a DataFrame of submissions in pandas, with the same semantics (including CAST field options) as the SQL
+    aggregations in MySQLDatastore.query_aggregated_data().
+
+    Args:
+        df(pd.DataFrame): The rows to aggregate.
+        group_by_field(str): The field to group by.
+        aggregation_function(str): One of ['count','sum','min','max'].
+        aggregation_field(str): The field to aggregate.
+        field_options(dict): (Optional) Field operation options; see MySQLDatastore.query_aggregated_data().
+
+    Returns:
+        A Pandas DataFrame with 'grouping' and 'aggregation' columns, which has no rows if there is no data or the fields are
+        not in the data.
+    """
+    if df.empty or group_by_field not in df.columns or aggregation_field not in df.columns:
+        return pd.DataFrame(columns=['grouping', 'aggregation'])
+    df = df.copy()
+    cast_options = (field_options or {}).get('CAST', {})
+    if cast_options.get('target_field') in df.columns:
+        target_field = cast_options['target_field']
+        if cast_options.get('target_type') == 'date':
+            df[target_field] = pd.to_datetime(df[target_field]).dt.date
+        elif cast_options.get('target_type') == 'int':
+            df[target_field] = pd.to_numeric(df[target_field], errors='coerce').astype('Int64')
+    grouped = df.groupby(group_by_field)[aggregation_field]
+    return grouped.agg(aggregation_function).rename('aggregation').rename_axis('grouping').reset_index()
+
+class SegmentedLocalDatastore:
+    """
+    Log-structured local Datastore class that keeps form submissions in a folder on local disk, replacing the deprecated
+    ParquetLocalDataStore (which rewrote its whole Parquet file on every submission).
+
+    Writes are O(1): a submission is appended to a write-ahead log (WAL) and kept in an in-memory table; when the in-memory
+    table is full it is flushed into a new, immutable Parquet segment and the WAL is cleared. An in-memory index maps every
+    session_id to the newest segment that contains it, so reads are last-write-wins and a single-row lookup only reads one
+    segment. A background thread compacts segments by merging them and dropping overwritten rows, so that reads stay fast.
+
+    Configured under the datastore_params key of the datastore config. For example:
+
+        datastore:
+            datastore_type: local
+            datastore_params:
+                local_store_folder: local_store     # Folder for the WAL and segments
+                memtable_max_rows: 1000             # Submissions buffered in memory (and in the WAL) per segment
+                compaction_min_segments: 8          # Segments that trigger a compaction
+                compaction_interval_seconds: 60     # How often the background thread checks whether to compact
+
+    The store must be served by a single process, since processes do not share their in-memory tables: the process that opens
+    it holds an exclusive lock on its folder (so a second process, e.g. another worker of a server that does not preload the
+    app, fails to open it), and a forked child process refuses to use its parent's store (see after_fork()).
+
+    Attributes:
+        config(dict): The full contents of the config.yaml configuration file
+        store_folder(str): The folder containing the WAL and segments.
+        memtable(dict): Submissions that have not been flushed into a segment yet, by session_id.
+        index(dict): The sequence number of the newest segment containing each flushed session_id.
+        segments(list): The sequence numbers of the live segments, in ascending order.
+        lock(threading.RLock): Guards the memtable, WAL, index and segment list.
+        logger(LoggerManager): A singleton logger instance for logging.
+
+    Usage:
+        >>> datastore = SegmentedLocalDatastore(app, config) # Should be done within a DatastoreManager instance
+    """
+    def __init__(self, app, config):
+        """
+        Load the segment index and replay the WAL, then start the background compaction thread.
+
+        Args:
+            app(Flask): The Flask app implementing this Datastore instance.
+            config(dict): The full contents of the config.yaml configuration file
+        Returns:
+            None
+        """
+        self.config = config
+        self.logger = LoggerManager.get_logger()
+        store_config_params = self.config['datastore'].get('datastore_params') or {}
+        self.store_folder = store_config_params.get('local_store_folder', 'local_store')
+        self.memtable_max_rows = store_config_params.get('memtable_max_rows', 1000)
+        self.compaction_min_segments = store_config_params.get('compaction_min_segments', 8)
+        self.compaction_interval_seconds = store_config_params.get('compaction_interval_seconds', 60)
+        self.wal_path = os.path.join(self.store_folder, 'wal.jsonl')
+        self.lock = threading.RLock()
+        self.compaction_lock = threading.Lock()
+        os.makedirs(self.store_folder, exist_ok=True)
+        self.owner_pid = os.getpid()
+        self.lock_folder()
+        self.load_index()
+        self.replay_wal()
+        self.start_compaction_thread()
+        atexit.register(self.close)
+
+    def lock_folder(self):
+        """
+        Take an exclusive lock on the store folder for this process, or fail if another process holds it. POSIX record locks
+        are released when their process exits and are not inherited by forked children.
+        """
+        if fcntl is None:
+            return
+        self.lock_file = open(os.path.join(self.store_folder, 'LOCK'), 'w')
+        try:
+            fcntl.lockf(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.lock_file.close()
+            raise RuntimeError(
+                f"The local store in '{self.store_folder}' is already open in another process; the 'local' datastore must "
+                "be served by a single process."
+            )
+
+    def start_compaction_thread(self):
+        """Start the background compaction thread."""
+        self.stop_event = threading.Event()
+        self.compaction_thread = threading.Thread(target=self.run_compaction_loop, name='segment-compaction', daemon=True)
+        self.compaction_thread.start()
+
+    def after_fork(self):
+        """
+        Refuse to serve the store from a forked child process (e.g. a worker of a preloaded app) by raising a RuntimeError.
+        The child would keep its own copy of the parent's in-memory table and append to the same WAL, and a compaction
+        thread in every process would merge and delete the same segments, so the 'local' datastore is only served by the
+        process that opened it.
+        """
+        raise RuntimeError(
+            f"The local store in '{self.store_folder}' was opened by process {self.owner_pid} and cannot be served by forked "
+            "worker processes; serve the 'local' datastore from a single process that does not fork (e.g. a single worker "
+            "without app preloading), or use the 'sqlite' or 'mysql' datastore."
+        )
+
+    def segment_path(self, sequence_number):
+        """Return the path of the segment with a given sequence number."""
+        return os.path.join(self.store_folder, f"segment-{sequence_number:08d}.parquet")
+
+    def load_index(self):
+        """
+        Build the session_id index by reading only the 'id' column of each segment, oldest first, so that newer segments win.
+
+        Returns:
+            None
+        """
+        self.index = {}
+        self.segments = sorted(int(os.path.basename(path)[len('segment-'):-len('.parquet')]) for path in glob.glob(os.path.join(self.store_folder, 'segment-*.parquet')))
+        for sequence_number in self.segments:
+            for id in pq.read_table(self.segment_path(sequence_number), columns=['id']).column('id').to_pylist():
+                self.index[id] = sequence_number
+        self.logger.info(f"Loaded {len(self.index)} session_id(s) from {len(self.segments)} segment(s) in '{self.store_folder}'.")
+
+    def replay_wal(self):
+        """
+        Rebuild the in-memory table from the WAL, e.g. after a restart. A partially written last line (from a crash mid-write)
+        is skipped.
+
+        Returns:
+            None
+        """
+        self.memtable = {}
+        if not os.path.exists(self.wal_path):
+            return
+        with open(self.wal_path, 'r', encoding='utf-8') as wal_file:
+            for line in wal_file:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    self.logger.warning("Skipping a partially written WAL entry.")
+                    continue
+                row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+                self.memtable[row['id']] = row
+        self.logger.info(f"Replayed {len(self.memtable)} submission(s) from the WAL.")
+
+    def check_connection(self):
+        """'Check' the datastore by verifying that its folder is writable."""
+        if not os.access(self.store_folder, os.W_OK):
+            raise PermissionError(f"The local store folder '{self.store_folder}' is not writable.")
+        self.logger.info('Datastore connection check OK.')
+
+    @traced()
+    def upsert_data(self, submission_data, only_if_newer=False):
+        """
+        Perform an UPSERT of a submission: like the SQL datastores' UPSERT, only the fields in the submission are overwritten,
+        so a partial submission (e.g. an autosaved draft) is merged into any existing row with the same session_id.
+
+        Args:
+            submission_data(dict): A JSON-equivalent dict containing form submission information.
+            only_if_newer(bool): (Optional, default=False) If True, an existing row is only updated if the submission's
+                                 'timestamp' is newer than the stored one.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            existing_row = self.memtable.get(submission_data['id'])
+            if existing_row is None and submission_data['id'] in self.index:
+                existing_row = self.get_record(submission_data['id'])
+            if only_if_newer and existing_row and pd.Timestamp(existing_row['timestamp']) >= pd.Timestamp(submission_data['timestamp']):
+                return
+            row = {**(existing_row or {}), **submission_data}
+            with open(self.wal_path, 'a', encoding='utf-8') as wal_file:
+                wal_file.write(json.dumps(row, default=str) + '\n')
+                wal_file.flush()
+                os.fsync(wal_file.fileno())
+            self.memtable[submission_data['id']] = row
+            if len(self.memtable) >= self.memtable_max_rows:
+                self.flush()
+        self.logger.info(f"Upserted row '{submission_data['id']}' into '{self.store_folder}'")
+        self.logger.debug("Upserted submission data: %s", submission_data)
+
+    @traced()
+    def upsert_bulk_data(self, bulk_upload_data):
+        """
+        Perform a bulk UPSERT by writing the uploaded rows as a new segment. The 'id' and 'timestamp' fields are generated if
+        they are not present in the data.
+
+        Args:
+            bulk_upload_data(pd.DataFrame): A Pandas DataFrame that contains several instances (rows) of form submission data.
+
+        Returns:
+            None
+        """
+        bulk_upload_data_columns = [x.lower() for x in bulk_upload_data.columns]
+        if 'id' not in bulk_upload_data_columns:
+            self.logger.warning("The 'id' field was not found in the uploaded dataset. New IDs will be generated.")
+            bulk_upload_data['id'] = [generate_websafe_session_id(self.config['general']['websafe_session_id_size']) for _ in range(len(bulk_upload_data))]
+        if 'timestamp' not in bulk_upload_data_columns:
+            self.logger.warning("The 'timestamp' field was not found in the uploaded dataset. New timestamps will be generated.")
+            bulk_upload_data['timestamp'] = datetime.now()
+        bulk_upload_data = bulk_upload_data.drop_duplicates(subset='id', keep='last')
+        with self.lock:
+            # Flush first, so that the uploaded rows land in a newer segment than any buffered submissions
+            self.flush()
+            self.write_segment(bulk_upload_data)
+        self.logger.info(f"Bulk-upserted {len(bulk_upload_data)} row(s) into '{self.store_folder}'")
+
+    def flush(self):
+        """
+        Write the in-memory table into a new segment and clear the WAL. Must be called with the lock held.
+
+        Returns:
+            None
+        """
+        if not self.memtable:
+            return
+        self.write_segment(pd.DataFrame.from_records(list(self.memtable.values())))
+        self.memtable = {}
+        # A crash before the WAL is cleared only replays submissions that are already in the segment, which is harmless
+        open(self.wal_path, 'w').close()
+
+    def write_segment(self, df):
+        """
+        Write rows into a new segment (via a temporary file, so that a segment is never seen partially written) and point the
+        index at it. Must be called with the lock held.
+
+        Args:
+            df(pd.DataFrame): The rows to write; session_ids must be unique.
+
+        Returns:
+            None
+        """
+        sequence_number = (self.segments[-1] + 1) if self.segments else 1
+        segment_path = self.segment_path(sequence_number)
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), segment_path + '.tmp')
+        os.replace(segment_path + '.tmp', segment_path)
+        self.segments.append(sequence_number)
+        for id in df['id']:
+            self.index[id] = sequence_number
+
+    def read_segment(self, sequence_number, columns=None, id=None):
+        """
+        Read the live rows of a segment, i.e. the rows whose session_id has not been overwritten by a newer segment.
+
+        Args:
+            sequence_number(int): The segment to read.
+            columns(list): (Optional) The columns to load; all columns are loaded if not specified.
+            id(str): (Optional) Only read the row with this session_id.
+
+        Returns:
+            A Pandas DataFrame.
+        """
+        segment_file = pq.ParquetFile(self.segment_path(sequence_number))
+        available_columns = segment_file.schema_arrow.names
+        loaded_columns = [column for column in (columns or available_columns) if column in available_columns]
+        loaded_columns = list(dict.fromkeys(['id'] + loaded_columns))
+        filters = [('id', '=', id)] if id else None
+        df = pq.read_table(self.segment_path(sequence_number), columns=loaded_columns, filters=filters).to_pandas()
+        with self.lock:
+            live_rows = df['id'].map(lambda row_id: self.index.get(row_id) == sequence_number and row_id not in self.memtable)
+        return df.loc[live_rows.astype(bool)]
+
+    @traced()
+    def query(self, id=None, columns=None):
+        """
+        Query the datastore; return all rows (oldest first) or a specific one using an ID if provided.
+
+        Args:
+            id(str): (Optional) An optional session_id value to look up.
+            columns(list): (Optional) The columns to return; all columns are returned if not specified.
+
+        Returns:
+            A Pandas DataFrame object containing query results.
+        """
+        for attempt in range(2):
+            with self.lock:
+                if id:
+                    segments = [self.index[id]] if id in self.index and id not in self.memtable else []
+                    memtable_rows = [self.memtable[id]] if id in self.memtable else []
+                else:
+                    segments = list(self.segments)
+                    memtable_rows = list(self.memtable.values())
+            try:
+                frames = [self.read_segment(sequence_number, columns=columns, id=id) for sequence_number in segments]
+                break
+            except FileNotFoundError:
+                # A compaction replaced the segments while they were being read; retry with the new segment list
+                if attempt:
+                    raise
+        if memtable_rows:
+            frames.append(pd.DataFrame.from_records(memtable_rows))
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=columns or ['id', 'timestamp'])
+        df = pd.concat(frames, ignore_index=True)
+        if columns:
+            df = df.reindex(columns=columns)
+        if 'timestamp' in df.columns:
+            df = df.sort_values('timestamp', ignore_index=True)
+        return df
+
+    @traced()
+    def get_record(self, id):
+        """
+        Look up a single submission by its session_id, reading at most one segment.
+
+        Args:
+            id(str): The session_id to look up.
+
+        Returns:
+            A dict of the submission's fields (missing values are None), or None if there is no such submission.
+        """
+        with self.lock:
+            if id in self.memtable:
+                return dict(self.memtable[id])
+        df = self.query(id=id)
+        if df.empty:
+            return None
+        return df.astype(object).where(df.notnull(), None).iloc[0].to_dict()
+
+    def iter_records(self, columns=None, batch_size=1000):
+        """
+        Iterate over all submissions (oldest first) as dicts.
+
+        Args:
+            columns(list): (Optional) The fields to return; all fields are returned if not specified.
+            batch_size(int): (Optional, default=1000) Unused; accepted for compatibility with the SQL datastores.
+
+        Returns:
+            A generator of dicts.
+        """
+        df = self.query(columns=columns)
+        yield from df.astype(object).where(df.notnull(), None).to_dict(orient='records')
+
+    def query_updated_since(self, since=None):
+        """
+        Return the rows with a 'timestamp' at or after a point in time (i.e. submitted or updated since then).
+
+        Args:
+            since(datetime): (Optional) The point in time; all rows are returned if not specified.
+
+        Returns:
+            A Pandas DataFrame object containing query results.
+        """
+        df = self.query()
+        return df.loc[df['timestamp'] >= since].reset_index(drop=True) if since and not df.empty else df
+
+    def delete_records(self, ids):
+        """
+        Delete submissions by session_id. They are dropped from the index (and the in-memory table) right away, which hides
+        them from reads, and the segments are then compacted so that the deleted rows are also removed from disk.
+
+        Args:
+            ids(list): The session_ids to delete.
+
+        Returns:
+            None
+        """
+        if not ids:
+            return
+        with self.lock:
+            for id in ids:
+                self.index.pop(id, None)
+                self.memtable.pop(id, None)
+            # Rewrite the WAL without the deleted submissions, so that a restart does not bring them back
+            with open(self.wal_path, 'w', encoding='utf-8') as wal_file:
+                for row in self.memtable.values():
+                    wal_file.write(json.dumps(row, default=str) + '\n')
+        self.compact(min_segments=1)
+        self.logger.info(f"Deleted {len(ids)} row(s) from '{self.store_folder}'.")
+
+    def reset(self):
+        """
+        Delete all segments and buffered submissions.
+
+        Returns:
+            None
+        """
+        with self.compaction_lock, self.lock:
+            for sequence_number in self.segments:
+                os.remove(self.segment_path(sequence_number))
+            open(self.wal_path, 'w').close()
+            self.segments, self.index, self.memtable = [], {}, {}
+        self.logger.info(f"Reset the local store in '{self.store_folder}'.")
+
+    @traced()
+    def query_aggregated_data(self, group_by_field='timestamp', aggregation_function='count', aggregation_field='id', field_options=None, start_time=None, end_time=None):
+        """
+        Perform an aggregation over the datastore, reading only the columns involved. See
+        MySQLDatastore.query_aggregated_data() for the meaning of the arguments.
+
+        Returns:
+            A Pandas DataFrame object containing aggregated query results.
+        """
+        if aggregation_function not in ['count', 'sum', 'min', 'max']:
+            self.logger.error(f"An invalid aggregation_function value, '{aggregation_function}', was specified; an empty dataframe will be returned.")
+            return pd.DataFrame(columns=['grouping', 'aggregation'])
+        df = self.query(columns=list(dict.fromkeys(['timestamp', group_by_field, aggregation_field])))
+        if start_time:
+            df = df.loc[df['timestamp'] >= start_time]
+        if end_time:
+            df = df.loc[df['timestamp'] < end_time]
+        return aggregate_dataframe(df, group_by_field, aggregation_function, aggregation_field, field_options)
+
+    def compact(self, min_segments=2):
+        """
+        Merge all current segments into one, dropping rows that were overwritten by newer segments (or deleted). The merged
+        segment takes the sequence number of the newest merged segment, so segments flushed during the compaction still take
+        precedence.
+
+        Args:
+            min_segments(int): (Optional, default=2) The number of segments below which there is nothing to compact. Set to 1
+                               to also rewrite a single segment, e.g. to remove deleted rows from it.
+
+        Returns:
+            None
+        """
+        with self.compaction_lock:
+            with self.lock:
+                merged_segments = list(self.segments)
+            if len(merged_segments) < min_segments:
+                return
+            merged_df = pd.concat([self.read_segment(sequence_number) for sequence_number in merged_segments], ignore_index=True)
+            target_sequence_number = merged_segments[-1]
+            target_path = self.segment_path(target_sequence_number)
+            pq.write_table(pa.Table.from_pandas(merged_df, preserve_index=False), target_path + '.tmp')
+            with self.lock:
+                os.replace(target_path + '.tmp', target_path)
+                for sequence_number in merged_segments[:-1]:
+                    os.remove(self.segment_path(sequence_number))
+                for id in merged_df['id']:
+                    if self.index.get(id) in merged_segments:
+                        self.index[id] = target_sequence_number
+                self.segments = [sequence_number for sequence_number in self.segments if sequence_number not in merged_segments[:-1]]
+            self.logger.info(f"Compacted {len(merged_segments)} segment(s) into segment {target_sequence_number} ({len(merged_df)} live row(s)).")
+
+    def run_compaction_loop(self):
+        """Background thread target: periodically compact once enough segments have accumulated."""
+        while not self.stop_event.wait(self.compaction_interval_seconds):
+            if len(self.segments) >= self.compaction_min_segments:
+                try:
+                    self.compact()
+                except Exception as e:
+                    self.logger.error(f"Segment compaction failed: {e}")
+
+    def close(self):
+        """Stop the compaction thread and flush any buffered submissions into a segment."""
+        self.stop_event.set()
+        with self.lock:
+            self.flush()
@@ -0,0 +1,301 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, event, inspect, literal_column, text, Date
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.sql import func
+
+from datamodels.mysql import MySQLDatastore, WRITTEN_AT_FIELD
+from loggers.managers import LoggerManager
+from loggers.tracing import traced
+
+# Pragmas applied to every new SQLite connection. WAL lets readers run concurrently with the (single) writer, and with WAL,
+# synchronous=NORMAL only syncs at checkpoints, which is still safe against application crashes.
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,       # Milliseconds to wait on a locked database before raising an error
+    'cache_size': -65536,       # Negative values are in KiB, i.e. a 64 MiB page cache per connection
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456,     # Memory-map up to 256 MiB of the database file for faster reads
+    'foreign_keys': 'ON',
+}
+
+class SQLiteDatastore(MySQLDatastore):
+    """
+    SQLAlchemy-interfaced, ORM-bound SQLite Datastore class for single-node deployments, where it avoids the network round-trip
+    to a MySQL server. It shares the table model, query and aggregation logic of MySQLDatastore, but:
+
+        1. The database is a local file in WAL mode, with the pragmas above applied to every connection (these can be
+           overridden under the 'sqlite_pragmas' key of the datastore_params config).
+        2. All writes are serialized through a single writer thread, since SQLite only allows one writer at a time; reads
+           use the engine's connection pool directly and run concurrently with the writer. In the async serving mode, the
+           event loop awaits writes on the writer thread and reads on a thread pool (see init_async()).
+        3. UPSERTs use INSERT ... ON CONFLICT DO UPDATE.
+        4. The table is created from the model on startup, and new fields/indexes from the form config are added with
+           ALTER TABLE ADD COLUMN and CREATE INDEX. Alembic is not used; other schema changes (e.g. a changed column type)
+           require a manual migration.
+
+    For example:
+
+        datastore:
+            datastore_type: sqlite
+            datastore_params:
+                sqlite_database_file: data/submissions.db   # Defaults to <form config name>.db
+                sqlite_pragmas:
+                    cache_size: -131072
+
+    Attributes:
+        database_file(str): The path of the SQLite database file.
+        pragmas(dict): The pragmas applied to every new connection.
+        writer(ThreadPoolExecutor): A single-threaded executor that runs all writes.
+
+    Usage:
+        >>> datastore = SQLiteDatastore(app, config) # Should be done within a DatastoreManager instance
+    """
+    def __init__(self, app, config):
+        """
+        Open (or create) the SQLite database, initialize the ORM engine and bring the table in sync with the form configuration
+        sheet.
+
+        Args:
+            app(Flask): The Flask app implementing this Datastore instance.
+            config(dict): The full contents of the config.yaml configuration file
+        Returns:
+            None
+        """
+        self.app = app
+        # The table is managed without Flask-SQLAlchemy or Alembic (see sync_table_schema), so a plain declarative base will do
+        self.db = None
+        self.model_base = declarative_base()
+        self.config = config
+        self.table_name = self.config['form']['form_config_file_name'].split('.')[0]
+        self.table_schema = None # SQLite has a single schema per database file
+        self.logger = LoggerManager.get_logger()
+        self.reset_statement_cache()
+        sqlite_config_params = self.config['datastore'].get('datastore_params') or {}
+        self.database_file = sqlite_config_params.get('sqlite_database_file', f"{self.table_name}.db")
+        self.pragmas = {**DEFAULT_SQLITE_PRAGMAS, **sqlite_config_params.get('sqlite_pragmas', {})}
+        database_folder = os.path.dirname(os.path.abspath(self.database_file))
+        os.makedirs(database_folder, exist_ok=True)
+        self.sqlalchemy_database_uri = self.generate_database_uri_from_config(sqlite_config_params=sqlite_config_params)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = self.sqlalchemy_database_uri
+        self.logger.info(f"Added SQLAlchemy URI to app config")
+        self.table_model = self.generate_table_orm_from_config_file(config_folder=self.config['form'].get('form_config_folder', 'form_config'),config_filename=self.config['form']['form_config_file_name'])
+        self.drafts_model = self.generate_drafts_orm()
+        self.create_engine()
+        self.schema_migrator = None
+        self.migrate = None
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-writer')
+        self.sync_table_schema()
+
+    def create_engine(self):
+        """Create a SQLAlchemy engine that applies the configured pragmas to every new connection."""
+        # Connections are shared between the writer thread and request threads, which the pool already keeps from overlapping
+        self.engine = create_engine(self.sqlalchemy_database_uri, echo=True, connect_args={'check_same_thread': False})
+        event.listen(self.engine, 'connect', self.apply_pragmas)
+
+    def init_async(self):
+        """
+        Prepare for the async serving mode. No async engine is used: SQLite drivers for asyncio (e.g. aiosqlite) run each
+        connection on a thread of their own and hop between it and the event loop for every call, which measured slower
+        than awaiting the writer thread (for writes) and a pooled thread (for reads) once per call.
+
+        Returns:
+            None
+        """
+
+    async def close_async(self):
+        """Nothing to close; see init_async()."""
+
+    def after_fork(self):
+        """Reset the inherited connection pool and replace the writer thread, which does not survive the fork."""
+        super().after_fork()
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-writer')
+
+    def apply_pragmas(self, dbapi_connection, connection_record):
+        """
+        Apply the configured pragmas to a new DBAPI connection; registered as an engine 'connect' event listener.
+
+        Args:
+            dbapi_connection(sqlite3.Connection): The new connection.
+            connection_record: The pool's record of the connection (unused).
+
+        Returns:
+            None
+        """
+        cursor = dbapi_connection.cursor()
+        for pragma, value in self.pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+    def generate_database_uri_from_config(self, sqlite_config_params):
+        """
+        Helper function to generate a SQLite-specific SQLAlchemy Database URI for the app dictionary.
+
+        Args:
+            sqlite_config_params(dict): A subset of SQLite-specific configuration parameters from the config.yaml file
+
+        Returns:
+            SQLALCHEMY_DATABASE_URI(str): A formatted SQLAlchemy database URI.
+        """
+        return f"sqlite:///{os.path.abspath(self.database_file)}"
+
+    def sync_table_schema(self):
+        """
+        Create the table if it does not exist; otherwise add any columns and indexes that are in the table model but not in the
+        table. Added columns are always nullable, since existing rows have no value for them. The drafts table is created if
+        it does not exist.
+
+        Returns:
+            None
+        """
+        table = self.table_model.__table__
+        with self.engine.begin() as connection:
+            self.drafts_model.__table__.create(connection, checkfirst=True)
+            if not inspect(connection).has_table(table.name):
+                table.create(connection)
+                self.logger.info(f"Created table {table.name}")
+                return
+            inspector = inspect(connection)
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_definition = str(CreateColumn(column).compile(dialect=self.engine.dialect)).replace(' NOT NULL', '')
+                    connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN {column_definition}'))
+                    self.logger.info(f"Added column {column.name} to {table.name}")
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+    def cast_to_date(self, column):
+        """SQLite has no DATE type (a CAST to DATE yields the year), so the date is extracted with the date() function."""
+        return func.date(column, type_=Date)
+
+    def check_connection(self):
+        """'Check' the database by opening a connection and running a trivial query."""
+        with self.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+        self.logger.info('Datastore connection check OK.')
+
+    @traced('sqlite_write')
+    def write(self, write_function, *args):
+        """
+        Run a write on the writer thread and wait for it to finish, re-raising any error in the calling thread.
+
+        Args:
+            write_function(callable): The function performing the write.
+            *args: Arguments for write_function.
+
+        Returns:
+            The return value of write_function.
+        """
+        return self.writer.submit(write_function, *args).result()
+
+    def build_upsert_statement(self, columns, only_if_newer=False):
+        """
+        Build a parameterized INSERT ... ON CONFLICT DO UPDATE statement that writes the given columns; see
+        MySQLDatastore.build_upsert_statement().
+
+        Args:
+            columns(tuple): The names of the columns written.
+            only_if_newer(bool): (Optional, default=False) If True, an existing row is only updated if the written 'timestamp'
+                                 is newer than the stored one.
+
+        Returns:
+            A SQLAlchemy Insert statement.
+        """
+        table = self.table_model.__table__
+        stmt = insert(table)
+        if WRITTEN_AT_FIELD in table.c:
+            stmt = stmt.values({WRITTEN_AT_FIELD: self.write_time_expression()})
+            columns = (*columns, WRITTEN_AT_FIELD)
+        primary_key_columns = [column.name for column in table.primary_key]
+        return stmt.on_conflict_do_update(
+            index_elements=primary_key_columns,
+            set_={column: stmt.excluded[column] for column in columns if column not in primary_key_columns},
+            where=(stmt.excluded.timestamp > table.c.timestamp) if only_if_newer else None
+        )
+
+    def write_time_expression(self):
+        """Return the SQL expression written to the 'written_at' column; see MySQLDatastore.write_time_expression()."""
+        # Formatted with six fractional digits, as SQLAlchemy stores DateTime values in SQLite
+        return literal_column("strftime('%Y-%m-%d %H:%M:%f000', 'now')")
+
+    def build_draft_upsert_statement(self, draft_values):
+        """Build an INSERT ... ON CONFLICT DO UPDATE statement that writes a draft; see MySQLDatastore.build_draft_upsert_statement()."""
+        stmt = insert(self.drafts_model.__table__).values(**draft_values)
+        return stmt.on_conflict_do_update(index_elements=['id'], set_={'timestamp': stmt.excluded.timestamp, 'fields': stmt.excluded.fields})
+
+    def save_draft(self, id, changed_fields, timestamp):
+        """Autosave the changed fields of a session into its draft on the writer thread; see MySQLDatastore.save_draft()."""
+        self.write(super().save_draft, id, changed_fields, timestamp)
+
+    @traced()
+    def upsert_data(self, submission_data, only_if_newer=False):
+        """
+        Perform an UPSERT (UPDATE row with the same session_id as the submission data, INSERT if such a row does not exist)
+        against the data in the database using the provided submission data.
+
+        Args:
+            submission_data(dict): A JSON-equivalent dict containing form submission information.
+            only_if_newer(bool): (Optional, default=False) See MySQLDatastore.upsert_data().
+
+        Returns:
+            None
+        """
+        def execute_upsert():
+            with self.engine.begin() as connection:
+                connection.execute(self.get_upsert_statement(submission_data, only_if_newer=only_if_newer), submission_data)
+        self.write(execute_upsert)
+        self.logger.info(f"Upserted row '{submission_data['id']}' into {self.table_name}")
+        self.logger.debug("Upserted submission data: %s", submission_data)
+
+    @traced()
+    async def upsert_data_async(self, submission_data):
+        """
+        Async version of upsert_data(): the event loop awaits the write on the writer thread (see init_async()).
+
+        Args:
+            submission_data(dict): A JSON-equivalent dict containing form submission information.
+
+        Returns:
+            None
+        """
+        def execute_upsert():
+            with self.engine.begin() as connection:
+                connection.execute(self.get_upsert_statement(submission_data), submission_data)
+        await asyncio.wrap_future(self.writer.submit(execute_upsert))
+        self.logger.info(f"Upserted row '{submission_data['id']}' into {self.table_name}")
+        self.logger.debug("Upserted submission data: %s", submission_data)
+
+    async def get_record_async(self, id):
+        """Async version of get_record(): the event loop awaits the lookup on a pooled thread (see init_async())."""
+        return await asyncio.to_thread(self.get_record, id)
+
+    @traced()
+    def upsert_bulk_data(self, bulk_upload_data):
+        """
+        Perform a bulk UPSERT (UPDATE rows with the same session_ids as the submission data, INSERT if such rows do not exist),
+        in a single transaction. See MySQLDatastore.upsert_bulk_data() for how the 'id' and 'timestamp' fields are handled.
+
+        Args:
+            bulk_upload_data(pd.DataFrame): A Pandas DataFrame that contains several instances (rows) of form submission data.
+
+        Returns:
+            None
+        """
+        num_rows = len(bulk_upload_data)
+        bulk_upload_data = self.prepare_bulk_upload_data(bulk_upload_data)
+        if not bulk_upload_data:
+            return
+        def execute_bulk_upsert():
+            with self.engine.begin() as connection:
+                connection.execute(self.get_upsert_statement(bulk_upload_data[0]), bulk_upload_data)
+        self.write(execute_bulk_upsert)
+        self.logger.info(f"Bulk-upserted {num_rows} row(s) into {self.table_name}")
+
+    def archive_rows_older_than(self, archive, cutoff, batch_size=5000):
+        """Move rows older than a cutoff into an archive (see MySQLDatastore.archive_rows_older_than()), on the writer thread."""
+        return self.write(super().archive_rows_older_than, archive, cutoff, batch_size)
@@ -1,9 +1,7 @@
 import yaml
-import pandas as pd
-import numpy as np
 import os
-from bs4 import BeautifulSoup as soup
 
+from formbuilder.schema_utils import parse_select_options, read_form_config_workbook
 from loggers.managers import LoggerManager
 
 def prettify_raw_html(html_string, engine='bs4'):
@@ -18,6 +16,8 @@ def prettify_raw_html(html_string, engine='bs4'):
         A well-formatted HTML string.
     """
     if engine == 'bs4':
+        # Imported here: BeautifulSoup is only needed once, when the form HTML is compiled
+        from bs4 import BeautifulSoup as soup
         return soup(html_string, features='html.parser').prettify()
 
 def generate_html_for_field(field):
@@ -35,6 +35,7 @@ def generate_html_for_field(field):
                      4. 'field_type': One of 'input', 'select' or 'text'. Determines the corresponding HTML input element to be used.
                      5. 'data_type': An unused field that is primarily used for SQLAlchemy ORM purposes.
                      6. 'select_options': A list of choices to be rendered in HTML dropdown boxes when the field_type is 'select'.
+                     7. 'max_length': (Optional) The maximum number of characters accepted by 'input' and 'text' fields.
     Returns:
         A HTML representation of the specified field, built according to the formatting information provided (see above)
     """
@@ -44,17 +45,18 @@ def generate_html_for_field(field):
     modifier_keys = {
         'field_required': 'required' if field['required'].lower() == 'yes' else '',
         'field_required_style': 'required-field' if field['required'].lower() == 'yes' else '',
-        'col_size_modifier': 'col-md-6' if field.get('group_id') else ''
+        'col_size_modifier': 'col-md-6' if field.get('group_id') else '',
+        'field_maxlength': f"maxlength=\"{int(field['max_length'])}\"" if field.get('max_length') else ''
     }   
     if field_type == 'input':    
         input_field_template = \
         """<div class="{col_size_modifier} mb-3">
             <label for="{backend_field_name}" class="form-label {field_required_style}">{field_label}</label>
-            <input type="text" class="form-control" id="{backend_field_name}" name="{backend_field_name}" {field_required}>
+            <input type="text" class="form-control" id="{backend_field_name}" name="{backend_field_name}" {field_maxlength} {field_required}>
         </div>"""
         return input_field_template.format(**{**modifier_keys, **field})
     elif field_type == 'select':
-        option_list = '\n'.join([f"<option value=\"{option.strip()}\">{option.strip()}</option>" for option in field['select_options'].split(',')])
+        option_list = '\n'.join([f"<option value=\"{option}\">{option}</option>" for option in parse_select_options(field['select_options'])])
         select_field_template = \
         """<div class="{col_size_modifier} mb-3">
             <label for="{backend_field_name}" class="form-label {field_required_style}">{field_label}</label>
@@ -67,7 +69,7 @@ def generate_html_for_field(field):
         text_field_template = \
         """<div class="{col_size_modifier} mb-3">
             <label for="{backend_field_name}" class="form-label {field_required_style}">{field_label}</label>
-            <input type="text" class="form-control" id="{backend_field_name}" name="{backend_field_name}" {field_required}>
+            <input type="text" class="form-control" id="{backend_field_name}" name="{backend_field_name}" {field_maxlength} {field_required}>
         </div>"""
         return text_field_template.format(**{**modifier_keys, **field})
     else:
@@ -99,15 +101,13 @@ def generate_form_html_from_config_file(config_folder='formbuilder',config_filen
     logger.info(f"Attempting to generate form HTML using config file configured at {config_folder}/{config_filename}")
     current_folder = os.path.dirname(os.path.abspath(__file__))
     relative_config_file_path = os.path.join(current_folder,'..',config_folder,config_filename)    
-    config_workbook = pd.ExcelFile(relative_config_file_path)
-    form_pages = pd.read_excel(config_workbook, 'Pages').set_index('page_number').to_dict(orient='index')
-    form_fields = pd.read_excel(config_workbook, 'Fields')
+    form_pages, form_fields = read_form_config_workbook(relative_config_file_path)
     generated_form_html = """"""
     for page_number, page_config in form_pages.items():
         # Step 1: Generate HTML for fields inside the page
         generated_field_html = """"""
-        # Select subset of data that is associated with the current page, clean up missing group_id values and build a dictionary
-        page_fields = form_fields.loc[form_fields['page_number'] == page_number].replace({np.nan:None}).to_dict(orient='records')
+        # Select the fields that are associated with the current page (copies, since generate_html_for_field modifies them)
+        page_fields = [dict(field) for field in form_fields if field['page_number'] == page_number]
         current_group_id = None
         for i, field in enumerate(page_fields):
             if not field['group_id']:
@@ -1,5 +1,6 @@
 import os 
-import pandas as pd
+import csv
+from openpyxl import load_workbook
 
 class BaseFileSchema:
     """
@@ -36,13 +37,69 @@ def generate_schema_from_config_file(config_folder='formbuilder',config_filename
     """
     current_folder = os.path.dirname(os.path.abspath(__file__))    
     relative_config_file_path = os.path.join(current_folder,'..',config_folder,config_filename)
-    config_workbook = pd.ExcelFile(relative_config_file_path)
-    form_pages = pd.read_excel(config_workbook, 'Pages').set_index('page_number').to_dict(orient='index')
-    form_fields = pd.read_excel(config_workbook, 'Fields')
-    backend_field_names = form_fields['backend_field_name'].to_list()
-    form_schema = {key: None for key in backend_field_names}
+    form_pages, form_fields = read_form_config_workbook(relative_config_file_path)
+    form_schema = {field['backend_field_name']: None for field in form_fields}
     return form_schema
 
+def read_sheet_records(worksheet):
+    """
+    A utility function to read the rows of a worksheet as a list of dicts keyed by the header (first) row. Empty cells are read
+    as None and rows that are entirely empty are skipped.
+
+    Args:
+        worksheet(openpyxl.worksheet.worksheet.Worksheet): The worksheet to read.
+
+    Returns:
+        A list of dicts, one per non-empty row below the header row.
+    """
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, ())
+    records = []
+    for row in rows:
+        if all(value is None for value in row):
+            continue
+        records.append({column: value for column, value in zip(header, row) if column is not None})
+    return records
+
+def read_form_config_workbook(config_file_path):
+    """
+    A utility function to read the 'Pages' and 'Fields' sheets of a form_config Excel sheet. The workbook is read with openpyxl
+    rather than pandas, so that building the form at startup does not need to import pandas (which is only needed by uploads,
+    exports and the dashboard).
+
+    Args:
+        config_file_path(str): The path to the form_config Excel sheet.
+
+    Returns:
+        A tuple of (form_pages, form_fields): form_pages is a dict of {page_number: {page_title, page_description, ...}} in sheet
+        order and form_fields is a list of dicts, one per row of the 'Fields' sheet, with empty cells as None.
+    """
+    config_workbook = load_workbook(config_file_path, read_only=True, data_only=True)
+    try:
+        form_pages = {}
+        for page in read_sheet_records(config_workbook['Pages']):
+            page_number = page.pop('page_number')
+            form_pages[page_number] = page
+        form_fields = read_sheet_records(config_workbook['Fields'])
+    finally:
+        config_workbook.close()
+    return form_pages, form_fields
+
+def parse_select_options(select_options):
+    """
+    A utility function to split the 'select_options' value of a field in the form_config Excel sheet into a list of options. Options
+    are separated by commas; an option that contains a comma must be enclosed in double-quotes, e.g. 'Google, "Alphabet, Inc."'.
+
+    Args:
+        select_options(str): The comma-separated 'select_options' value of a field.
+
+    Returns:
+        A list of option strings, stripped of surrounding whitespace and quotes.
+    """
+    if not select_options:
+        return []
+    return [option.strip() for option in next(csv.reader([str(select_options)], skipinitialspace=True)) if option.strip()]
+
 def extract_form_response_data_using_schema(request, form_schema):
     """
     A utility function that uses a data collection template (a dict of backend_field_names) that will be populated using the form
@@ -56,4 +113,32 @@ def extract_form_response_data_using_schema(request, form_schema):
         A populated form data collection template, with keys corresponding to backend_field_names and values populated with the 
         corresponding form submission information.
     """
-    return {key: request.form.get(key) for key in form_schema}
+    return extract_form_fields_using_schema(request.form, form_schema)
+
+def extract_form_fields_using_schema(form, form_schema):
+    """
+    Like extract_form_response_data_using_schema(), but for form response data that is not in a Flask request (e.g. the form
+    data of a request of the async serving mode).
+
+    Args:
+        form: The form response data; any mapping with a get() method.
+        form_schema(dict): A form data collection template.
+
+    Returns:
+        A populated form data collection template (see extract_form_response_data_using_schema()).
+    """
+    return {key: form.get(key) for key in form_schema}
+
+def extract_form_delta_using_schema(changed_fields, form_schema):
+    """
+    A utility function that keeps only the fields of a (partial) form response that are in the data collection template, e.g.
+    for the changed fields sent by an autosave.
+
+    Args:
+        changed_fields(dict): A dict of backend_field_names and their new values.
+        form_schema(dict): A form data collection template.
+
+    Returns:
+        A dict containing only the changed fields that are in the form schema.
+    """
+    return {key: value for key, value in changed_fields.items() if key in form_schema}
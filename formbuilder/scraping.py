@@ -0,0 +1,136 @@
+"""
+scraping.py
+===========
+
+(Deprecated) Helpers that scrape a static HTML form for its fields and render them as an HTML table. Forms are now generated
+from the form_config Excel sheet (see form_utils), so nothing in the app uses these; they live in their own module so that
+importing utils does not import BeautifulSoup.
+
+"""
+
+from bs4 import BeautifulSoup
+import os
+import hashlib
+
+def scrape_form_content(config_dict):
+    """
+    (Deprecated) Utility function to scrape the specified (static) form for field labels, input types and names return them as a dict. This method,
+    while perfectly valid, is not currently in use since forms are now dynamic and cannot be parsed directly from source files. 
+    
+    Args:
+        config_dict(dict): A helper configuration dict containing the following keys:
+            1. form_id: The value of the HTML 'id' element in the <form> definition of the webform
+            2. form_html_file: The name of the source file containing the (static) form HTML
+    
+    Returns:
+        Form content parsed into a JSON document in the following format:
+        [ 
+                {
+                    'field_label': '',
+                    'field_name': '',
+                    'field_type': '',
+                    'input_type': '',
+                    'is_required': '',
+                    'select-options': [
+                        {'backend_value': '', 'display_text': ''},
+                    ]
+                },    
+            ]
+    """
+
+    if 'form_html_file' not in config_dict or 'form_id' not in config_dict:
+        raise RuntimeError("Please ensure that both the 'form_id' and 'form_html_file' keys are specified in the provided config_dict.")
+
+    form_html_file = config_dict['form_html_file']
+    form_id = config_dict['form_id']
+
+    with open(os.path.join('templates',form_html_file),'r') as handle:
+        html_doc = handle.read()
+
+    soup = BeautifulSoup(html_doc, 'html.parser')
+    form = soup.find('form', id=form_id)
+    if not form:
+        raise ValueError(f"Form with ID '{form_id}' not found!")
+
+    form_content = []
+    for label in form.find_all('label'):
+        field_id = label.get('for')
+        input_field = form.find(id=field_id)
+        if input_field:
+            field_info = {
+                'field_label': label.text.strip(),
+                'field_name': input_field.get('name'),
+                'field_type': input_field.name,
+                'input_type': input_field.get('type'),
+                'is_required': True if 'required' in input_field.attrs else False 
+            }
+            if input_field.name == 'select':
+                field_info['select_options'] = [{'display_text': option.text.strip(), 'backend_value': option.get('value')} for option in input_field.find_all('option')]
+            form_content.append(field_info)
+    return form_content
+
+def generate_html_table_using_form_content_html(form_content):
+    """
+    (Deprecated) Utility function to generate and return an HTML table string to neatly display form_content generated by the 
+    scrape_form_content function.
+
+    Args:
+        json_data: A JSON document in the form:
+            [ 
+                {
+                    'field_label': '',
+                    'field_name': '',
+                    'field_type': '',
+                    'input_type': '',
+                    'is_required': '',
+                    'select-options': [
+                        {'backend_value': '', 'display_text': ''},
+                    ]
+                },  
+            ]
+            that is generated using the scrape_form_content function.
+    Returns:
+        An HTML string containing a <table> that contains form information and can be rendered as HTML.
+    """
+
+    html_start="""
+    <!-- Unique MD5 for versioning -->
+    <p class="text-center text-muted">Version: {md5_string}</p>
+    <!-- Form submission table --> 
+    <table class="docs table table-responsive table-hover table-striped table-bordered">
+        <thead>
+            <tr>
+                <th>#</th>
+                <th>Backend Field Name</th>
+                <th>Field Label</th>
+                <th>Required?</th>
+                <th>Field Type</th>
+                <th>Select Options (if applicable)</th>
+            </tr>
+        </thead>
+        <tbody>
+    """
+    html_end="""
+        </tbody>
+    </table>
+    """
+
+    rows = ""
+    for i, field in enumerate(form_content):
+        select_options = []
+        if field.get('select_options'):
+            select_options = [opt['display_text'] for opt in field['select_options']]
+        rows += f"""
+        <tr>
+            <td>{i+1}</td>
+            <td>{field['field_name']}</td>
+            <td>{field['field_label']}</td>
+            <td>{field['is_required']}</td>
+            <td>{field['field_type']}</td>
+            <td>{', '.join(select_options)}</td>
+        </tr>
+        """
+    # Unique string for each version generated, for file versioning
+    md5_string = hashlib.md5(rows.encode()).hexdigest()
+    html_content = html_start.format(md5_string=md5_string) + rows + html_end
+    return html_content
@@ -1,7 +1,65 @@
+import atexit
 import logging.config
+import logging.handlers
 import os 
+import queue
+import threading
 from abc import abstractmethod
 
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    A QueueHandler for a bounded queue, with a policy for when the queue is full (i.e. the listener cannot keep up with the
+    configured handlers):
+
+        1. 'drop_new' drops the incoming record (the default; never blocks the logging thread).
+        2. 'drop_oldest' drops the oldest queued record to make room for the incoming one.
+        3. 'block' waits up to block_timeout_seconds for room, then drops the incoming record.
+
+    Attributes:
+        overflow_policy(str): One of 'drop_new', 'drop_oldest' or 'block'.
+        block_timeout_seconds(float): How long the 'block' policy waits for room in the queue.
+        stats(dict): Counters of queued and dropped records.
+    """
+    def __init__(self, log_queue, overflow_policy='drop_new', block_timeout_seconds=0.1):
+        super().__init__(log_queue)
+        if overflow_policy not in ['drop_new', 'drop_oldest', 'block']:
+            raise ValueError(f"ERROR: '{overflow_policy}' is not a valid logging queue overflow_policy value.")
+        self.overflow_policy = overflow_policy
+        self.block_timeout_seconds = block_timeout_seconds
+        self.stats_lock = threading.Lock()
+        self.stats = {'queued': 0, 'dropped': 0}
+
+    def enqueue(self, record):
+        """Queue a record, applying the overflow policy if the queue is full."""
+        try:
+            if self.overflow_policy == 'block':
+                self.queue.put(record, timeout=self.block_timeout_seconds)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            if self.overflow_policy != 'drop_oldest' or not self.replace_oldest(record):
+                with self.stats_lock:
+                    self.stats['dropped'] += 1
+                return
+        with self.stats_lock:
+            self.stats['queued'] += 1
+
+    def replace_oldest(self, record):
+        """Drop the oldest queued record and queue this one instead; returns False if the queue stayed full."""
+        try:
+            self.queue.get_nowait()
+            with self.stats_lock:
+                self.stats['dropped'] += 1
+            self.queue.put_nowait(record)
+            return True
+        except (queue.Empty, queue.Full):
+            return False
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """A QueueListener that waits for room for its stop sentinel, so that stopping it with a full queue still flushes it."""
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
 class BaseLoggerManager:
     """
     Abstract singleton base class for Loggers.
@@ -26,13 +84,31 @@ class LoggerManager(BaseLoggerManager):
     Singleton class for Logging management; thread-safe and production-capable. Sphinx
     autodoc will set various class variables
 
+    The logger's handlers can optionally run on a background thread, so that logging calls only put the record on a bounded
+    in-memory queue and never wait on handler I/O (e.g. file writes) on the request thread. This is configured under the
+    'queue' key of the logging config. For example:
+
+        system:
+            logging:
+                queue:
+                    enabled: true
+                    max_size: 10000             # Records buffered before the overflow policy applies
+                    overflow_policy: drop_new   # One of drop_new, drop_oldest or block (see BoundedQueueHandler)
+                    block_timeout_seconds: 0.1  # How long the 'block' policy waits for room in the queue
+
+    Queued records are flushed to the handlers on interpreter exit.
+
     Attributes:
         _logger_instance: The singleton logger instance that is configured only once.
         logger_name: The name of the logger, configured in the instance config YAML.
         log_dir: (Experimental) The directory used for storing log output for any file-based handlers
+        queue_handler: The BoundedQueueHandler in front of the configured handlers, if queued logging is enabled.
+        queue_listener: The listener that passes queued records to the configured handlers, if queued logging is enabled.
     """
 
     _logger_instance = None
+    queue_handler = None
+    queue_listener = None
 
     @classmethod
     @abstractmethod
@@ -63,8 +139,75 @@ class LoggerManager(BaseLoggerManager):
             os.makedirs(cls.log_dir, exist_ok=True)
             logging.config.dictConfig(logging_dictConfig)
             cls._logger_instance = logging.getLogger(cls.logger_name)
+            queue_options = logging_dictConfig.get('queue') or {}
+            if queue_options.get('enabled'):
+                cls.enable_queued_logging(queue_options)
             cls._logger_instance.info(f"App Logger '{cls.logger_name}' initialized with handlers: {cls._logger_instance.handlers}")
             cls._logger_instance.debug("Available Handlers:")
             for name, logger in logging.root.manager.loggerDict.items():
                 cls._logger_instance.debug(f"Logger: {name}, Level: {getattr(logger, 'level', 'Not Set')}")
-        return cls._logger_instance
\ No newline at end of file
+        return cls._logger_instance
+
+    @classmethod
+    def enable_queued_logging(cls, queue_options):
+        """
+        Move the logger's configured handlers behind a BoundedQueueHandler, and start a listener thread that passes queued
+        records on to them.
+
+        Args:
+            queue_options(dict): The 'queue' key of the logging config.
+
+        Returns:
+            None
+        """
+        handlers = list(cls._logger_instance.handlers)
+        for handler in handlers:
+            cls._logger_instance.removeHandler(handler)
+        cls.queue_handler = BoundedQueueHandler(
+            queue.Queue(maxsize=queue_options.get('max_size', 10000)),
+            overflow_policy=queue_options.get('overflow_policy', 'drop_new'),
+            block_timeout_seconds=queue_options.get('block_timeout_seconds', 0.1)
+        )
+        cls._logger_instance.addHandler(cls.queue_handler)
+        cls.queue_listener = DrainingQueueListener(cls.queue_handler.queue, *handlers, respect_handler_level=True)
+        cls.queue_listener.start()
+        atexit.register(cls.stop_queued_logging)
+
+    @classmethod
+    def after_fork(cls):
+        """
+        Restart queued logging in a forked child process: the listener thread does not survive the fork, and the queue's
+        internal lock may have been held by it at the time. The child gets a new queue, counters and listener.
+
+        Returns:
+            None
+        """
+        if not cls.queue_handler:
+            return
+        cls.queue_handler.queue = queue.Queue(maxsize=cls.queue_handler.queue.maxsize)
+        cls.queue_handler.stats_lock = threading.Lock()
+        cls.queue_handler.stats = {'queued': 0, 'dropped': 0}
+        cls.queue_listener = DrainingQueueListener(cls.queue_handler.queue, *cls.queue_listener.handlers, respect_handler_level=True)
+        cls.queue_listener.start()
+
+    @classmethod
+    def stop_queued_logging(cls):
+        """Flush queued records to the handlers and stop the listener thread; registered to run on interpreter exit."""
+        if cls.queue_listener and cls.queue_listener._thread:
+            cls.queue_listener.stop()
+
+    @classmethod
+    def get_logging_stats(cls):
+        """
+        Return the queued logging counters, e.g. for monitoring.
+
+        Returns:
+            A dict with the numbers of queued and dropped records and the current queue size, or an empty dict if queued
+            logging is not enabled.
+        """
+        if not cls.queue_handler:
+            return {}
+        with cls.queue_handler.stats_lock:
+            stats = dict(cls.queue_handler.stats)
+        stats['queue_size'] = cls.queue_handler.queue.qsize()
+        return stats
@@ -0,0 +1,319 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from flask import g, request
+
+from datamodels.resilience import process_is_running
+from loggers.managers import LoggerManager
+from loggers.tracing import span_observers
+
+# Upper bounds (in seconds) of the latency histogram buckets
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class MetricsRegistry:
+    """
+    An in-process registry of counters, histograms and gauges, rendered in the Prometheus text exposition format.
+
+    Counters and histograms are recorded as they happen; gauges (e.g. connection pool usage) are read from collector
+    functions when a snapshot is taken. To be multi-process safe (e.g. under Gunicorn, where every worker has its own
+    registry), each process periodically writes a snapshot of its metrics to its own file in a shared folder, and rendering
+    merges the snapshots of all processes: counters and histograms are summed, and gauges are reported per process (with a
+    'pid' label) for processes that are still running. Like Prometheus' own multi-process mode, the snapshot folder should
+    be emptied when the app is (re)deployed.
+
+    Attributes:
+        namespace(str): The prefix of every metric name.
+        metrics_folder(str): The folder for the per-process snapshot files.
+        snapshot_interval_seconds(float): How often this process writes its snapshot.
+        buckets(tuple): The upper bounds of the histogram buckets.
+        counters(dict): Counter values, by (name, labels).
+        histograms(dict): Histogram bucket counts, sums and counts, by (name, labels).
+        gauge_collectors(list): Functions returning (name, labels, value) tuples for gauges.
+        descriptions(dict): The (type, help text) of each metric, by name.
+
+    Usage:
+        >>> registry = MetricsRegistry(metrics_folder='logs/metrics')
+        >>> registry.inc('http_requests_total', {'route': '/submit', 'status': '302'})
+        >>> registry.observe('http_request_duration_seconds', 0.012, {'route': '/submit'})
+        >>> registry.render() # Prometheus text format, merged across processes
+    """
+    def __init__(self, metrics_folder, namespace='dynamic_webform', snapshot_interval_seconds=5, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.namespace = namespace
+        self.metrics_folder = metrics_folder
+        self.snapshot_interval_seconds = snapshot_interval_seconds
+        self.buckets = tuple(buckets)
+        self.counters = {}
+        self.histograms = {}
+        self.gauge_collectors = []
+        self.descriptions = {}
+        self.lock = threading.Lock()
+        self.logger = LoggerManager.get_logger()
+        os.makedirs(self.metrics_folder, exist_ok=True)
+        self.start_snapshot_writer()
+        atexit.register(self.write_snapshot)
+
+    def describe(self, name, metric_type, help_text):
+        """Set the type ('counter', 'histogram' or 'gauge') and help text of a metric."""
+        self.descriptions[name] = (metric_type, help_text)
+
+    def inc(self, name, labels=None, value=1):
+        """
+        Increment a counter.
+
+        Args:
+            name(str): The metric name, without the namespace.
+            labels(dict): (Optional) The metric's labels.
+            value(float): (Optional, default=1) The increment.
+
+        Returns:
+            None
+        """
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        """
+        Record an observation (e.g. a latency, in seconds) in a histogram.
+
+        Args:
+            name(str): The metric name, without the namespace.
+            value(float): The observed value.
+            labels(dict): (Optional) The metric's labels.
+
+        Returns:
+            None
+        """
+        key = (name, tuple(sorted((labels or {}).items())))
+        bucket_index = next((index for index, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bucket_index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def add_gauge_collector(self, collector):
+        """
+        Register a function that is called on every snapshot and returns gauges as a list of (name, labels, value) tuples.
+
+        Args:
+            collector(callable): The collector function; see gauges_from_stats() for building its return value.
+
+        Returns:
+            None
+        """
+        self.gauge_collectors.append(collector)
+
+    def collect_gauges(self):
+        """Call the gauge collectors; a failing collector is logged and skipped."""
+        gauges = []
+        for collector in self.gauge_collectors:
+            try:
+                gauges.extend(collector())
+            except Exception as e:
+                self.logger.warning(f"Metrics gauge collector {getattr(collector, '__name__', collector)} failed: {e}")
+        return gauges
+
+    def snapshot(self):
+        """
+        Take a JSON-serializable snapshot of this process's metrics.
+
+        Returns:
+            A dict of counters, histograms and gauges, each a list of [name, labels, ...] entries.
+        """
+        with self.lock:
+            counters = [[name, dict(labels), value] for (name, labels), value in self.counters.items()]
+            histograms = [[name, dict(labels), list(bucket_counts), total, count] for (name, labels), (bucket_counts, total, count) in self.histograms.items()]
+        gauges = [[name, labels or {}, value] for name, labels, value in self.collect_gauges()]
+        return {'pid': os.getpid(), 'buckets': list(self.buckets), 'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+    def snapshot_path(self, pid):
+        """Return the path of a process's snapshot file."""
+        return os.path.join(self.metrics_folder, f"metrics-{pid}.json")
+
+    def write_snapshot(self):
+        """Atomically replace this process's snapshot file with a fresh snapshot."""
+        snapshot = self.snapshot()
+        temporary_path = self.snapshot_path(snapshot['pid']) + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        os.replace(temporary_path, self.snapshot_path(snapshot['pid']))
+        return snapshot
+
+    def start_snapshot_writer(self):
+        """Start the background snapshot thread; also called in a forked child, where threads do not survive the fork."""
+        self.stop_event = threading.Event()
+        self.snapshot_thread = threading.Thread(target=self.run_snapshot_loop, name='metrics-snapshot', daemon=True)
+        self.snapshot_thread.start()
+
+    def after_fork(self):
+        """
+        Reset the registry in a forked child process: the child starts with empty counters and histograms (the parent's are
+        still reported in the parent's snapshot), a new lock and its own snapshot thread.
+        """
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.start_snapshot_writer()
+
+    def run_snapshot_loop(self):
+        """Background thread target: periodically write this process's snapshot."""
+        while not self.stop_event.wait(self.snapshot_interval_seconds):
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                self.logger.warning(f"Could not write the metrics snapshot: {e}")
+
+    def read_snapshots(self):
+        """
+        Read the snapshots of all processes, using a fresh snapshot for this process.
+
+        Returns:
+            A list of snapshot dicts.
+        """
+        snapshots = [self.write_snapshot()]
+        for path in glob.glob(os.path.join(self.metrics_folder, 'metrics-*.json')):
+            if path == self.snapshot_path(os.getpid()):
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as snapshot_file:
+                    snapshot = json.load(snapshot_file)
+            except (OSError, json.JSONDecodeError):
+                continue # Removed or replaced while being read
+            if snapshot.get('buckets') != list(self.buckets):
+                continue # Written by a deployment with different buckets
+            if not process_is_running(snapshot['pid']):
+                snapshot['gauges'] = []
+            snapshots.append(snapshot)
+        return snapshots
+
+    def render(self):
+        """
+        Render the metrics of all processes in the Prometheus text exposition format.
+
+        Returns:
+            A string.
+        """
+        counters, histograms, gauges = {}, {}, {}
+        for snapshot in self.read_snapshots():
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(sorted(labels.items())))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, bucket_counts, total, count in snapshot['histograms']:
+                key = (name, tuple(sorted(labels.items())))
+                merged = histograms.setdefault(key, [[0] * len(bucket_counts), 0.0, 0])
+                merged[0] = [merged_count + bucket_count for merged_count, bucket_count in zip(merged[0], bucket_counts)]
+                merged[1] += total
+                merged[2] += count
+            for name, labels, value in snapshot['gauges']:
+                gauges[(name, tuple(sorted({**labels, 'pid': str(snapshot['pid'])}.items())))] = value
+        lines = []
+        for metric_type, metrics in [('counter', counters), ('histogram', histograms), ('gauge', gauges)]:
+            for name in sorted({name for name, _ in metrics}):
+                full_name = f"{self.namespace}_{name}"
+                help_text = self.descriptions.get(name, (metric_type, name))[1]
+                lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {metric_type}")
+                for (metric_name, labels), value in sorted(metrics.items(), key=lambda item: item[0]):
+                    if metric_name != name:
+                        continue
+                    if metric_type == 'histogram':
+                        lines.extend(self.render_histogram(full_name, labels, *value))
+                    else:
+                        lines.append(f"{full_name}{format_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def render_histogram(self, full_name, labels, bucket_counts, total, count):
+        """Render a histogram's cumulative buckets, sum and count."""
+        lines = []
+        cumulative_count = 0
+        for bound, bucket_count in zip(list(self.buckets) + ['+Inf'], bucket_counts):
+            cumulative_count += bucket_count
+            lines.append(f"{full_name}_bucket{format_labels(labels + (('le', str(bound)),))} {cumulative_count}")
+        lines.append(f"{full_name}_sum{format_labels(labels)} {total}")
+        lines.append(f"{full_name}_count{format_labels(labels)} {count}")
+        return lines
+
+def format_labels(labels):
+    """Format (name, value) label pairs as a Prometheus label set, escaping the values."""
+    if not labels:
+        return ''
+    escaped_labels = [
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    ]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped_labels) + '}'
+
+def gauges_from_stats(name_prefix, stats, labels=None):
+    """
+    Convert a dict of stats (e.g. from DatastoreManager.get_write_stats()) into gauges for a collector. Numeric stats become
+    '<name_prefix>_<stat>' gauges; string stats (e.g. a circuit breaker state) become '<name_prefix>_<stat>' gauges with a
+    'value' label and a value of 1.
+
+    Args:
+        name_prefix(str): The prefix of the gauge names.
+        stats(dict): The stats.
+        labels(dict): (Optional) Labels added to every gauge.
+
+    Returns:
+        A list of (name, labels, value) tuples.
+    """
+    gauges = []
+    for stat, value in stats.items():
+        if isinstance(value, bool) or isinstance(value, (int, float)):
+            gauges.append((f"{name_prefix}_{stat}", dict(labels or {}), float(value)))
+        elif isinstance(value, str):
+            gauges.append((f"{name_prefix}_{stat}", {**(labels or {}), 'value': value}, 1.0))
+    return gauges
+
+def init_metrics(app, metrics_options):
+    """
+    Create a MetricsRegistry and register Flask request hooks that record per-route latency histograms and status code
+    counts, plus a span observer that records the duration of every traced function and block (e.g. datastore reads and
+    writes, form rendering). Configured under the 'metrics' key of the system config. For example:
+
+        system:
+            metrics:
+                enabled: true
+                metrics_folder: logs/metrics     # Shared by all worker processes; defaults to <log_dir>/metrics
+                snapshot_interval_seconds: 5     # How often each process writes its snapshot
+                scrape_token: <token>            # (Optional) Lets scrapers authenticate with 'Authorization: Bearer <token>'
+
+    Args:
+        app(Flask): The Flask app whose requests are measured.
+        metrics_options(dict): The 'metrics' key of the system config.
+
+    Returns:
+        A MetricsRegistry, or None if metrics are not enabled.
+    """
+    if not metrics_options or not metrics_options.get('enabled'):
+        return None
+    registry = MetricsRegistry(
+        metrics_folder=metrics_options.get('metrics_folder', os.path.join(LoggerManager.log_dir, 'metrics')),
+        snapshot_interval_seconds=metrics_options.get('snapshot_interval_seconds', 5)
+    )
+    registry.describe('http_requests_total', 'counter', 'HTTP requests, by route, method and status code.')
+    registry.describe('http_request_duration_seconds', 'histogram', 'HTTP request latency, by route and method.')
+    registry.describe('span_duration_seconds', 'histogram', 'Duration of traced functions and blocks (datastore operations, form rendering, validations).')
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_request_start_time = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        start_time = g.pop('metrics_request_start_time', None)
+        if start_time is not None:
+            # The URL rule (not the path) keeps the number of label values bounded
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            registry.observe('http_request_duration_seconds', time.perf_counter() - start_time, {'route': route, 'method': request.method})
+            registry.inc('http_requests_total', {'route': route, 'method': request.method, 'status': str(response.status_code)})
+        return response
+
+    span_observers.append(lambda name, duration_seconds: registry.observe('span_duration_seconds', duration_seconds, {'span': name}))
+    return registry
@@ -0,0 +1,155 @@
+import cProfile
+import glob
+import hmac
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from flask import g, request
+
+from loggers.managers import LoggerManager
+
+# The request header that asks for a request to be profiled; its value must be the configured header_secret
+PROFILE_HEADER = 'X-Profile-Request'
+
+class RequestProfiler:
+    """
+    Profiles individual requests with cProfile and writes each profile to a folder (by default, <log_dir>/profiles), so that
+    hot spots can be captured from real traffic without redeploying. A request is profiled if it carries the PROFILE_HEADER
+    header with the configured secret, or if it is picked by the sampling rate.
+
+    For each profiled request, two files named after the time, route, duration and process are written:
+
+        1. A .prof file with the raw cProfile stats (open with pstats, snakeviz etc.).
+        2. A .txt summary with the top functions by cumulative time and, for routes configured in trace_memory_routes, the
+           peak memory allocated during the request and its top allocation sites (from tracemalloc).
+
+    tracemalloc is process-wide and slows down every thread while it runs, so only one request at a time is memory-profiled.
+
+    Attributes:
+        header_secret(str): The secret that the PROFILE_HEADER header must carry, or None to disable header-triggered profiles.
+        sample_rate(float): The fraction of requests profiled at random.
+        profile_folder(str): The folder the profiles are written to.
+        trace_memory_routes(list): The URL rules of routes whose memory allocations are also traced.
+        max_profiles(int): The number of most recent profiles kept; older ones are deleted.
+        top_functions(int): The number of functions (and allocation sites) listed in the summaries.
+    """
+    def __init__(self, profiling_options):
+        self.header_secret = profiling_options.get('header_secret')
+        self.sample_rate = profiling_options.get('sample_rate', 0.0)
+        self.profile_folder = profiling_options.get('profile_folder', os.path.join(LoggerManager.log_dir, 'profiles'))
+        self.trace_memory_routes = profiling_options.get('trace_memory_routes', ['/dashboard', '/upload'])
+        self.max_profiles = profiling_options.get('max_profiles', 200)
+        self.top_functions = profiling_options.get('top_functions', 40)
+        self.memory_lock = threading.Lock()
+        self.logger = LoggerManager.get_logger()
+        os.makedirs(self.profile_folder, exist_ok=True)
+
+    def should_profile(self):
+        """Decide whether the current request is profiled."""
+        header_value = request.headers.get(PROFILE_HEADER)
+        if header_value and self.header_secret and hmac.compare_digest(header_value, self.header_secret):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self):
+        """Start profiling the current request (a before_request hook)."""
+        if not self.should_profile():
+            return
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.request_profile = {'route': route, 'memory_traced': False, 'start_time': time.perf_counter()}
+        if route in self.trace_memory_routes and not tracemalloc.is_tracing() and self.memory_lock.acquire(blocking=False):
+            tracemalloc.start()
+            g.request_profile['memory_traced'] = True
+        profiler = cProfile.Profile()
+        g.request_profile['profiler'] = profiler
+        profiler.enable()
+
+    def finish(self, exception):
+        """Stop profiling the current request and write its profile (a teardown_request hook)."""
+        request_profile = g.pop('request_profile', None)
+        if request_profile is None:
+            return
+        request_profile['profiler'].disable()
+        duration_ms = (time.perf_counter() - request_profile['start_time']) * 1000
+        memory_summary = None
+        if request_profile['memory_traced']:
+            try:
+                peak_bytes = tracemalloc.get_traced_memory()[1]
+                top_allocations = tracemalloc.take_snapshot().statistics('lineno')[:self.top_functions]
+                memory_summary = [f"Peak traced memory: {peak_bytes / 1024 / 1024:.2f} MiB", 'Top allocation sites:']
+                memory_summary.extend(str(statistic) for statistic in top_allocations)
+            finally:
+                tracemalloc.stop()
+                self.memory_lock.release()
+        try:
+            self.write_profile(request_profile, duration_ms, memory_summary)
+        except OSError as e:
+            self.logger.warning(f"Could not write the profile of {request_profile['route']}: {e}")
+
+    def write_profile(self, request_profile, duration_ms, memory_summary):
+        """
+        Write a request's .prof file and .txt summary, and delete the oldest profiles beyond max_profiles.
+
+        Args:
+            request_profile(dict): The profiling state of the request.
+            duration_ms(float): The duration of the request, in milliseconds.
+            memory_summary(list): The lines of the memory summary, or None if memory was not traced.
+
+        Returns:
+            None
+        """
+        route_name = re.sub(r'[^A-Za-z0-9_-]+', '_', request_profile['route']).strip('_') or 'root'
+        file_stem = os.path.join(
+            self.profile_folder,
+            f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{route_name}-{duration_ms:.0f}ms-{os.getpid()}"
+        )
+        request_profile['profiler'].dump_stats(f"{file_stem}.prof")
+        summary = io.StringIO()
+        summary.write(f"{request.method} {request.path} ({request_profile['route']}) took {duration_ms:.1f} ms\n\n")
+        pstats.Stats(request_profile['profiler'], stream=summary).sort_stats('cumulative').print_stats(self.top_functions)
+        if memory_summary:
+            summary.write('\n'.join(memory_summary) + '\n')
+        with open(f"{file_stem}.txt", 'w', encoding='utf-8') as summary_file:
+            summary_file.write(summary.getvalue())
+        self.logger.info(f"Profiled {request.method} {request.path} ({duration_ms:.1f} ms) to {file_stem}.prof")
+        profile_paths = sorted(glob.glob(os.path.join(self.profile_folder, '*.prof')))
+        for old_profile_path in profile_paths[:-self.max_profiles] if self.max_profiles else []:
+            for path in [old_profile_path, old_profile_path[:-len('.prof')] + '.txt']:
+                if os.path.exists(path):
+                    os.remove(path)
+
+def init_request_profiling(app, profiling_options):
+    """
+    Register Flask request hooks that profile requests on demand. Configured under the 'profiling' key of the system config.
+    For example:
+
+        system:
+            profiling:
+                enabled: true
+                header_secret: <secret>       # Requests with an 'X-Profile-Request: <secret>' header are profiled
+                sample_rate: 0.0              # Fraction of all requests profiled at random
+                profile_folder: logs/profiles # Defaults to <log_dir>/profiles
+                trace_memory_routes:          # Routes whose peak memory and allocation sites are also recorded
+                    - /dashboard
+                    - /upload
+                max_profiles: 200             # Most recent profiles kept
+
+    Args:
+        app(Flask): The Flask app whose requests are profiled.
+        profiling_options(dict): The 'profiling' key of the system config.
+
+    Returns:
+        The RequestProfiler, or None if profiling is not enabled.
+    """
+    if not profiling_options or not profiling_options.get('enabled'):
+        return None
+    profiler = RequestProfiler(profiling_options)
+    app.before_request(profiler.start)
+    app.teardown_request(profiler.finish)
+    return profiler
@@ -0,0 +1,175 @@
+import contextvars
+import functools
+import inspect
+import json
+import random
+import time
+from contextlib import contextmanager
+from flask import g, request
+
+from loggers.managers import LoggerManager
+
+# The trace of the request being handled in the current context, or None if it is not being traced
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+# Functions called with (span name, duration in seconds) for every span, traced request or not (e.g. to record metrics)
+span_observers = []
+
+class RequestTrace:
+    """
+    The timings of a single request: the total duration, and the time spent in each named span. Spans with the same name
+    (e.g. repeated reads) are accumulated, and nested spans are named by their path, e.g. 'add_data/upsert_data'.
+
+    Attributes:
+        method(str): The HTTP method of the request.
+        path(str): The path of the request.
+        start_time(float): The time the request started, from time.perf_counter().
+        spans(dict): The total duration (in seconds) and count of each span, by name.
+        span_stack(list): The names of the spans that are currently open.
+        status_code(int): The status code of the response, once known.
+    """
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.start_time = time.perf_counter()
+        self.spans = {}
+        self.span_stack = []
+        self.status_code = None
+
+    def record_span(self, name, duration_seconds):
+        """Add a span's duration to the total for its name."""
+        span = self.spans.setdefault(name, [0.0, 0])
+        span[0] += duration_seconds
+        span[1] += 1
+
+    def to_dict(self):
+        """
+        Summarize the trace for the timing log line.
+
+        Returns:
+            A JSON-serializable dict, with durations in milliseconds.
+        """
+        return {
+            'event': 'request_timing',
+            'method': self.method,
+            'path': self.path,
+            'status': self.status_code,
+            'duration_ms': round((time.perf_counter() - self.start_time) * 1000, 3),
+            'spans': {
+                name: {'ms': round(duration_seconds * 1000, 3), 'count': count}
+                for name, (duration_seconds, count) in self.spans.items()
+            },
+        }
+
+@contextmanager
+def trace_span(name):
+    """
+    Time the enclosed block as a named span of the current request's trace, and pass its duration to any span observers.
+    Outside of a traced request and without span observers, this only costs a context variable lookup.
+
+    Args:
+        name(str): The name of the span.
+
+    Usage:
+        >>> with trace_span('ip_info_check'):
+        ...     ip_info = ip_info_check(ip_address, form_validation_options)
+    """
+    trace = current_trace.get()
+    if trace is None and not span_observers:
+        yield
+        return
+    if trace is not None:
+        trace.span_stack.append(name)
+        span_name = '/'.join(trace.span_stack)
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_seconds = time.perf_counter() - start_time
+        if trace is not None:
+            trace.record_span(span_name, duration_seconds)
+            trace.span_stack.pop()
+        for observer in span_observers:
+            observer(name, duration_seconds)
+
+def traced(name=None):
+    """
+    Decorator that times every call of a function as a span of the current request's trace (see trace_span()).
+
+    Args:
+        name(str): (Optional) The name of the span; defaults to the function's name.
+
+    Usage:
+        >>> @traced()
+        ... def upsert_data(self, submission_data):
+        ...     ...
+    """
+    def decorator(function):
+        span_name = name or function.__name__
+        if inspect.iscoroutinefunction(function):
+            # Coroutine functions (e.g. of the async serving mode) are timed until they complete, not until they are created
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                if current_trace.get() is None and not span_observers:
+                    return await function(*args, **kwargs)
+                with trace_span(span_name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if current_trace.get() is None and not span_observers:
+                return function(*args, **kwargs)
+            with trace_span(span_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def init_request_tracing(app, tracing_options):
+    """
+    Register Flask request hooks that trace (a sample of) requests and log one structured JSON line with the timings of each
+    traced request. Configured under the 'tracing' key of the system config. For example:
+
+        system:
+            tracing:
+                enabled: true
+                sample_rate: 1.0        # Fraction of requests traced
+                min_duration_ms: 0      # Only log requests that took at least this long
+
+    Args:
+        app(Flask): The Flask app whose requests are traced.
+        tracing_options(dict): The 'tracing' key of the system config.
+
+    Returns:
+        None
+    """
+    if not tracing_options or not tracing_options.get('enabled'):
+        return
+    logger = LoggerManager.get_logger()
+    sample_rate = tracing_options.get('sample_rate', 1.0)
+    min_duration_ms = tracing_options.get('min_duration_ms', 0)
+
+    @app.before_request
+    def start_request_trace():
+        if sample_rate < 1.0 and random.random() >= sample_rate:
+            return
+        g.request_trace_token = current_trace.set(RequestTrace(request.method, request.path))
+
+    @app.after_request
+    def record_response_status(response):
+        trace = current_trace.get()
+        if trace is not None:
+            trace.status_code = response.status_code
+        return response
+
+    @app.teardown_request
+    def emit_request_trace(exception):
+        trace = current_trace.get()
+        token = g.pop('request_trace_token', None)
+        if trace is None or token is None:
+            return
+        current_trace.reset(token)
+        if exception is not None:
+            trace.status_code = 500
+        timing = trace.to_dict()
+        if timing['duration_ms'] >= min_duration_ms:
+            logger.info(json.dumps(timing))
@@ -2,7 +2,12 @@
 
 let currentStep = 1;
 const totalSteps = 5;
+const autosaveDelayMs = 2000; // Wait for this long after the last edit before autosaving
+const autosaveIgnoredFields = ['form_load_time', 'session_id_form_field', '_name'];
+let dirtyFields = {}; // Fields edited since the last autosave, by name
+let autosaveTimer = null;
 showPage(currentStep);
+trackFormChanges();
 var tooltipTriggerList = [].slice.call(document.querySelectorAll('[data-bs-toggle="tooltip"]'));
 var tooltipList = tooltipTriggerList.map(function (tooltipTriggerEl) {
     return new bootstrap.Tooltip(tooltipTriggerEl, { trigger: 'manual' });
@@ -93,6 +98,8 @@ function loadFormData() {
     }
     // If the field has an ID
     else {
+        // Save pending edits under the current session ID before switching to the restored one
+        autosaveDraft();
         fetch("/load_form_data", {
             method: "POST",
             headers: { "Content-Type": "application/json" },
@@ -138,10 +145,55 @@ function populateFormFields(form_data) {
         }
     }
 };
+function trackFormChanges() {
+    /** Record edited fields and schedule an autosave; the form is only fully sent on submission. */
+    const form = document.getElementById('info-multistep');
+    if (!form) return;
+    const markDirty = (event) => {
+        const field = event.target;
+        if (!field.name || autosaveIgnoredFields.includes(field.name)) return;
+        dirtyFields[field.name] = field.value;
+        clearTimeout(autosaveTimer);
+        autosaveTimer = setTimeout(autosaveDraft, autosaveDelayMs);
+    };
+    form.addEventListener('input', markDirty);
+    form.addEventListener('change', markDirty);
+    // A submission writes every field, so pending edits do not need to be autosaved
+    form.addEventListener('submit', () => {
+        clearTimeout(autosaveTimer);
+        dirtyFields = {};
+    });
+    // Save pending edits if the page is being hidden (e.g. the tab is closed); keepalive lets the request outlive the page
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'hidden') autosaveDraft(true);
+    });
+}
+function autosaveDraft(keepalive = false) {
+    /** Send only the fields edited since the last autosave. Edits in a failed autosave are retried with the next one. */
+    clearTimeout(autosaveTimer);
+    const fields = dirtyFields;
+    if (Object.keys(fields).length === 0) return;
+    dirtyFields = {};
+    fetch("/autosave", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ session_id: document.getElementById("session_id_generated").value, fields: fields }),
+        keepalive: keepalive
+    })
+    .then(response => {
+        if (!response.ok) throw new Error(`Autosave failed with status ${response.status}`);
+    })
+    .catch(err => {
+        console.error("Error autosaving form data:", err);
+        // Keep any newer edits of the same fields
+        dirtyFields = { ...fields, ...dirtyFields };
+    });
+}
 function downloadFile(format) {
+    const includeArchive = document.getElementById("includeArchive");
     fetch("/dashboard", {
         method: "POST",
-        body: JSON.stringify({ format: format }),
+        body: JSON.stringify({ format: format, include_archive: includeArchive ? includeArchive.checked : false }),
         headers: {
             "Content-Type": "application/json"
         }
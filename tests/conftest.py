@@ -0,0 +1,61 @@
+import os
+import pandas as pd
+import pytest
+from flask import Flask
+
+from benchmarks.common import benchmark_config
+from datamodels.managers import DatastoreManager
+from loggers.managers import LoggerManager
+
+FORM_CONFIG_FILE_NAME = 'form.xlsx'
+
+@pytest.fixture(scope='session', autouse=True)
+def logger(tmp_path_factory):
+    """Configure the singleton logger once per test session, logging warnings only."""
+    return LoggerManager.get_logger(benchmark_config(str(tmp_path_factory.mktemp('logging')), FORM_CONFIG_FILE_NAME))
+
+@pytest.fixture
+def form_config_folder(tmp_path):
+    """Write a form configuration sheet with a 'select' field (industry) and an INTEGER field (age), and return its folder."""
+    pages = pd.DataFrame({'page_number': [1], 'page_title': ['Applicant'], 'page_description': ['About you']})
+    fields = pd.DataFrame({
+        'backend_field_name': ['industry', 'age'],
+        'field_label': ['Industry', 'Age'],
+        'required': ['No', 'No'],
+        'field_type': ['select', 'input'],
+        'data_type': ['STRING', 'INTEGER'],
+        'select_options': ['Retail,Manufacturing,"Services, Other"', None],
+        'page_number': [1, 1],
+        'group_id': [None, None],
+        'max_length': [None, 3],
+    })
+    with pd.ExcelWriter(os.path.join(tmp_path, FORM_CONFIG_FILE_NAME), engine='openpyxl') as writer:
+        pages.to_excel(writer, sheet_name='Pages', index=False)
+        fields.to_excel(writer, sheet_name='Fields', index=False)
+    return str(tmp_path)
+
+@pytest.fixture
+def make_datastore(tmp_path, form_config_folder):
+    """
+    Return a factory for DatastoreManagers backed by a fresh SQLite database in a temporary folder. Keyword arguments are
+    added to the datastore config (e.g. analytics_replica={...}); background threads are stopped after the test.
+    """
+    datastores = []
+
+    def make(**datastore_options):
+        config = benchmark_config(form_config_folder, FORM_CONFIG_FILE_NAME, breakdown_field='industry')
+        config['datastore'] = {
+            'datastore_type': 'sqlite',
+            'datastore_params': {'sqlite_database_file': os.path.join(tmp_path, 'webform.db')},
+            **datastore_options,
+        }
+        datastore = DatastoreManager(Flask(__name__), config)
+        datastore.datastore.engine.echo = False
+        datastores.append(datastore)
+        return datastore
+
+    yield make
+    for datastore in datastores:
+        for component in [datastore.analytics_replica, datastore.resilient_writer]:
+            if component is not None:
+                component.stop_event.set()
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+@pytest.fixture
+def datastore(tmp_path, make_datastore):
+    return make_datastore(analytics_replica={
+        'replica_folder': str(tmp_path / 'analytics_replica'),
+        # Sync explicitly rather than on the background thread
+        'sync_interval_seconds': 3600,
+        'max_staleness_seconds': 3600,
+        'sync_overlap_seconds': 1,
+    })
+
+def submission(id, timestamp=None, **fields):
+    return {'id': id, 'timestamp': timestamp or datetime.now(), **fields}
+
+def replica_rows(datastore):
+    df = datastore.analytics_replica.query()
+    return dict(zip(df['id'], df['industry']))
+
+def test_sync_copies_new_and_updated_rows(datastore):
+    replica = datastore.analytics_replica
+    datastore.add_data(submission('a', industry='Retail'))
+    datastore.add_data(submission('b', industry='Retail'))
+    assert replica.sync() == 2
+
+    datastore.add_data(submission('a', industry='Services'))
+    assert replica.sync() == 1
+
+    assert replica_rows(datastore) == {'a': 'Services', 'b': 'Retail'}
+
+def test_idle_sync_copies_nothing(datastore):
+    datastore.add_data(submission('a', industry='Retail'))
+    datastore.analytics_replica.sync()
+
+    assert datastore.analytics_replica.sync() == 0
+
+def test_bulk_uploaded_rows_with_old_timestamps_are_synced(datastore):
+    datastore.add_data(submission('a', industry='Retail'))
+    datastore.analytics_replica.sync()
+    old_timestamp = datetime.now() - timedelta(days=365)
+
+    datastore.add_bulk_data(pd.DataFrame([
+        submission('b', old_timestamp, industry='Manufacturing'),
+        # A re-uploaded export carries the 'written_at' of its source, which must not be written back
+        {**submission('c', old_timestamp, industry='Services'), 'written_at': old_timestamp},
+    ]))
+
+    assert datastore.analytics_replica.sync() == 2
+    assert replica_rows(datastore) == {'a': 'Retail', 'b': 'Manufacturing', 'c': 'Services'}
+
+def test_replayed_submissions_with_old_timestamps_are_synced(datastore):
+    datastore.add_data(submission('a', industry='Retail'))
+    datastore.analytics_replica.sync()
+
+    # As replayed from the write spool after an outage, with the timestamp of the original submission
+    datastore.datastore.upsert_data(submission('b', datetime.now() - timedelta(hours=1), industry='Services'), only_if_newer=True)
+
+    assert datastore.analytics_replica.sync() == 1
+    assert replica_rows(datastore) == {'a': 'Retail', 'b': 'Services'}
+
+def test_reset_copies_rows_written_before_written_at_was_added(datastore):
+    datastore.add_data(submission('a', industry='Retail'))
+    with datastore.datastore.engine.begin() as connection:
+        connection.execute(text(f"UPDATE {datastore.datastore.table_name} SET written_at = NULL"))
+
+    datastore.analytics_replica.reset()
+
+    assert replica_rows(datastore) == {'a': 'Retail'}
+    assert datastore.analytics_replica.sync() == 0
+
+def test_sync_deletions_drops_rows_deleted_from_the_datastore(datastore):
+    datastore.add_data(submission('a', industry='Retail'))
+    datastore.add_data(submission('b', industry='Retail'))
+    datastore.analytics_replica.sync()
+    with datastore.datastore.engine.begin() as connection:
+        connection.execute(text(f"DELETE FROM {datastore.datastore.table_name} WHERE id = 'a'"))
+
+    assert datastore.analytics_replica.sync_deletions() == 1
+    assert replica_rows(datastore) == {'b': 'Retail'}
+
+def test_analytical_reads_and_aggregations_are_served_by_the_replica(datastore):
+    datastore.add_data(submission('a', industry='Retail'))
+    datastore.add_data(submission('b', industry='Retail'))
+    datastore.analytics_replica.sync()
+
+    aggregated_df = datastore.read_aggregated_data(group_by_field='industry', aggregation_function='count', aggregation_field='id')
+
+    assert sorted(datastore.read_data(analytical=True)['id']) == ['a', 'b']
+    assert aggregated_df.set_index('grouping')['aggregation'].to_dict() == {'Retail': 2}
+
+def test_aggregations_of_an_empty_replica_have_grouping_and_aggregation_columns(datastore):
+    aggregated_df = datastore.read_aggregated_data(group_by_field='industry', aggregation_function='count', aggregation_field='id')
+
+    assert aggregated_df.empty
+    assert list(aggregated_df.columns) == ['grouping', 'aggregation']
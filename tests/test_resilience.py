@@ -0,0 +1,185 @@
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from datamodels.resilience import ResilientWriter, WriteSpool
+
+START_TIME = datetime(2025, 1, 1, 12, 0)
+
+class FakeDatastore:
+    """Records upserted submissions; raises the queued errors on the next writes."""
+    def __init__(self):
+        self.rows = {}
+        self.errors = []
+
+    def upsert_data(self, submission_data, only_if_newer=False):
+        if self.errors:
+            raise self.errors.pop(0)
+        existing_row = self.rows.get(submission_data['id'])
+        if only_if_newer and existing_row and existing_row['timestamp'] >= submission_data['timestamp']:
+            return
+        self.rows[submission_data['id']] = submission_data
+
+def submission(id, minutes=0, **fields):
+    return {'id': id, 'timestamp': START_TIME + timedelta(minutes=minutes), **fields}
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+def write_spool_file(spool_folder, pid, submissions):
+    spool_path = os.path.join(spool_folder, f"spool-{pid}.jsonl")
+    with open(spool_path, 'w', encoding='utf-8') as spool_file:
+        for submission_data in submissions:
+            spool_file.write(json.dumps(submission_data, default=str) + '\n')
+    return spool_path
+
+@pytest.fixture
+def spool(tmp_path):
+    return WriteSpool(str(tmp_path / 'spool'))
+
+@pytest.fixture
+def make_writer(tmp_path):
+    """Return a factory for ResilientWriters whose replayer has stopped after its initial spool scan."""
+    def make(datastore, **resilience_options):
+        writer = ResilientWriter(datastore, {'spool_folder': str(tmp_path / 'spool'), 'failure_threshold': 2, **resilience_options})
+        writer.stop_event.set()
+        writer.replayer_thread.join()
+        return writer
+    return make
+
+def test_replay_writes_spooled_submissions_in_order(spool):
+    written_ids = []
+    for id in ['a', 'b', 'c']:
+        spool.append(submission(id))
+
+    assert spool.replay(lambda submission_data: written_ids.append(submission_data['id'])) == 3
+    assert written_ids == ['a', 'b', 'c']
+    assert os.path.getsize(spool.spool_path) == 0
+    assert spool.pending_bytes() == 0
+
+def test_replay_resumes_after_a_retryable_error(spool):
+    for id in ['a', 'b', 'c']:
+        spool.append(submission(id))
+    replay_calls = []
+
+    def write(submission_data):
+        replay_calls.append(submission_data['id'])
+        if replay_calls == ['a', 'b']:
+            raise ConnectionError('down')
+
+    with pytest.raises(ConnectionError):
+        spool.replay(write)
+    assert spool.pending_bytes() > 0
+    spool.replay(write)
+
+    # 'a' was not replayed twice: the offset was persisted after it
+    assert replay_calls == ['a', 'b', 'b', 'c']
+    assert spool.pending_bytes() == 0
+
+def test_submissions_that_can_never_be_written_are_dead_lettered(spool):
+    written_ids = []
+    for id in ['a', 'bad', 'c']:
+        spool.append(submission(id))
+
+    def write(submission_data):
+        if submission_data['id'] == 'bad':
+            raise IntegrityError('INSERT', {}, Exception('constraint failed'))
+        written_ids.append(submission_data['id'])
+
+    spool.replay(write)
+
+    assert written_ids == ['a', 'c']
+    with open(spool.dead_letter_path, encoding='utf-8') as dead_letter_file:
+        dead_letters = [json.loads(line) for line in dead_letter_file]
+    assert [dead_letter['submission']['id'] for dead_letter in dead_letters] == ['bad']
+    assert dead_letters[0]['error'].startswith('IntegrityError')
+    assert spool.stats == {'spooled': 3, 'replayed': 2, 'dead_lettered': 1}
+
+def test_spool_files_of_exited_processes_are_claimed(spool):
+    orphaned_path = write_spool_file(spool.spool_folder, exited_pid(), [submission('orphaned')])
+    live_path = write_spool_file(spool.spool_folder, os.getppid(), [submission('live')])
+    written_ids = []
+
+    spool.replay(lambda submission_data: written_ids.append(submission_data['id']))
+
+    assert written_ids == ['orphaned']
+    assert not os.path.exists(orphaned_path)
+    assert os.path.exists(live_path)
+
+def test_failed_writes_are_spooled_and_replayed_in_order(make_writer):
+    datastore = FakeDatastore()
+    writer = make_writer(datastore)
+    datastore.errors = [ConnectionError('down')]
+
+    assert writer.write(submission('a')) is False
+    # Spooled behind the earlier submission without a write attempt, so that the replay preserves their order
+    assert writer.write(submission('b')) is False
+    assert datastore.rows == {}
+    assert writer.backlog
+    assert writer.get_stats()['spool_pending_bytes'] > 0
+
+    assert writer.replay() == 2
+    assert sorted(datastore.rows) == ['a', 'b']
+    assert not writer.backlog
+    assert writer.get_stats()['spool_pending_bytes'] == 0
+
+def test_consecutive_failures_open_the_breaker(make_writer):
+    datastore = FakeDatastore()
+    writer = make_writer(datastore)
+    datastore.errors = [ConnectionError('down'), ConnectionError('down')]
+
+    writer.write(submission('a'))
+    # Replaying the spooled submission fails too: the second consecutive failure
+    writer.replay()
+
+    assert writer.breaker.state == 'open'
+    assert writer.replay() == 0
+    assert datastore.rows == {}
+
+def test_replay_never_overwrites_a_newer_write(make_writer):
+    datastore = FakeDatastore()
+    writer = make_writer(datastore)
+    writer.spool_submission(submission('a', 0, industry='Retail'))
+    datastore.upsert_data(submission('a', 10, industry='Services'))
+
+    writer.replay()
+
+    assert datastore.rows['a']['industry'] == 'Services'
+
+def test_non_retryable_write_errors_are_raised_not_spooled(make_writer):
+    datastore = FakeDatastore()
+    writer = make_writer(datastore)
+    datastore.errors = [IntegrityError('INSERT', {}, Exception('constraint failed'))]
+
+    with pytest.raises(IntegrityError):
+        writer.write(submission('a'))
+    assert not writer.backlog
+    assert writer.breaker.state == 'closed'
+
+def test_stats_never_claim_spool_files(make_writer):
+    writer = make_writer(FakeDatastore())
+    orphaned_path = write_spool_file(writer.spool.spool_folder, exited_pid(), [submission('orphaned')])
+
+    assert writer.get_stats()['spool_pending_bytes'] == 0
+    assert os.path.exists(orphaned_path)
+
+    writer.scan_spool()
+    assert not os.path.exists(orphaned_path)
+    assert writer.backlog
+    assert writer.get_stats()['spool_pending_bytes'] > 0
+
+def test_replayer_adopts_spool_files_left_before_startup(make_writer, tmp_path):
+    os.makedirs(tmp_path / 'spool')
+    write_spool_file(str(tmp_path / 'spool'), exited_pid(), [submission('orphaned')])
+    datastore = FakeDatastore()
+
+    writer = make_writer(datastore)
+
+    assert sorted(datastore.rows) == ['orphaned']
+    assert not writer.backlog
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import Column, DateTime, String, create_engine, text
+from sqlalchemy.orm import declarative_base
+
+from datamodels.schema_migrations import OnlineSchemaMigrator
+
+Base = declarative_base()
+
+class Submission(Base):
+    __tablename__ = 'submissions'
+    id = Column(String(255), primary_key=True)
+    timestamp = Column(DateTime, nullable=False, index=True)
+    industry = Column(String(255), nullable=True)
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+
+@pytest.fixture
+def migrator(engine):
+    migrator = OnlineSchemaMigrator(engine, Submission)
+    # Plan as if connected to MySQL 8.0
+    migrator._server_version = '8.0.36'
+    return migrator
+
+def create_tables(engine, *table_names):
+    with engine.begin() as connection:
+        for table_name in table_names:
+            connection.execute(text(f"CREATE TABLE {table_name} (id VARCHAR(255) PRIMARY KEY, timestamp DATETIME NOT NULL, industry VARCHAR(255))"))
+
+def insert_rows(engine, table_name, rows):
+    with engine.begin() as connection:
+        connection.execute(text(f"INSERT INTO {table_name} (id, timestamp, industry) VALUES (:id, :timestamp, :industry)"), rows)
+
+def read_rows(engine, table_name):
+    with engine.connect() as connection:
+        return {row.id: row.industry for row in connection.execute(text(f"SELECT id, industry FROM {table_name}"))}
+
+def test_catch_up_copies_rows_written_since_the_backfill_started(engine, migrator):
+    create_tables(engine, 'submissions', 'shadow')
+    copy_started_at = datetime(2025, 1, 1, 12, 0)
+    before, after = copy_started_at - timedelta(minutes=1), copy_started_at + timedelta(minutes=1)
+    # Backfilled rows; 'resubmitted' was then written to the shadow table directly (e.g. after the swap)
+    insert_rows(engine, 'shadow', [
+        {'id': 'unchanged', 'timestamp': before, 'industry': 'Retail'},
+        {'id': 'updated', 'timestamp': before, 'industry': 'Retail'},
+        {'id': 'resubmitted', 'timestamp': after + timedelta(minutes=1), 'industry': 'Services'},
+    ])
+    insert_rows(engine, 'submissions', [
+        {'id': 'unchanged', 'timestamp': before, 'industry': 'Retail'},
+        {'id': 'updated', 'timestamp': after, 'industry': 'Manufacturing'},
+        {'id': 'resubmitted', 'timestamp': after, 'industry': 'Retail'},
+        {'id': 'inserted', 'timestamp': after, 'industry': 'Retail'},
+        {'id': 'missed_by_backfill', 'timestamp': before, 'industry': 'Retail'},
+    ])
+
+    migrator.catch_up(migrator.qualified_name('shadow'), migrator.qualified_name('submissions'), 'id, timestamp, industry', since=copy_started_at)
+
+    assert read_rows(engine, 'shadow') == {
+        'unchanged': 'Retail',
+        'updated': 'Manufacturing',
+        'resubmitted': 'Services',
+        'inserted': 'Retail',
+    }
+
+def test_catch_up_is_idempotent(engine, migrator):
+    create_tables(engine, 'submissions', 'shadow')
+    since = datetime(2025, 1, 1)
+    insert_rows(engine, 'submissions', [{'id': 'a', 'timestamp': since, 'industry': 'Retail'}])
+
+    for _ in range(2):
+        migrator.catch_up('shadow', 'submissions', 'id, timestamp, industry', since=since)
+
+    assert read_rows(engine, 'shadow') == {'a': 'Retail'}
+
+def test_plan_adds_missing_columns_and_indexes(engine, migrator):
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE submissions (id VARCHAR(255) PRIMARY KEY, timestamp DATETIME NOT NULL)"))
+
+    changes = migrator.plan()
+
+    assert [(change['operation'], change['target']) for change in changes] == [
+        ('add_column', 'industry'),
+        ('add_index', 'ix_submissions_timestamp'),
+    ]
+    assert changes[0]['algorithms'] == ['INSTANT', 'INPLACE']
+    assert changes[1]['algorithms'] == ['INPLACE']
+
+def test_plan_is_empty_for_a_missing_table(migrator):
+    assert migrator.plan() == []
+
+@pytest.mark.parametrize('server_version, operation, algorithms', [
+    ('8.0.36', 'add_column', ['INSTANT', 'INPLACE']),
+    ('8.0.36', 'add_index', ['INPLACE']),
+    ('8.0.36', 'extend_enum', ['INSTANT', 'INPLACE']),
+    ('8.0.36', 'modify_column', []),
+    ('5.7.44', 'add_column', ['INPLACE']),
+    ('10.2.44-MariaDB', 'add_column', ['INPLACE']),
+    ('10.6.16-MariaDB', 'add_column', ['INSTANT', 'INPLACE']),
+])
+def test_supported_algorithms(migrator, server_version, operation, algorithms):
+    migrator._server_version = server_version
+    assert migrator.supported_algorithms(operation) == algorithms
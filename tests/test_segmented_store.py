@@ -0,0 +1,160 @@
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from datamodels.segmented_store import SegmentedLocalDatastore, aggregate_dataframe
+
+START_TIME = datetime(2025, 1, 1, 12, 0)
+
+def make_store(store_folder, memtable_max_rows=2):
+    config = {
+        'general': {'websafe_session_id_size': 16},
+        'datastore': {
+            'datastore_type': 'local',
+            'datastore_params': {
+                'local_store_folder': str(store_folder),
+                'memtable_max_rows': memtable_max_rows,
+                'compaction_interval_seconds': 3600,
+            },
+        },
+    }
+    return SegmentedLocalDatastore(None, config)
+
+@pytest.fixture
+def store(tmp_path):
+    store = make_store(tmp_path / 'local_store')
+    yield store
+    store.stop_event.set()
+
+def submission(id, minutes, **fields):
+    return {'id': id, 'timestamp': START_TIME + timedelta(minutes=minutes), **fields}
+
+def write_three_segments(store):
+    """Write 'a' three times, flushing a segment (of two rows) after each of the first two writes."""
+    store.upsert_data(submission('a', 0, industry='Retail'))
+    store.upsert_data(submission('b', 1, industry='Retail'))
+    store.upsert_data(submission('a', 2, industry='Manufacturing'))
+    store.upsert_data(submission('c', 3, industry='Retail'))
+    store.upsert_data(submission('a', 4, industry='Services'))
+
+def test_reads_are_last_write_wins_across_segments(store):
+    write_three_segments(store)
+
+    assert len(store.segments) == 2
+    assert store.get_record('a')['industry'] == 'Services'
+    df = store.query()
+    assert sorted(df['id']) == ['a', 'b', 'c']
+    assert df.set_index('id').loc['a', 'industry'] == 'Services'
+
+def test_upsert_merges_partial_submissions(store):
+    store.upsert_data(submission('a', 0, industry='Retail'))
+    store.upsert_data(submission('b', 1))
+    store.upsert_data(submission('a', 2, age=42))
+
+    assert store.get_record('a') | {'timestamp': None} == {'id': 'a', 'timestamp': None, 'industry': 'Retail', 'age': 42}
+
+def test_only_if_newer_keeps_newer_rows(store):
+    store.upsert_data(submission('a', 10, industry='Services'))
+    store.upsert_data(submission('a', 0, industry='Retail'), only_if_newer=True)
+
+    assert store.get_record('a')['industry'] == 'Services'
+
+def test_compaction_merges_segments_and_drops_overwritten_rows(store):
+    write_three_segments(store)
+    store.upsert_data(submission('d', 5))
+
+    store.compact()
+
+    assert len(store.segments) == 1
+    segment_df = pq.read_table(store.segment_path(store.segments[0])).to_pandas()
+    assert sorted(segment_df['id']) == ['a', 'b', 'c', 'd']
+    assert segment_df.set_index('id').loc['a', 'industry'] == 'Services'
+    assert store.get_record('a')['industry'] == 'Services'
+
+def test_segment_flushed_during_compaction_takes_precedence(store, monkeypatch):
+    write_three_segments(store)
+    store.upsert_data(submission('d', 5))
+    read_segment = store.read_segment
+
+    def read_segment_while_writing(sequence_number, **kwargs):
+        # Overwrite 'b' in a new segment after the compaction listed the segments it merges
+        if not hasattr(store, 'written_during_compaction'):
+            store.written_during_compaction = True
+            store.upsert_data(submission('b', 6, industry='Services'))
+            store.upsert_data(submission('e', 7))
+        return read_segment(sequence_number, **kwargs)
+
+    monkeypatch.setattr(store, 'read_segment', read_segment_while_writing)
+    store.compact()
+    monkeypatch.undo()
+
+    assert len(store.segments) == 2
+    assert store.get_record('b')['industry'] == 'Services'
+    assert sorted(store.query()['id']) == ['a', 'b', 'c', 'd', 'e']
+
+def test_buffered_submissions_are_replayed_from_the_wal(tmp_path):
+    store = make_store(tmp_path / 'local_store', memtable_max_rows=100)
+    store.upsert_data(submission('a', 0, industry='Retail'))
+    store.stop_event.set()
+
+    # Reopen the folder without closing the store, as after a crash
+    reopened_store = make_store(tmp_path / 'local_store', memtable_max_rows=100)
+    reopened_store.stop_event.set()
+
+    assert reopened_store.get_record('a')['industry'] == 'Retail'
+    assert reopened_store.segments == []
+
+def test_delete_records_removes_rows_from_reads_and_segments(store):
+    write_three_segments(store)
+
+    store.delete_records(['a', 'b'])
+
+    assert store.get_record('a') is None
+    assert sorted(store.query()['id']) == ['c']
+    assert [sorted(pq.read_table(store.segment_path(sequence_number)).to_pandas()['id']) for sequence_number in store.segments] == [['c']]
+
+def test_aggregations_count_the_latest_rows(store):
+    write_three_segments(store)
+
+    df = store.query_aggregated_data(group_by_field='industry', aggregation_function='count', aggregation_field='id')
+
+    assert df.set_index('grouping')['aggregation'].to_dict() == {'Retail': 2, 'Services': 1}
+
+@pytest.mark.parametrize('aggregation_function', ['count', 'median'])
+def test_empty_aggregations_have_grouping_and_aggregation_columns(store, aggregation_function):
+    df = store.query_aggregated_data(group_by_field='timestamp', aggregation_function=aggregation_function, aggregation_field='id')
+
+    assert df.empty
+    assert list(df.columns) == ['grouping', 'aggregation']
+
+def test_aggregate_dataframe_of_missing_fields_is_empty():
+    df = aggregate_dataframe(pd.DataFrame({'id': ['a']}), 'industry', 'count', 'id')
+
+    assert df.empty
+    assert list(df.columns) == ['grouping', 'aggregation']
+
+def test_store_cannot_be_opened_by_a_second_process(store):
+    script = (
+        "import sys\n"
+        "from benchmarks.common import benchmark_config\n"
+        "from loggers.managers import LoggerManager\n"
+        "from tests.test_segmented_store import make_store\n"
+        "LoggerManager.get_logger(benchmark_config(sys.argv[2], 'form.xlsx'))\n"
+        "make_store(sys.argv[1])\n"
+    )
+    repository_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, '-c', script, store.store_folder, os.path.dirname(store.store_folder)],
+        cwd=repository_folder, capture_output=True, text=True
+    )
+
+    assert result.returncode != 0
+    assert 'already open in another process' in result.stderr
+
+def test_forked_processes_refuse_the_store(store):
+    with pytest.raises(RuntimeError, match='cannot be served by forked worker processes'):
+        store.after_fork()
@@ -14,20 +14,71 @@ When contributing to this module, ensure to write proper Google-style docstrings
 """
 
 from flask import request, redirect, url_for, send_file, flash
+from flask.json.provider import DefaultJSONProvider
 from functools import wraps
 from flask_login import UserMixin, current_user, login_required
-from bs4 import BeautifulSoup
+from importlib import import_module
+from threading import Lock
 import os
-import hashlib
 import secrets
-import requests
-import ipinfo
-import pandas as pd
 import yaml
 import io
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from loggers.managers import LoggerManager
 
+class LazyModule:
+    """
+    A stand-in for a module that is imported on first attribute access, e.g. ``pd = LazyModule('pandas')``. Used for heavy
+    libraries (pandas, requests, ipinfo) that are only needed by some routes (uploads, exports, the dashboard, reminder emails),
+    so that importing the app and serving the form does not pay for them. Attributes are cached on the proxy once resolved.
+
+    Args:
+        module_name(str): The fully qualified name of the module to import.
+    """
+    def __init__(self, module_name):
+        self.__dict__['module_name'] = module_name
+        self.__dict__['module'] = None
+        self.__dict__['import_lock'] = Lock()
+
+    def load(self):
+        """Import (once) and return the underlying module."""
+        if self.module is None:
+            with self.import_lock:
+                if self.module is None:
+                    self.__dict__['module'] = import_module(self.module_name)
+        return self.module
+
+    def __getattr__(self, name):
+        value = getattr(self.load(), name)
+        self.__dict__[name] = value
+        return value
+
+    def __setattr__(self, name, value):
+        setattr(self.load(), name, value)
+        self.__dict__[name] = value
+
+    def __repr__(self):
+        state = 'loaded' if self.module is not None else 'not yet loaded'
+        return f"<LazyModule '{self.module_name}' ({state})>"
+
+pd = LazyModule('pandas')
+requests = LazyModule('requests')
+ipinfo = LazyModule('ipinfo')
+aiohttp = LazyModule('aiohttp')
+
+# The deprecated form scraping helpers now live in formbuilder.scraping (which imports BeautifulSoup); they are still
+# importable from here for backwards compatibility.
+DEPRECATED_SCRAPING_HELPERS = ('scrape_form_content', 'generate_html_table_using_form_content_html')
+
+def __getattr__(name):
+    if name in DEPRECATED_SCRAPING_HELPERS:
+        return getattr(import_module('formbuilder.scraping'), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 class User(UserMixin):
     def __init__(self, username, password, role, display_name):
         self.id = username
@@ -67,6 +118,30 @@ class User(UserMixin):
         """Determines if the user is anonymous; this is not supported."""
         return False
 
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that serializes responses with orjson, which is several times faster than the standard library's json
+    module and natively handles datetimes (as ISO 8601 strings), dates and numpy values. Anything orjson cannot serialize
+    falls back to Flask's default handling. Parsing is left to the default provider.
+
+    Usage:
+        >>> if orjson is not None:
+        ...     app.json = OrjsonProvider(app)
+    """
+    def orjson_options(self, sort_keys):
+        """Return the orjson option flags to serialize with."""
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        return option | orjson.OPT_SORT_KEYS if sort_keys else option
+
+    def dumps(self, obj, **kwargs):
+        """Serialize obj to a JSON string; keyword arguments other than sort_keys are ignored."""
+        return orjson.dumps(obj, default=self.default, option=self.orjson_options(kwargs.get('sort_keys', self.sort_keys))).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        """Serialize the given arguments as JSON and return a Flask Response with the application/json mimetype."""
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default, option=self.orjson_options(self.sort_keys)), mimetype=self.mimetype)
+
 def parse_user_auth_info_from_config(config):
     user_info = {}
     for user, user_config in config['general']['users'].items():
@@ -97,18 +172,19 @@ def generate_excel_template_from_schema(form_schema):
     output.seek(0)
     return output
 
-def download_datastore_in_specific_format(datastore, target_format):
+def download_datastore_in_specific_format(datastore, target_format, include_archive=False):
     """
     Utility function to download the contents of the specified datastore 
 
     Args:
         datastore(datamodels.DatastoreManager): A DatastoreManager object configured with a backend Datastore.
         target_format(str): One of 'excel', 'parquet', 'json'. Specifies the format in which the datastore's contents should be downloaded. Ensure page JS specifies one of the keys above in any AJAX calls.
+        include_archive(bool): (Optional, default=False) If True, archived submissions are included in the download.
     
     Returns:
         A Flask URL redirect to the dashboard page.
     """
-    df = datastore.read_data()
+    df = datastore.read_data(include_archive=include_archive, analytical=True)
     buffer = io.BytesIO()
     if target_format == 'excel':
         with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
@@ -197,129 +273,6 @@ def generate_websafe_session_id(size=8):
         logger.warning(f"The 'size' parameter provided to the generate_websafe_session_id method is less than {size}. For safety and stability, this value will be ignored and the default value of {size} will be used.")
     return secrets.token_hex(size)
 
-def scrape_form_content(config_dict):
-    """
-    (Deprecated) Utility function to scrape the specified (static) form for field labels, input types and names return them as a dict. This method,
-    while perfectly valid, is not currently in use since forms are now dynamic and cannot be parsed directly from source files. 
-    
-    Args:
-        config_dict(dict): A helper configuration dict containing the following keys:
-            1. form_id: The value of the HTML 'id' element in the <form> definition of the webform
-            2. form_html_file: The name of the source file containing the (static) form HTML
-    
-    Returns:
-        Form content parsed into a JSON document in the following format:
-        [ 
-                {
-                    'field_label': '',
-                    'field_name': '',
-                    'field_type': '',
-                    'input_type': '',
-                    'is_required': '',
-                    'select-options': [
-                        {'backend_value': '', 'display_text': ''},
-                    ]
-                },    
-            ]
-    """
-
-    if 'form_html_file' not in config_dict or 'form_id' not in config_dict:
-        raise RuntimeError("Please ensure that both the 'form_id' and 'form_html_file' keys are specified in the provided config_dict.")
-
-    form_html_file = config_dict['form_html_file']
-    form_id = config_dict['form_id']
-
-    with open(os.path.join('templates',form_html_file),'r') as handle:
-        html_doc = handle.read()
-
-    soup = BeautifulSoup(html_doc, 'html.parser')
-    form = soup.find('form', id=form_id)
-    if not form:
-        raise ValueError(f"Form with ID '{form_id}' not found!")
-
-    form_content = []
-    for label in form.find_all('label'):
-        field_id = label.get('for')
-        input_field = form.find(id=field_id)
-        if input_field:
-            field_info = {
-                'field_label': label.text.strip(),
-                'field_name': input_field.get('name'),
-                'field_type': input_field.name,
-                'input_type': input_field.get('type'),
-                'is_required': True if 'required' in input_field.attrs else False 
-            }
-            if input_field.name == 'select':
-                field_info['select_options'] = [{'display_text': option.text.strip(), 'backend_value': option.get('value')} for option in input_field.find_all('option')]
-            form_content.append(field_info)
-    return form_content
-
-def generate_html_table_using_form_content_html(form_content):
-    """
-    (Deprecated) Utility function to generate and return an HTML table string to neatly display form_content generated by the 
-    scrape_form_content function.
-
-    Args:
-        json_data: A JSON document in the form:
-            [ 
-                {
-                    'field_label': '',
-                    'field_name': '',
-                    'field_type': '',
-                    'input_type': '',
-                    'is_required': '',
-                    'select-options': [
-                        {'backend_value': '', 'display_text': ''},
-                    ]
-                },  
-            ]
-            that is generated using the scrape_form_content function.
-    Returns:
-        An HTML string containing a <table> that contains form information and can be rendered as HTML.
-    """
-
-    html_start="""
-    <!-- Unique MD5 for versioning -->
-    <p class="text-center text-muted">Version: {md5_string}</p>
-    <!-- Form submission table --> 
-    <table class="docs table table-responsive table-hover table-striped table-bordered">
-        <thead>
-            <tr>
-                <th>#</th>
-                <th>Backend Field Name</th>
-                <th>Field Label</th>
-                <th>Required?</th>
-                <th>Field Type</th>
-                <th>Select Options (if applicable)</th>
-            </tr>
-        </thead>
-        <tbody>
-    """
-    html_end="""
-        </tbody>
-    </table>
-    """
-
-    rows = ""
-    for i, field in enumerate(form_content):
-        select_options = []
-        if field.get('select_options'):
-            select_options = [opt['display_text'] for opt in field['select_options']]
-        rows += f"""
-        <tr>
-            <td>{i+1}</td>
-            <td>{field['field_name']}</td>
-            <td>{field['field_label']}</td>
-            <td>{field['is_required']}</td>
-            <td>{field['field_type']}</td>
-            <td>{', '.join(select_options)}</td>
-        </tr>
-        """
-    # Unique string for each version generated, for file versioning
-    md5_string = hashlib.md5(rows.encode()).hexdigest()
-    html_content = html_start.format(md5_string=md5_string) + rows + html_end
-    return html_content
-
 def ip_info_check(ip_address, form_validation_options):
     """
     Utility function to return a set of information fields for the specified IP address.
@@ -350,7 +303,33 @@ def ip_info_check(ip_address, form_validation_options):
         return details
     else:
         logger.warning("An ipinfo access token was not specified under the 'sessiondata' key. Specify a valid token value for the  ipinfo_token key under the sessiondata config, or see docs for ip_info_check().")
-        
+
+async def ip_info_check_async(ip_address, form_validation_options, ipinfo_handler=None):
+    """
+    Async version of ip_info_check(), for the async serving mode: the lookup is made with IPInfo's aiohttp-based handler, so
+    that the worker serves other requests while it waits on the IPInfo service.
+
+    Args:
+        ip_address(str): A string containing the target IP address
+        form_validation_options(dict): See ip_info_check().
+        ipinfo_handler(ipinfo.AsyncHandler): (Optional) A handler to reuse across lookups, with its connection pool and cache.
+            If not given, a handler is created (and closed) for this lookup.
+    Returns:
+        A dict containing all metadata fron the IPInfo service for the specified IP
+    """
+    logger = LoggerManager.get_logger()
+    access_token = form_validation_options['sessiondata'].get('ipinfo_token')
+    if not access_token:
+        logger.warning("An ipinfo access token was not specified under the 'sessiondata' key. Specify a valid token value for the  ipinfo_token key under the sessiondata config, or see docs for ip_info_check().")
+        return None
+    handler = ipinfo_handler or ipinfo.getHandlerAsync(access_token)
+    try:
+        details = await handler.getDetails(ip_address)
+    finally:
+        if ipinfo_handler is None:
+            await handler.deinit()
+    return details.all
+
 def get_ip_address():
     """
     Utility function to extract and return client session IP address from request headers.
@@ -426,6 +405,40 @@ def l3_validations(session_info):
         results['elapsed_time_validation_pass'] = False
     return results
 
+def build_session_id_reminder_email(destination_address, session_id, config):
+    """
+    Compose the session_id reminder email for the configured email provider's HTTP API (see
+    send_session_id_reminder_email()).
+
+    Args:
+        destination_address(str): The destination email address to which the reminder will be sent
+        session_id(str): The session_id of the session in which the form submission was made.
+        config(dict): The instance configuration dict; the provider is configured under its 'email' key.
+
+    Returns:
+        A dict with the provider's 'provider_name', 'api_url' and 'api_key' and the email's form fields ('data'), or None if
+        email is not configured.
+    """
+    logger = LoggerManager.get_logger()
+    email_config = config.get('email')
+    if not (email_config and 'sender_address' in email_config and 'provider' in email_config):
+        logger.warning("The 'sender_address' and 'provider' keys were not configured correctly for email functionality. Aborting email attempt.")
+        return None
+    provider_name = email_config['provider']['provider_name']
+    logger.info(f"Configured email provider: {provider_name}")
+    message = f"Thank you for your form submission!\n\n Your session id was {session_id}. If you would like to pick up where you left off, please use it to restore your session.\n\nUB SOM Research"
+    return {
+        'provider_name': provider_name,
+        'api_url': email_config['provider']['http_service_api_url'],
+        'api_key': email_config['provider']['api_key'],
+        'data': {
+            "from": email_config['sender_address'],
+            "to": destination_address,
+            "subject": 'Submission Reminder',
+            "text": message
+        }
+    }
+
 def send_session_id_reminder_email(destination_address, session_id, config):
     """
     Utility function to send a reminder email to users who submit the web form, even partially, to the specified destination
@@ -441,31 +454,42 @@ def send_session_id_reminder_email(destination_address, session_id, config):
     """
 
     logger = LoggerManager.get_logger()
-    email_config = config.get('email')
-    if email_config and 'sender_address' in email_config and 'provider' in email_config:
-        provider_name = email_config['provider']['provider_name']
-        logger.info("Configured email provider: {provider_name}")
-        API_URL = email_config['provider']['http_service_api_url']
-        FROM_EMAIL_ADDRESS = email_config['sender_address']
-        api_key = email_config['provider']['api_key']
-        to_address = destination_address
-        
-        subject = 'Submission Reminder'
-        message = f"Thank you for your form submission!\n\n Your session id was {session_id}. If you would like to pick up where you left off, please use it to restore your session.\n\nUB SOM Research"
-
-        resp = requests.post(
-            API_URL,
-            auth=("api", api_key),
-            data={
-                "from": FROM_EMAIL_ADDRESS,
-                "to": to_address,
-                "subject": subject,
-                "text": message
-            }
-        )
-        if resp.status_code == 200:
-            logger.info(f"Successfully sent an email to '{to_address}' via {provider_name} API.")
-        else:
-            logger.warning(f"Email provider API response failed: {resp.text}")
+    email = build_session_id_reminder_email(destination_address, session_id, config)
+    if email is None:
+        return
+    resp = requests.post(email['api_url'], auth=("api", email['api_key']), data=email['data'])
+    if resp.status_code == 200:
+        logger.info(f"Successfully sent an email to '{destination_address}' via {email['provider_name']} API.")
+    else:
+        logger.warning(f"Email provider API response failed: {resp.text}")
+
+async def send_session_id_reminder_email_async(destination_address, session_id, config, http_session=None):
+    """
+    Async version of send_session_id_reminder_email(), for the async serving mode: the email provider's API is called with
+    aiohttp, so that the worker serves other requests while it waits on the provider.
+
+    Args:
+        destination_address(str): The destination email address to which the reminder will be sent
+        session_id(str): The session_id of the session in which the form submission was made.
+        config(dict): The instance configuration dict.
+        http_session(aiohttp.ClientSession): (Optional) A client session to reuse across emails, with its connection pool.
+            If not given, a client session is created (and closed) for this email.
+
+    Returns:
+        None
+    """
+    logger = LoggerManager.get_logger()
+    email = build_session_id_reminder_email(destination_address, session_id, config)
+    if email is None:
+        return
+    session = http_session or aiohttp.ClientSession()
+    try:
+        async with session.post(email['api_url'], auth=aiohttp.BasicAuth("api", email['api_key']), data=email['data']) as resp:
+            status, text = resp.status, await resp.text()
+    finally:
+        if http_session is None:
+            await session.close()
+    if status == 200:
+        logger.info(f"Successfully sent an email to '{destination_address}' via {email['provider_name']} API.")
     else:
-        logger.warning("The 'sender_address' and 'provider' keys were not configured correctly for email functionality. Aborting email attempt.")
\ No newline at end of file
+        logger.warning(f"Email provider API response failed: {text}")
\ No newline at end of file